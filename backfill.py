@@ -0,0 +1,263 @@
+"""
+File: backfill.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Resumable Form D Backfill
+
+Durable work queue for scraping the full Form D history. Every
+filing url gets a row in a SQLite table with its status, so a
+run can be stopped or crash at any point and the next run picks
+up exactly the urls that are still outstanding.
+
+    pending - not fetched yet
+    retry   - last attempt hit a network or HTTP error
+    failed  - gave up after MAX_ATTEMPTS or an unparseable filing
+    done    - contents appended to the results file
+
+Parsed filings are appended as JSON Lines ({"url": ..., "contents":
+...} per line) to one results file per shard, and a url is only
+marked done after its line is flushed to disk. The file's length is
+recorded with the statuses at each checkpoint, and lines appended
+after the last checkpoint (whose urls are still outstanding) are cut
+off when the shard is run again, so a crash cannot leave a filing in
+the results twice. The url space is
+split into shards by a hash of the url, so several processes (or
+machines with a copy of the queue) can each run one shard.
+
+Usage:
+    python backfill.py --seed complete_formd.pkl
+    python backfill.py --seed form_d_manifest.jsonl
+    python backfill.py --run --shard 0/4 --workers 8
+    python backfill.py --status
+    python backfill.py --requeue-failed --run
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import zlib
+import socket
+import httplib
+import pickle
+import sqlite3
+import argparse
+try:
+    import ujson as json
+except ImportError:
+    import json
+import http_client
+from fetcher import fetch_all, DEFAULT_WORKERS, DEFAULT_RATE
+from formd_xml import parse_submission
+
+QUEUE_DB = "backfill.sqlite3"
+ARCHIVE_URL = "https://www.sec.gov/Archives/"
+MAX_ATTEMPTS = 5
+RETRY_DELAY = 30
+BATCH_SIZE = 500
+
+# errors worth another attempt later; anything else is a bad filing
+RETRYABLE = (socket.error, httplib.HTTPException, http_client.HTTPError)
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=QUEUE_DB, help="Path of the SQLite work queue.")
+    parser.add_argument("--seed", metavar="FILE", help="Add the filing links in a pickle or a form_d_manifest.jsonl to the queue.")
+    parser.add_argument("--run", action="store_true", help="Work through the outstanding urls.")
+    parser.add_argument("--status", action="store_true", help="Print queue counts by status.")
+    parser.add_argument("--requeue-failed", action="store_true", help="Give failed urls a fresh set of attempts.")
+    parser.add_argument("--shard", default="0/1", help="Shard to work on, as index/count, e.g. 2/4.")
+    parser.add_argument("--out", default="scraped_formd", help="Prefix of the JSON Lines results files.")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="Number of concurrent fetch workers.")
+    parser.add_argument("-r", "--rate", type=float, default=DEFAULT_RATE, help="Maximum requests per second to sec.gov.")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_command_line()
+    conn = connect(args.db)
+
+    if args.seed:
+        with open(args.seed, "rb") as f:
+            if args.seed.endswith(".jsonl"):
+                # filing manifest written by edgar.py --full; skip the index files' done markers
+                entries = (json.loads(line) for line in f)
+                rel_links = (entry["path"] for entry in entries if "path" in entry)
+            else:
+                rel_links = pickle.load(f)
+            added = seed(conn, (ARCHIVE_URL + rel_link for rel_link in rel_links))
+        print("added {0} urls".format(added))
+
+    if args.requeue_failed:
+        conn.execute("update queue set status = 'retry', attempts = 0 where status = 'failed'")
+        conn.commit()
+
+    if args.run:
+        shard, num_shards = parse_shard(args.shard)
+        run(args.db, shard, num_shards, args.out, workers=args.workers, rate=args.rate)
+
+    if args.status or not (args.seed or args.run):
+        for status, count in status_counts(conn):
+            print("{0:8} {1}".format(status, count))
+    return 0
+
+
+def connect(db_path):
+    """
+    Open the queue database, creating the table on first use.
+    WAL mode lets several shard processes share one queue file.
+    """
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("create table if not exists queue ("
+                 " id integer primary key,"
+                 " url text not null unique,"
+                 " bucket integer not null,"
+                 " status text not null default 'pending',"
+                 " attempts integer not null default 0,"
+                 " error text,"
+                 " updated real)")
+    conn.execute("create index if not exists queue_status on queue (status, id)")
+    # length of each results file as of its last checkpoint
+    conn.execute("create table if not exists results (path text primary key, committed integer not null)")
+    conn.commit()
+    return conn
+
+
+def parse_shard(shard):
+    index, count = [int(x) for x in shard.split("/")]
+    if not 0 <= index < count:
+        raise ValueError("shard index must be in [0, {0})".format(count))
+    return index, count
+
+
+def bucket(url):
+    return zlib.crc32(url.encode("utf8")) & 0xffffffff
+
+
+def seed(conn, urls):
+    """
+    Add urls to the queue; urls already queued keep their status.
+
+    Returns:
+        number of new urls
+    """
+    before = conn.total_changes
+    conn.executemany("insert or ignore into queue (url, bucket) values (?, ?)",
+                     ((url, bucket(url)) for url in urls))
+    conn.commit()
+    return conn.total_changes - before
+
+
+def status_counts(conn):
+    return conn.execute("select status, count(*) from queue group by status order by status").fetchall()
+
+
+def outstanding(db_path, shard, num_shards):
+    """
+    Yield the shard's pending and retry urls in id order, reading the
+    queue a page at a time so it is never held in memory. This runs in
+    the fetcher's feeder thread, so it opens its own connection.
+    """
+    conn = sqlite3.connect(db_path, timeout=60)
+    last_id = 0
+    while True:
+        rows = conn.execute("select id, url from queue"
+                            " where status in ('pending', 'retry') and id > ? and bucket % ? = ?"
+                            " order by id limit ?",
+                            (last_id, num_shards, shard, BATCH_SIZE)).fetchall()
+        if not rows:
+            conn.close()
+            return
+        for row_id, url in rows:
+            yield url
+        last_id = rows[-1][0]
+
+
+def run(db_path, shard=0, num_shards=1, out_prefix="scraped_formd", workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """
+    Fetch and parse every outstanding url in one shard, appending
+    results to <out_prefix>_<shard>.jsonl. Passes are repeated, with
+    a pause in between, until nothing is left to retry.
+
+    Returns:
+        number of urls processed
+    """
+    conn = connect(db_path)
+    out_file = "{0}_{1}.jsonl".format(out_prefix, shard)
+    tic = time.time()
+    total = 0
+    while True:
+        total += run_pass(conn, db_path, shard, num_shards, out_file, workers, rate)
+        retries = conn.execute("select count(*) from queue where status = 'retry' and bucket % ? = ?",
+                               (num_shards, shard)).fetchone()[0]
+        if retries == 0:
+            break
+        print("{0} urls to retry in {1}s".format(retries, RETRY_DELAY))
+        time.sleep(RETRY_DELAY)
+    print("backfill shard {0}/{1}: {2} urls in {3:.0f}s".format(shard, num_shards, total, time.time() - tic))
+    return total
+
+
+def committed_results(conn, out_file):
+    """
+    Open the results file for appending, truncated to its length at the
+    last checkpoint. A file the queue has no record of is taken as is.
+    """
+    out = open(out_file, "ab")
+    out.seek(0, os.SEEK_END)
+    row = conn.execute("select committed from results where path = ?", (out_file,)).fetchone()
+    if row is None:
+        conn.execute("insert into results (path, committed) values (?, ?)", (out_file, out.tell()))
+        conn.commit()
+    elif out.tell() > row[0]:
+        out.truncate(row[0])
+        out.seek(0, os.SEEK_END)
+    return out
+
+
+def run_pass(conn, db_path, shard, num_shards, out_file, workers, rate):
+    updates = []
+    processed = 0
+    with committed_results(conn, out_file) as out:
+        results = fetch_all(outstanding(db_path, shard, num_shards), parse=parse_submission, workers=workers, rate=rate)
+        for url, contents, error in results:
+            now = time.time()
+            if error is None:
+                out.write(json.dumps({"url": url, "contents": contents}) + "\n")
+                updates.append(("done", None, now, url))
+            elif isinstance(error, RETRYABLE):
+                updates.append(("retry", str(error), now, url))
+            else:
+                updates.append(("failed", "{0}: {1}".format(type(error).__name__, error), now, url))
+            processed += 1
+
+            if len(updates) >= BATCH_SIZE:
+                checkpoint(conn, out, updates)
+                updates = []
+                print("{0} urls processed".format(processed))
+        checkpoint(conn, out, updates)
+    return processed
+
+
+def checkpoint(conn, out, updates):
+    """
+    Make the appended results durable, then record their statuses
+    and the file's new length.
+    """
+    out.flush()
+    os.fsync(out.fileno())
+    conn.execute("update results set committed = ? where path = ?", (out.tell(), out.name))
+    conn.executemany("update queue set status = ?, error = ?, updated = ?, attempts = attempts + 1"
+                     " where url = ?", updates)
+    conn.execute("update queue set status = 'failed' where status = 'retry' and attempts >= ?", (MAX_ATTEMPTS,))
+    conn.commit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+File: bench_db_insert.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Benchmark of loading the Form D history into analyst_formd.
+
+Loads a historical data file (all_data.csv as written by
+data_clean.py, or a synthetic one of the same shape built from
+the filings in benchmarks/data/) into a scratch copy of the
+analyst_formd table, comparing the old string-formatted
+multi-row INSERT with db_insert.load_csv at several batch sizes.
+Some synthetic names contain quotes and some fields are missing,
+which the old statement could not load.
+
+Usage: python benchmarks/bench_db_insert.py [--csv all_data.csv] [-n 1000000]
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import glob
+import time
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db_insert
+from edgar import parse_filing
+from data_clean import COLUMNS, TEXT_COLUMNS, filing_row
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+WEBAPP_DB = os.path.join(ROOT, "webapp", "formddb.sqlite3")
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=WEBAPP_DB, help="Migrated database to copy the schema from.")
+    parser.add_argument("--csv", default=None, help="Historical data file to load; synthetic if not given.")
+    parser.add_argument("-n", type=int, default=1000000, help="Rows in the synthetic history.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[500, 5000, 50000], help="Batch sizes to benchmark.")
+    parser.add_argument("--legacy-rows", type=int, default=100000, help="Rows to load with the old INSERT (it is slow).")
+    args = parser.parse_args()
+    return args
+
+
+def synthetic_csv(path, n):
+    """
+    Writes n rows in data_clean.make_df_from_json's format, varying the
+    names and dropping fields so the rows are not all identical.
+    """
+    rows = []
+    for filing in sorted(glob.glob(os.path.join(DATA_DIR, "*.txt"))):
+        with open(filing, "rb") as f:
+            rows.append(filing_row(parse_filing(f.read())))
+    table = []
+    for i in range(n):
+        row = list(rows[i % len(rows)])
+        row[0] = '{0} "{1}" Fund'.format(row[0], i) if i % 1000 == 0 else "{0} {1}".format(row[0], i)
+        row[1] = "{0:010d}".format(i)
+        row[16] = "https://www.sec.gov/Archives/edgar/data/{0}/{0:010d}-18-{1:06d}.txt".format(i, i % 1000000)
+        if i % 3 == 0:
+            row[5] = None
+        if i % 7 == 0:
+            row[9] = float("inf")
+        table.append(row)
+    df = pd.DataFrame([COLUMNS] + table)
+    df.to_csv(path)
+
+
+def scratch_db(path, source):
+    """
+    Empty copy of analyst_formd, with its indexes, full-text tables and
+    the triggers that keep them in sync, from the web app's database,
+    and of analyst_ingeststate with the row every load updates. Tables
+    are created first, as the triggers need them.
+    """
+    schema = sqlite3.connect(source).execute(
+        "select sql from sqlite_master where sql is not null"
+        " and (tbl_name in ('analyst_formd', 'analyst_ingeststate')"
+        " or (name like 'analyst_formd_%' and sql like 'CREATE VIRTUAL TABLE%'))"
+        " order by type = 'table' desc, type = 'index' desc, rowid").fetchall()
+    conn = sqlite3.connect(path)
+    for sql, in schema:
+        conn.execute(sql)
+    conn.execute("insert into analyst_ingeststate (id, generation, updated_at) values (1, 0, datetime('now'))")
+    conn.commit()
+    conn.close()
+
+
+def legacy_load(db_path, csv_file, limit):
+    """
+    The original add_forms: one string-formatted INSERT per chunk.
+    Returns (rows loaded, rows rejected).
+    """
+    conn = sqlite3.connect(db_path)
+    loaded = rejected = 0
+    reader = pd.read_csv(csv_file, header=1, chunksize=500, nrows=limit,
+                         dtype=dict((col, object) for col in TEXT_COLUMNS))
+    for df in reader:
+        values = ", ".join('("%s", "%s", "%s", "%s", "%s", "%s", "%s", "%s", "%s", %s, %s, %s, %s, "%s", %s, %s, "%s")' %
+                           row[:17] for row in db_insert.form_rows(df))
+        try:
+            conn.execute("insert into analyst_formd ({0}) values {1}".format(
+                ",".join(field for field, col in db_insert.FORMD_FIELDS[:17]), values))
+            conn.commit()
+            loaded += len(df)
+        except sqlite3.Error:
+            rejected += len(df)
+    conn.close()
+    return loaded, rejected
+
+
+def main():
+    args = parse_command_line()
+    columns = [row[1] for row in sqlite3.connect(args.db).execute("pragma table_info(analyst_formd)")]
+    if "accession_number" not in columns:
+        print("run 'python manage.py migrate' in webapp/ first")
+        return 1
+    tmp = tempfile.mkdtemp()
+    try:
+        csv_file = args.csv
+        if csv_file is None:
+            csv_file = os.path.join(tmp, "all_data.csv")
+            tic = time.time()
+            synthetic_csv(csv_file, args.n)
+            print("synthetic history: {0} rows in {1:.1f}s".format(args.n, time.time() - tic))
+
+        db_path = os.path.join(tmp, "legacy.sqlite3")
+        scratch_db(db_path, args.db)
+        tic = time.time()
+        loaded, rejected = legacy_load(db_path, csv_file, args.legacy_rows)
+        elapsed = time.time() - tic
+        print("legacy insert:          {0:8d} rows  {1:8.0f} rows/s  {2} rows rejected".format(
+            loaded, (loaded + rejected) / elapsed, rejected))
+
+        for batch_size in args.batch_sizes:
+            db_path = os.path.join(tmp, "batch_{0}.sqlite3".format(batch_size))
+            scratch_db(db_path, args.db)
+            conn = db_insert.connect(db_path)
+            tic = time.time()
+            count = db_insert.load_csv(conn, csv_file, batch_size)
+            elapsed = time.time() - tic
+            stored = conn.execute("select count(*) from analyst_formd").fetchone()[0]
+            conn.close()
+            print("executemany batch {0:6d}: {1:8d} rows  {2:8.0f} rows/s  {3} rows stored".format(
+                batch_size, count, count / elapsed, stored))
+    finally:
+        shutil.rmtree(tmp)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+File: bench_export.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Time to first byte and memory use of the web app's filing export.
+
+Seeds a scratch copy of analyst_formd with synthetic filings, then
+streams every filing through views.export_csv and views.export_parquet,
+reporting the time to the first and last byte and the growth in peak
+RSS, and compares that with building the whole CSV in one go from a
+single query, the way a non-streaming export would.
+
+Usage: python benchmarks/bench_export.py [-n 500000]
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import datetime
+import argparse
+import resource
+import tempfile
+import itertools
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "webapp"))
+WEBAPP_DB = os.path.join(ROOT, "webapp", "formddb.sqlite3")
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=WEBAPP_DB, help="Migrated database to copy the schema from.")
+    parser.add_argument("-n", type=int, default=500000, help="Synthetic filings to seed.")
+    args = parser.parse_args()
+    return args
+
+
+def schema(db_path):
+    """
+    analyst_formd and its indexes, in creation order.
+    """
+    return [sql for sql, in sqlite3.connect(db_path).execute(
+        "select sql from sqlite_master where tbl_name = 'analyst_formd' and type in ('table', 'index')"
+        " and sql is not null order by rowid")]
+
+
+def seed(conn, n):
+    start = datetime.date(2015, 1, 1)
+    rows = (("{0:010d}".format(i), "Synthetic Fund {0} LP".format(i), "1 Main St", "Greenwich", "CT",
+             "Pooled Investment Fund", (start + datetime.timedelta(days=i % 1000)).isoformat(),
+             "0000000000-{0:02d}-{1:06d}".format(i // 1000000, i % 1000000))
+            for i in range(n))
+    while True:
+        batch = list(itertools.islice(rows, 5000))
+        if not batch:
+            return
+        conn.executemany("insert into analyst_formd (cik, name, street1, city, state, ind_group_type, date_added,"
+                         " accession_number, year_of_incorp, street2, zip_code, min_investment_accepted,"
+                         " total_amount_sold, total_offering_amount, total_remaining, has_non_accred,"
+                         " num_non_accred, tot_number_investors)"
+                         " values (?, ?, ?, ?, ?, ?, ?, ?, '2015', '', '06830', 0, 0, 1000000, 1000000, 0, 0, 5)",
+                         batch)
+        conn.commit()
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def report(name, chunks):
+    before = peak_rss_mb()
+    tic = time.time()
+    first = None
+    size = 0
+    for chunk in chunks:
+        if first is None:
+            first = time.time() - tic
+        size += len(chunk)
+    print("  {0:22} first byte {1:8.1f} ms   last byte {2:7.1f} s   {3:7.1f} MB   peak RSS +{4:.0f} MB".format(
+        name, first * 1000, time.time() - tic, size / 1e6, peak_rss_mb() - before))
+
+
+def main():
+    args = parse_command_line()
+    tmp = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp, "formd.sqlite3")
+        conn = sqlite3.connect(db_path)
+        for sql in schema(args.db):
+            conn.execute(sql)
+        tic = time.time()
+        seed(conn, args.n)
+        print("seeded {0} filings in {1:.0f}s".format(args.n, time.time() - tic))
+        conn.close()
+
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "formd_site.settings")
+        from django.conf import settings
+        settings.DATABASES["default"]["NAME"] = db_path
+        import django
+        django.setup()
+        from analyst import views
+        from analyst.forms import ExportForm
+
+        form = ExportForm({})
+        form.is_valid()
+        report("streamed CSV", views.export_csv(form.cleaned_data))
+        if views.pa is not None:
+            report("streamed Parquet", views.export_parquet(form.cleaned_data))
+
+        def whole_csv():
+            fields = [field for field, kind in views.EXPORT_FIELDS]
+            frame = pd.read_sql("select {0} from analyst_formd order by date_added desc, id desc".format(
+                ", ".join(fields)), sqlite3.connect(db_path))
+            yield frame.to_csv(index=False, encoding="utf8")
+        report("whole CSV (old way)", whole_csv())
+    finally:
+        shutil.rmtree(tmp)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
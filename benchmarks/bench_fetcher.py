@@ -0,0 +1,142 @@
+"""
+File: bench_fetcher.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Benchmark of serial vs. concurrent Form D fetching.
+
+Starts a local HTTP/1.1 stand-in for sec.gov that serves the
+canned filings in benchmarks/data/ with an artificial delay per
+request, then times the old one-url-at-a-time loop over
+edgar.get_file_contents against fetcher.fetch_all at several
+worker counts. Each run starts with an empty filing cache in a
+temporary directory, so every filing comes from the server.
+
+Usage: python benchmarks/bench_fetcher.py [-n 200] [--latency 0.05]
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+import BaseHTTPServer
+import SocketServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from edgar import get_file_contents, parse_filing
+from fetcher import fetch_all
+import filing_cache
+import http_client
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=200, help="Number of filings to fetch per run.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of simulated server latency per request.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16], help="Worker counts to benchmark.")
+    args = parser.parse_args()
+    return args
+
+
+def load_filings():
+    filings = []
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, "*.txt"))):
+        with open(path, "rb") as f:
+            filings.append(f.read())
+    return filings
+
+
+class ThreadedServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_server(filings, latency):
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # write each response in one segment so keep-alive isn't penalised by Nagle
+        wbufsize = -1
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = filings[hash(self.path) % len(filings)]
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def fresh_cache(caches):
+    """
+    Points the filing cache at a new empty directory, added to caches.
+    """
+    caches.append(tempfile.mkdtemp())
+    filing_cache.configure(cache_dir=caches[-1], offline_mode=False)
+
+
+def main():
+    args = parse_command_line()
+    filings = load_filings()
+    server = start_server(filings, args.latency)
+    base = "http://127.0.0.1:{0}/Archives/edgar/data/".format(server.server_address[1])
+    urls = [base + "{0}/{0}-18-{1:06d}.txt".format(1731234, i) for i in range(args.n)]
+    caches = []
+    try:
+        run(args, urls, caches)
+    finally:
+        for cache_dir in caches:
+            shutil.rmtree(cache_dir)
+        http_client.pool.close()
+        server.shutdown()
+    return 0
+
+
+def run(args, urls, caches):
+    fresh_cache(caches)
+    tic = time.time()
+    for url in urls:
+        get_file_contents(url)
+    serial = time.time() - tic
+    print("serial get_file_contents: {0:7.2f}s  {1:7.1f} filings/s".format(serial, args.n / serial))
+
+    for workers in args.workers:
+        fresh_cache(caches)
+        tic = time.time()
+        errors = 0
+        for url, contents, error in fetch_all(urls, parse=parse_filing, workers=workers, rate=None):
+            errors += error is not None
+        elapsed = time.time() - tic
+        print("fetch_all workers={0:<3}    {1:7.2f}s  {2:7.1f} filings/s  speedup {3:5.1f}x  errors {4}".format(
+            workers, elapsed, args.n / elapsed, serial / elapsed, errors))
+
+    # the default rate limit caps throughput no matter how many workers run
+    limited = urls[:50]
+    fresh_cache(caches)
+    tic = time.time()
+    for _ in fetch_all(limited, parse=parse_filing, workers=16):
+        pass
+    elapsed = time.time() - tic
+    print("fetch_all rate-limited     {0:7.2f}s  {1:7.1f} filings/s ({2} filings, default rate)".format(
+        elapsed, len(limited) / elapsed, len(limited)))
+
+
+if __name__ == '__main__':
+    main()
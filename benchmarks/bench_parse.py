@@ -0,0 +1,132 @@
+"""
+File: bench_parse.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Parity check and per-filing benchmark of the Form D parsers.
+
+For every saved .txt submission in the corpus directory this
+compares the streaming parser (formd_xml.parse_submission) with
+the original BeautifulSoup parser (edgar.extract_contents) and
+reports any filing where the two dicts differ, then times both
+engines and measures the peak memory each one needs.
+
+Usage: python benchmarks/bench_parse.py [--corpus DIR] [--repeat 20]
+Exits non-zero if any filing fails the parity check.
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import glob
+import time
+import resource
+import argparse
+import pprint as pp
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bs4 import BeautifulSoup
+from edgar import extract_contents
+from formd_xml import parse_submission
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", default=DATA_DIR, help="Directory of saved .txt submissions.")
+    parser.add_argument("--repeat", type=int, default=20, help="Times to parse each filing when timing.")
+    parser.add_argument("--copies", type=int, default=2000, help="Related persons in the large filing used for memory.")
+    args = parser.parse_args()
+    return args
+
+
+def soup_parse(text):
+    return extract_contents(BeautifulSoup(text, 'lxml'))
+
+
+def run(parser, text):
+    try:
+        return parser(text)
+    except Exception as e:
+        return "{0}: {1}".format(type(e).__name__, e)
+
+
+def cpu_time(parser, texts, repeat):
+    tic = time.clock()
+    for _ in range(repeat):
+        for text in texts:
+            run(parser, text)
+    return (time.clock() - tic) / (repeat * len(texts))
+
+
+def large_filing(text, copies):
+    """
+    Build one oversized submission by repeating the related persons of
+    a real one, so peak memory is dominated by the parse itself.
+    """
+    start = text.find(b"<relatedPersonInfo>")
+    end = text.rfind(b"</relatedPersonInfo>") + len(b"</relatedPersonInfo>")
+    if start == -1:
+        return text
+    return text[:start] + text[start:end] * copies + text[end:]
+
+
+def peak_memory(parser, warmup, text, results):
+    # runs in a fresh process so the high-water mark belongs to this parser only
+    run(parser, warmup)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    run(parser, text)
+    results.put(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+
+
+def measure_memory(parser, warmup, text):
+    results = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=peak_memory, args=(parser, warmup, text, results))
+    proc.start()
+    used = results.get()
+    proc.join()
+    return used
+
+
+def main():
+    args = parse_command_line()
+    paths = sorted(glob.glob(os.path.join(args.corpus, "*.txt")))
+    if not paths:
+        print("no .txt filings in {0}".format(args.corpus))
+        return 1
+    texts = []
+    for path in paths:
+        with open(path, "rb") as f:
+            texts.append(f.read())
+
+    # parity: the streaming parser must produce exactly the soup parser's dict
+    mismatches = 0
+    for path, text in zip(paths, texts):
+        expected = run(soup_parse, text)
+        actual = run(parse_submission, text)
+        if expected != actual:
+            mismatches += 1
+            print("MISMATCH {0}".format(os.path.basename(path)))
+            pp.pprint(expected)
+            pp.pprint(actual)
+    print("parity: {0}/{1} filings identical".format(len(paths) - mismatches, len(paths)))
+
+    soup_cpu = cpu_time(soup_parse, texts, args.repeat)
+    stream_cpu = cpu_time(parse_submission, texts, args.repeat)
+    print("cpu per filing:    soup {0:8.3f} ms   stream {1:8.3f} ms   {2:5.1f}x".format(
+        soup_cpu * 1000, stream_cpu * 1000, soup_cpu / stream_cpu))
+
+    big = large_filing(texts[0], args.copies)
+    soup_mem = measure_memory(soup_parse, texts[0], big)
+    stream_mem = measure_memory(parse_submission, texts[0], big)
+    print("peak rss growth for a {0} KB filing:   soup {1:8d} KB   stream {2:8d} KB".format(
+        len(big) // 1024, soup_mem, stream_mem))
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+File: bench_predict.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Benchmark of per-row vs. batched classification.
+
+Scores historical filings (the Parquet history written by
+data_clean.py, an old all_data.csv, or 1M synthetic rows) with the old pattern of one
+tree_predict call per firm on a one-row data frame, and with a
+single classifier.predict_batch call, checking that both give the
+same classes. Uses the model in FORMD_MODEL_DIR, or a throwaway
+tree trained on the synthetic rows if there is no model there.
+
+Usage: python benchmarks/bench_predict.py [--history data/history | --csv all_data.csv] [-n 1000000]
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import classifier
+from classifier import FEATURES, tree_predict, predict_batch, clean_data
+from data_clean import load_history
+from sklearn import tree
+from sklearn.externals import joblib
+from sklearn.preprocessing import LabelEncoder
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--history", default=None, help="Parquet history to score.")
+    parser.add_argument("--csv", default=None, help="Old historical data file to score; synthetic if neither is given.")
+    parser.add_argument("-n", type=int, default=1000000, help="Rows in the synthetic history.")
+    parser.add_argument("--loop-rows", type=int, default=2000, help="Rows to score one at a time (extrapolated).")
+    args = parser.parse_args()
+    return args
+
+
+def synthetic_history(n, model):
+    rng = np.random.RandomState(1)
+    states = np.append(model.state_encoder.classes_, ["ZZ"])
+    industries = np.append(model.encoder.classes_, ["Not An Industry"])
+    tot_off = rng.randint(0, 10 ** 8, n).astype(float)
+    tot_off[rng.rand(n) < 0.2] = np.inf
+    return pd.DataFrame({"state": states[rng.randint(0, len(states), n)],
+                         "min_inv": rng.randint(0, 10 ** 6, n),
+                         "tot_off": tot_off,
+                         "tot_sold": rng.randint(0, 10 ** 8, n),
+                         "tot_rem": np.where(np.isinf(tot_off), np.inf, tot_off / 2),
+                         "ind_group_type": industries[rng.randint(0, len(industries), n)],
+                         "has_non_accred": rng.rand(n) < 0.1,
+                         "num_non_accred": rng.randint(0, 5, n),
+                         "tot_num_inv": rng.randint(0, 500, n)})
+
+
+def one_row(firm):
+    # the row layout views.classify used to build for tree_predict
+    return pd.DataFrame([[firm[name] for name, field in FEATURES]])
+
+
+def throwaway_model(model_dir):
+    """
+    Fits a small tree on synthetic rows and saves it, with copies of
+    the encoders, to model_dir for the registry to load.
+    """
+    for path in classifier.registry.paths()[1:]:
+        shutil.copy(path, model_dir)
+    encoder = LabelEncoder()
+    encoder.classes_ = np.load(os.path.join(model_dir, classifier.ENCODER_FILE), allow_pickle=True)
+    state_encoder = LabelEncoder()
+    state_encoder.classes_ = np.load(os.path.join(model_dir, classifier.STATE_ENCODER_FILE), allow_pickle=True)
+    encoders = classifier.Model(None, encoder, state_encoder, None)
+
+    train = synthetic_history(5000, encoders)
+    y = ((train["min_inv"] > 500000) | (train["tot_num_inv"] > 400)).astype(int)
+    clf = tree.DecisionTreeClassifier(max_depth=5).fit(classifier.feature_frame(train, encoders), y)
+    joblib.dump(clf, os.path.join(model_dir, classifier.MODEL_FILE))
+    classifier.registry.model_dir = model_dir
+
+
+def main():
+    args = parse_command_line()
+    tmp = None
+    if not os.path.exists(classifier.registry.paths()[0]):
+        tmp = tempfile.mkdtemp()
+        throwaway_model(tmp)
+    try:
+        model = classifier.registry.get()
+
+        if args.history:
+            history = load_history([name for name, field in FEATURES if field is not None], path=args.history)
+        elif args.csv:
+            history = pd.read_csv(args.csv, header=1)
+        else:
+            history = synthetic_history(args.n, model)
+        features = clean_data(history, categorical=False)
+        print("scoring {0} filings with model {1}".format(len(features), model.version))
+
+        sample = features.iloc[:args.loop_rows]
+        tic = time.time()
+        looped = [tree_predict(one_row(firm)) for i, firm in sample.iterrows()]
+        per_row = (time.time() - tic) / len(sample)
+        print("tree_predict per row: {0:8.3f} ms   ~{1:8.0f} s for all rows".format(per_row * 1000, per_row * len(features)))
+
+        tic = time.time()
+        preds = predict_batch(features)
+        batch = time.time() - tic
+        print("predict_batch:        {0:8.3f} ms per 1k rows   {1:8.2f} s for all rows   {2:.0f}x".format(
+            batch / len(features) * 1000 * 1000, batch, per_row * len(features) / batch))
+
+        same = [classifier.LABELS[p] for p in preds[:len(sample)]] == looped
+        print("same classes as tree_predict: {0}".format(same))
+    finally:
+        if tmp is not None:
+            shutil.rmtree(tmp)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+File: bench_queries.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Latency of the web app's Form D lookups with and without indexes.
+
+Seeds a scratch SQLite database with millions of synthetic
+analyst_formd rows, then times the SQL the views run (the same
+statements the Django ORM generates for them) before and after
+creating the analyst_formd indexes from the migrated web app
+database, reporting p50/p99 latency and the query plan.
+
+Usage: python benchmarks/bench_queries.py [-n 2000000] [--runs 200]
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import itertools
+import datetime as dt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import db_insert
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+WEBAPP_DB = os.path.join(ROOT, "webapp", "formddb.sqlite3")
+
+STATES = ["CA", "NY", "TX", "MA", "DE", "FL", "IL", "WA", "CT", "NJ", "CO", "GA", "X0", "A1"]
+INDUSTRIES = ["Pooled Investment Fund", "Other Technology", "Real Estate", "Biotechnology",
+              "Oil and Gas", "Other Banking and Financial Services", "Business Services",
+              "Other Health Care", "Retailing", "Restaurants", "Manufacturing", "Other"]
+
+def synthetic_day(i, n):
+    return dt.date.fromordinal(dt.date(2017, 1, 1).toordinal() + (i * 500) // n).strftime("%Y-%m-%d")
+
+
+def deep_cursor(n):
+    # (date_added, id) of a filing in the older half, as views.browse_page gets it
+    i = random.randrange(n // 2)
+    return (synthetic_day(i, n), i + 1)
+
+
+# name, SQL, function giving the parameters for one run
+QUERIES = [
+    ("recent / classify",
+     "select * from analyst_formd order by date_added desc limit 20",
+     lambda n: ()),
+    ("detail / detail_classify",
+     "select * from analyst_formd where cik = ? limit 1",
+     lambda n: ("{0:010d}".format(random.randrange(n // 3)), )),
+    ("recent in a state",
+     "select * from analyst_formd where state = ? order by date_added desc limit 20",
+     lambda n: (random.choice(STATES), )),
+    ("recent in an industry",
+     "select * from analyst_formd where ind_group_type = ? order by date_added desc limit 20",
+     lambda n: (random.choice(INDUSTRIES), )),
+    ("browse, deep page by OFFSET",
+     "select * from analyst_formd where date_added is not null order by date_added desc, id desc limit 51 offset ?",
+     lambda n: (n // 2 + random.randrange(n // 4), )),
+    ("browse, deep page by seek",
+     "select * from analyst_formd where date_added is not null and (date_added, id) < (?, ?)"
+     " order by date_added desc, id desc limit 51",
+     deep_cursor),
+    ("browse a state by seek",
+     "select * from analyst_formd where state = ? and date_added is not null and (date_added, id) < (?, ?)"
+     " order by date_added desc, id desc limit 51",
+     lambda n: (random.choice(STATES), ) + deep_cursor(n)),
+]
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=WEBAPP_DB, help="Migrated database to copy the analyst_formd schema from.")
+    parser.add_argument("-n", type=int, default=2000000, help="Synthetic rows to seed.")
+    parser.add_argument("--runs", type=int, default=200, help="Timed runs of each query.")
+    args = parser.parse_args()
+    return args
+
+
+def schema(db_path):
+    """
+    Returns (create table statement, [create index statements]) for analyst_formd.
+    """
+    rows = sqlite3.connect(db_path).execute(
+        "select type, sql from sqlite_master where tbl_name = 'analyst_formd' and sql is not null").fetchall()
+    table = [sql for kind, sql in rows if kind == "table"][0]
+    return table, [sql for kind, sql in rows if kind == "index"]
+
+
+def synthetic_rows(n):
+    for i in range(n):
+        day = synthetic_day(i, n)
+        # about three filings per issuer
+        cik = "{0:010d}".format(random.randrange(n // 3))
+        yield (cik, "Issuer {0}".format(cik), "2015", "1 Main St", "", "06830", "Greenwich",
+               random.choice(STATES), random.choice(INDUSTRIES), 0, 1000000, 250000, 750000,
+               random.random() < 0.1, 0, random.randrange(40), day,
+               "{0:010d}-18-{1:06d}".format(i // 1000000, i % 1000000), None, None, None, None, None)
+
+
+def seed(conn, n):
+    rows = synthetic_rows(n)
+    while True:
+        batch = list(itertools.islice(rows, db_insert.BATCH_SIZE))
+        if not batch:
+            return
+        conn.executemany(db_insert.UPSERT_FORMD, batch)
+        conn.commit()
+
+
+def percentile(times, p):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(len(times) * p))]
+
+
+def measure(conn, n, runs, label):
+    print(label)
+    for name, sql, params in QUERIES:
+        times = []
+        for _ in range(runs):
+            args = params(n)
+            tic = time.time()
+            conn.execute(sql, args).fetchall()
+            times.append(time.time() - tic)
+        plan = "; ".join(row[-1] for row in conn.execute("explain query plan " + sql, params(n)))
+        print("  {0:30} p50 {1:9.3f} ms   p99 {2:9.3f} ms   {3}".format(
+            name, percentile(times, 0.50) * 1000, percentile(times, 0.99) * 1000, plan))
+
+
+def main():
+    args = parse_command_line()
+    table, indexes = schema(args.db)
+    # the indexes declared in FormD.Meta, see migration 0006
+    added = [sql for sql in indexes if sql.startswith('CREATE INDEX "formd_')]
+    if not added:
+        print("run 'python manage.py migrate' in webapp/ first")
+        return 1
+    existing = [sql for sql in indexes if sql not in added]
+
+    tmp = tempfile.mkdtemp()
+    try:
+        conn = sqlite3.connect(os.path.join(tmp, "formd.sqlite3"))
+        conn.execute(table)
+        for sql in existing:
+            conn.execute(sql)
+        tic = time.time()
+        seed(conn, args.n)
+        print("seeded {0} rows in {1:.0f}s".format(args.n, time.time() - tic))
+        conn.execute("analyze")
+
+        measure(conn, args.n, args.runs, "before")
+
+        tic = time.time()
+        for sql in added:
+            conn.execute(sql)
+        conn.execute("analyze")
+        conn.commit()
+        print("created {0} indexes in {1:.0f}s".format(len(added), time.time() - tic))
+
+        measure(conn, args.n, args.runs, "after")
+        conn.close()
+    finally:
+        shutil.rmtree(tmp)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+File: bench_search.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Latency of the web app's firm name search over millions of filings.
+
+Seeds a scratch copy of analyst_formd, with the full-text indexes
+and triggers of migration 0011, with synthetic firm names, then
+times views.search_ids in each mode and the str.contains scan
+classifier.match_firms does, reporting p50/p99 latency.
+
+Usage: python benchmarks/bench_search.py [-n 1000000] [--runs 50]
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import random
+import shutil
+import string
+import sqlite3
+import argparse
+import tempfile
+import itertools
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "webapp"))
+WEBAPP_DB = os.path.join(ROOT, "webapp", "formddb.sqlite3")
+
+SUFFIXES = ["Capital", "Fund", "Partners", "LP", "LLC", "Holdings", "Investors", "Associates",
+            "Offshore", "Master", "Ventures", "Real Estate", "Trust", "Opportunities"]
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=WEBAPP_DB, help="Migrated database to copy the schema from.")
+    parser.add_argument("-n", type=int, default=1000000, help="Synthetic filings to seed.")
+    parser.add_argument("--runs", type=int, default=50, help="Timed runs of each search.")
+    args = parser.parse_args()
+    return args
+
+
+def schema(db_path):
+    """
+    analyst_formd, analyst_relatedperson, the full-text tables (not
+    their shadow tables) and the triggers, in creation order.
+    """
+    rows = sqlite3.connect(db_path).execute(
+        "select type, name, sql from sqlite_master where sql is not null order by rowid").fetchall()
+    tables = [sql for kind, name, sql in rows if kind == "table" and
+              (name in ("analyst_formd", "analyst_relatedperson") or sql.startswith("CREATE VIRTUAL TABLE"))]
+    return tables + [sql for kind, name, sql in rows if kind == "trigger"]
+
+
+def synthetic_names(n):
+    random.seed(1)
+    words = ["".join(random.choice(string.ascii_lowercase) for _ in range(random.randint(3, 9))).title()
+             for _ in range(n // 5)]
+    for i in range(n):
+        yield " ".join([random.choice(words) for _ in range(random.randint(1, 2))] + random.sample(SUFFIXES, 2))
+
+
+def seed(conn, n):
+    rows = ((name, "{0:010d}".format(i), "Greenwich", "1 Main St", "", "CT", "Pooled Investment Fund")
+            for i, name in enumerate(itertools.chain(synthetic_names(n - 1), ["Goldman Sachs Private Equity Partners LP"])))
+    while True:
+        batch = list(itertools.islice(rows, 5000))
+        if not batch:
+            return
+        conn.executemany("insert into analyst_formd (name, cik, city, street1, street2, state, ind_group_type,"
+                         " year_of_incorp, zip_code, min_investment_accepted, total_amount_sold, total_offering_amount,"
+                         " total_remaining, has_non_accred, num_non_accred, tot_number_investors)"
+                         " values (?, ?, ?, ?, ?, ?, ?, '', '', 0, 0, 0, 0, 0, 0, 0)", batch)
+        conn.commit()
+
+
+def percentile(times, p):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(len(times) * p))]
+
+
+def report(name, runs, search):
+    times = []
+    for _ in range(runs):
+        tic = time.time()
+        found = search()
+        times.append(time.time() - tic)
+    print("  {0:34} p50 {1:9.3f} ms   p99 {2:9.3f} ms   {3} found".format(
+        name, percentile(times, 0.50) * 1000, percentile(times, 0.99) * 1000, len(found)))
+
+
+def main():
+    args = parse_command_line()
+    statements = schema(args.db)
+    if not any("analyst_formd_fts" in sql for sql in statements):
+        print("run 'python manage.py migrate' in webapp/ first")
+        return 1
+
+    tmp = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(tmp, "formd.sqlite3")
+        conn = sqlite3.connect(db_path)
+        for sql in statements:
+            conn.execute(sql)
+        tic = time.time()
+        seed(conn, args.n)
+        print("seeded {0} filings, indexed by the triggers, in {1:.0f}s".format(args.n, time.time() - tic))
+        conn.close()
+
+        os.environ.setdefault("DJANGO_SETTINGS_MODULE", "formd_site.settings")
+        from django.conf import settings
+        settings.DATABASES["default"]["NAME"] = db_path
+        import django
+        django.setup()
+        from analyst.views import search_ids
+
+        for mode, q in [("prefix", "goldm sach"), ("prefix", "capital fund"),
+                        ("fuzzy", "goldmn sachs"), ("fuzzy", "capitol partnrs"),
+                        ("contains", "oldman sac"), ("contains", "capital fund")]:
+            report("{0} '{1}'".format(mode, q), args.runs, lambda: search_ids(q, mode, 50))
+
+        names = pd.read_sql("select name from analyst_formd", sqlite3.connect(db_path))["name"]
+        report("str.contains 'oldman sac' (old way)", 3, lambda: names[names.str.lower().str.contains("oldman sac")])
+    finally:
+        shutil.rmtree(tmp)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+File: bench_webapp_cache.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Load test of the analyst pages with the page cache on and off.
+
+Requests the recent, classify, detail and detail_classify pages
+through Django's test client against the web app's database, first
+with ANALYST_PAGE_CACHE off, then on, and finally as browser
+revalidations (If-None-Match) that the cache answers with 304 Not
+Modified, printing requests per second for each.
+
+Usage: python benchmarks/bench_webapp_cache.py [-n 500] [--settings formd_site.settings]
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "webapp"))
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=500, help="Requests per page and mode.")
+    parser.add_argument("--settings", default="formd_site.settings", help="Django settings module of the web app.")
+    args = parser.parse_args()
+    return args
+
+
+def rate(client, url, n, **headers):
+    """
+    Requests url n times. Returns (requests per second, last status code).
+    """
+    tic = time.time()
+    for _ in range(n):
+        response = client.get(url, **headers)
+    return n / (time.time() - tic), response.status_code
+
+
+def main():
+    args = parse_command_line()
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", args.settings)
+    import django
+    django.setup()
+    from django.core.cache import cache
+    from django.test import Client
+    from django.test.utils import setup_test_environment, override_settings
+    from analyst.models import FormD
+
+    setup_test_environment()
+    cik = FormD.objects.values_list("cik", flat=True).first()
+    if cik is None:
+        print("load some filings with db_insert.py first")
+        return 1
+    urls = ["/analyst/recent/", "/analyst/classify/",
+            "/analyst/{0}/".format(cik), "/analyst/{0}/classify/".format(cik)]
+    client = Client()
+
+    print("{0:28} {1:>12} {2:>12} {3:>14}".format("page", "cache off", "cache on", "revalidate"))
+    for url in urls:
+        with override_settings(ANALYST_PAGE_CACHE=False):
+            client.get(url)
+            off, status = rate(client, url, args.n)
+        cache.clear()
+        client.get(url)
+        on, status = rate(client, url, args.n)
+        etag = client.get(url)["ETag"]
+        revalidate, status = rate(client, url, args.n, HTTP_IF_NONE_MATCH=etag)
+        print("{0:28} {1:8.0f} r/s {2:8.0f} r/s {3:8.0f} r/s {4}".format(url, off, on, revalidate, status))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
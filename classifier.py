@@ -12,18 +12,133 @@ Functions include data cleaning, model training,
 and training set production.
 """
 import os
+import re
+import time
+import hashlib
+import argparse
+import threading
+from collections import namedtuple
 from sklearn import tree, neighbors
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder
 from sklearn.externals import joblib
-from sklearn.cross_validation import cross_val_score
+from sklearn.externals.joblib import Parallel, delayed
+from sklearn.cross_validation import StratifiedKFold
 import pandas as pd
 import graphviz
 import numpy as np
 import pprint as pp
+from data_clean import iter_history, COLUMNS
+
+# directory holding the pickled model and the encoder classes
+MODEL_DIR = os.environ.get("FORMD_MODEL_DIR", os.path.dirname(os.path.abspath(__file__)))
+MODEL_FILE = "dec_tree_model.pkl"
+ENCODER_FILE = "enc_classes.npy"
+STATE_ENCODER_FILE = "state_classes.npy"
+
+Model = namedtuple("Model", ["estimator", "encoder", "state_encoder", "version"])
+
+# model features in order, with the FormD field each one is read from
+FEATURES = [("state", "state"),
+            ("min_inv", "min_investment_accepted"),
+            ("tot_off", "total_offering_amount"),
+            ("tot_sold", "total_amount_sold"),
+            ("tot_rem", "total_remaining"),
+            ("ind_group_type", "ind_group_type"),
+            ("has_non_accred", "has_non_accred"),
+            ("num_non_accred", "num_non_accred"),
+            ("tot_num_inv", "tot_number_investors"),
+            ("tot_off_inf", None),
+            ("tot_rem_inf", None)]
+
+# code for a state or industry group the encoders were not fit on
+UNKNOWN_CATEGORY = -1
+
+LABELS = {0: "Unlikely Fit", 1: "Plausible Fit"}
+
+
+class ModelRegistry(object):
+    """
+    Loads the decision tree and its encoders once per process and
+    keeps them in memory. The files are checked for changes at most
+    every check_interval seconds, and reloaded when one of them is
+    replaced, e.g. when a new model is promoted.
+    """
+    def __init__(self, model_dir=None, check_interval=1.0):
+        self.model_dir = model_dir
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._model = None
+        self._stamp = None
+        self._checked = 0
+
+    def paths(self):
+        model_dir = self.model_dir if self.model_dir is not None else MODEL_DIR
+        return [os.path.join(model_dir, name) for name in (MODEL_FILE, ENCODER_FILE, STATE_ENCODER_FILE)]
+
+    def get(self):
+        """
+        Returns:
+            Model with the estimator, both encoders and a version
+            string identifying the pickled model
+        """
+        now = time.time()
+        if self._model is not None and now - self._checked < self.check_interval:
+            return self._model
+        with self._lock:
+            paths = self.paths()
+            stats = [os.stat(path) for path in paths]
+            stamp = [(path, st.st_mtime, st.st_size) for path, st in zip(paths, stats)]
+            if stamp != self._stamp:
+                self._model = self._load(*paths)
+                self._stamp = stamp
+            self._checked = now
+            return self._model
+
+    def _load(self, model_path, encoder_path, state_encoder_path):
+        encoder = LabelEncoder()
+        encoder.classes_ = np.load(encoder_path, allow_pickle=True)
+        state_encoder = LabelEncoder()
+        state_encoder.classes_ = np.load(state_encoder_path, allow_pickle=True)
+        with open(model_path, "rb") as f:
+            version = hashlib.sha1(f.read()).hexdigest()[:12]
+        return Model(joblib.load(model_path), encoder, state_encoder, version)
+
+
+registry = ModelRegistry()
+
+
+# hyperparameter grids searched by main(), per kind of model
+SEARCH_GRIDS = {
+    "tree": [{"min_samples_leaf": j, "max_depth": k} for j in range(5,30,5) for k in range(1,9)],
+    "forest": [{"n_estimators": n, "max_depth": k, "min_samples_leaf": j}
+               for n in (50, 100, 200) for k in (3, 5, 8, None) for j in (1, 5, 10)],
+    "knn": [{"n_neighbors": n, "weights": w} for n in (1, 3, 5, 9, 15, 25) for w in ("uniform", "distance")],
+}
+
+SEARCH_SEED = 1
+
+MODEL_KINDS = {
+    "tree": tree.DecisionTreeClassifier,
+    "forest": RandomForestClassifier,
+    "knn": neighbors.KNeighborsClassifier,
+}
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", choices=sorted(MODEL_KINDS), default=["tree"], help="Kinds of model to search.")
+    parser.add_argument("--folds", type=int, default=10, help="Cross-validation folds.")
+    parser.add_argument("-j", "--jobs", type=int, default=-1, help="Parallel jobs, -1 for one per core.")
+    parser.add_argument("--results", default="model_search.csv", help="CSV file for the results table.")
+    parser.add_argument("--render", action="store_true", help="Render a graphviz PDF of each decision tree.")
+    parser.add_argument("--tree-dir", default="data/trees", help="Directory for rendered trees.")
+    args = parser.parse_args()
+    return args
 
 
 def main():
+    args = parse_command_line()
     np.random.seed(1)
     # first, get the good firms and set class to 1
     train = pd.read_csv("data/training/training_firms.csv", header=0, dtype={"ind_group_type": "category"})
@@ -46,55 +161,77 @@ def main():
     x = train.ix[:,["min_inv", "tot_off", "tot_sold", "tot_rem", "ind_group_type", "has_non_accred", "num_non_accred", "tot_num_inv", "tot_off_inf", "tot_rem_inf"]]
     y = train["class"]
 
-    #print(y)
+    candidates = [(kind, params) for kind in args.models for params in SEARCH_GRIDS[kind]]
+    tic = time.time()
+    results = model_search(x, y, candidates, folds=args.folds, n_jobs=args.jobs)
+    print("{0} models x {1} folds in {2:.1f}s".format(len(candidates), args.folds, time.time() - tic))
 
-    # when normalizing bad vs. good # of samples
-    percent_train = 1
-    split = int(1294 * percent_train)
-    # when using all data
-    #split = 2314 # 80% split of the data
-    x_train = x.iloc[:split,]
-    y_train = y.iloc[:split,]
+    results.to_csv(args.results, index=False)
+    pp.pprint(results.head(10))
 
-    x_test = x.iloc[split:,]
-    y_test = y.iloc[split:,]
+    if args.render:
+        if not os.path.isdir(args.tree_dir):
+            os.makedirs(args.tree_dir)
+        for i, row in results[results["model"] == "tree"].iterrows():
+            clf = make_model("tree", row["params"])
+            train_model(x, y, clf, os.path.join(args.tree_dir, "tree_{0}".format(row["candidate"])))
 
-    os.chdir('/Users/mbyrnes/docs/school/class/ current/cs490/form_d/data/trees/')
-    
-    classifiers = [
-        tree.DecisionTreeClassifier(),
-        tree.DecisionTreeClassifier(min_samples_leaf=5),
-        tree.DecisionTreeClassifier(min_samples_leaf=10),
-        tree.DecisionTreeClassifier(min_samples_leaf=20),
-        tree.DecisionTreeClassifier(min_samples_leaf=30),
-
-        tree.DecisionTreeClassifier(max_depth=1),
-        tree.DecisionTreeClassifier(max_depth=3),
-        tree.DecisionTreeClassifier(max_depth=5),
-        tree.DecisionTreeClassifier(max_depth=7),
-
-        tree.DecisionTreeClassifier(max_depth=3, min_samples_leaf=10),
-        tree.DecisionTreeClassifier(max_depth=3, min_samples_leaf=20),
-        tree.DecisionTreeClassifier(max_depth=3, min_samples_leaf=20),
-    ]
-
-    classifiers = [tree.DecisionTreeClassifier(min_samples_leaf=j, max_depth=k) for j in range(5,30,5) for k in range(1,9)]
-    params = [(j,k) for j in range(5,30,5) for k in range(1,9)]
-    pp.pprint(classifiers)
-
-    for i, clf in enumerate(classifiers):
-        tree_clf = train_model(x_train, y_train, clf, i)
-        #print(tree_clf.feature_importances_)
-        #preds = tree_clf.predict(x_test)
-        #match = (preds == y_test)
-        #accuracy = float(match.sum()) / len(y_test)
-        accuracy = 0
-        scores = cross_val_score(estimator=clf, X=x, y=y, cv=10)
-        
-        print("Model: {1:2} -- Accuracy: {2:.3f}, min_samples_per_leaf: {3}, max_depth: {4}".format(accuracy, i, scores.mean(), params[i][0], params[i][1]))
-
-
-def train_model(x_train, y_train, tree_clf, i):
+
+def model_search(x, y, candidates, folds=10, n_jobs=-1):
+    """
+    Cross-validates every candidate model in parallel. The folds are
+    split once and shared by all candidates, and every (candidate,
+    fold) pair is a separate job, so the work spreads evenly over
+    the cores.
+
+    Args:
+        x: features
+        y: response vector
+        candidates: list of (kind, params) with kind a key of MODEL_KINDS
+        folds: number of stratified folds
+        n_jobs: joblib worker processes, -1 for one per core
+    Returns:
+        data frame with one row per candidate, best mean accuracy first
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y)
+    splits = list(StratifiedKFold(y, n_folds=folds, shuffle=True, random_state=1))
+    scores = Parallel(n_jobs=n_jobs)(delayed(fit_and_score)(x, y, kind, params, train_idx, test_idx)
+                                     for kind, params in candidates for train_idx, test_idx in splits)
+    # jobs come back in order: candidate by candidate, fold by fold
+    scores = np.array(scores).reshape(len(candidates), len(splits), 2)
+
+    results = pd.DataFrame({"candidate": range(len(candidates)),
+                            "model": [kind for kind, params in candidates],
+                            "params": [params for kind, params in candidates],
+                            "mean_accuracy": scores[:, :, 0].mean(axis=1),
+                            "std_accuracy": scores[:, :, 0].std(axis=1),
+                            "fit_seconds": scores[:, :, 1].sum(axis=1)},
+                           columns=["candidate", "model", "params", "mean_accuracy", "std_accuracy", "fit_seconds"])
+    return results.sort_values("mean_accuracy", ascending=False).reset_index(drop=True)
+
+
+def make_model(kind, params):
+    """
+    Unfitted model of a kind in MODEL_KINDS. Trees and forests choose
+    among equally good splits at random, so they get a fixed seed and
+    score the same in whichever worker process fits them.
+    """
+    clf = MODEL_KINDS[kind](**params)
+    if "random_state" in clf.get_params():
+        clf.set_params(random_state=SEARCH_SEED)
+    return clf
+
+
+def fit_and_score(x, y, kind, params, train_idx, test_idx):
+    tic = time.time()
+    clf = make_model(kind, params)
+    clf.fit(x[train_idx], y[train_idx])
+    score = clf.score(x[test_idx], y[test_idx])
+    return score, time.time() - tic
+
+
+def train_model(x_train, y_train, tree_clf, filename):
     """
     Build a decision tree classification model
     using training data for SEC Form D data.
@@ -105,6 +242,7 @@ def train_model(x_train, y_train, tree_clf, i):
     Args:
         x_train: training features
         y_train: response vector
+        filename: path of the rendered tree, without extension
     Returns:
         tree_clf: decision tree model
     """
@@ -112,7 +250,7 @@ def train_model(x_train, y_train, tree_clf, i):
     
     tree_data = tree.export_graphviz(tree_clf, out_file=None, feature_names=x_train.columns, class_names=["Bad", "Good"], filled=True, rounded=True)
     graph = graphviz.Source(tree_data)
-    graph.render("tree_{0}".format(i))
+    graph.render(filename)
     
     # save the model
     #joblib.dump(tree_clf, "dec_tree_model.pkl")
@@ -133,6 +271,9 @@ def clean_data(train, categorical = True):
         train: cleaned version of initially supplied argument
     """
     train = train.replace([np.inf], np.nan)
+    # categoricals from data_clean.load_history cannot be filled with 0
+    for col in train.select_dtypes(include=["category"]).columns:
+        train[col] = train[col].astype(object)
 
     if categorical:
       enc = LabelEncoder()
@@ -161,27 +302,98 @@ def tree_predict(firm):
     Returns:
         output: classification by decision tree
     """
-    tree_clf = joblib.load('/Users/mbyrnes/docs/school/class/ current/cs490/form_d/dec_tree_model.pkl')
-    encoder = LabelEncoder()
-    encoder.classes_ = np.load('/Users/mbyrnes/docs/school/class/ current/cs490/form_d/enc_classes.npy')
-    state_encoder = LabelEncoder()
-    state_encoder.classes_ = np.load('/Users/mbyrnes/docs/school/class/ current/cs490/form_d/state_classes.npy')
-    #print(firm[0])
-    try:
-        firm[0] = state_encoder.transform(firm[0])[0]
-    except ValueError:
-        firm[0] = 0
-    try:
-        firm[5] = encoder.transform(firm[5])[0]
-    except ValueError:
-        firm[5] = 0
-    #firm = firm.reshape(11,1)
-    response = tree_clf.predict(firm)
-    if response == 0:
-        output = "Unlikely Fit"
-    else:
-        output = "Plausible Fit"
-    return output
+    firm = firm.copy()
+    firm.columns = [name for name, field in FEATURES]
+    return LABELS[predict_batch(firm)[0]]
+
+
+def predict_batch(firms, model=None):
+    """
+    Predicts the class of many firms with a single call to the model.
+
+    Args:
+        firms: data frame with the FEATURES columns, either by feature
+            name or by FormD field name, or a FormD queryset. Without
+            tot_off_inf/tot_rem_inf columns they are derived from
+            missing or infinite amounts, as in clean_data.
+        model: Model to use, by default the registry's current one
+    Returns:
+        numpy array of predicted classes (see LABELS)
+    """
+    if model is None:
+        model = registry.get()
+    x = feature_frame(firms, model)
+    if len(x) == 0:
+        return np.array([], dtype=int)
+    return model.estimator.predict(x)
+
+
+def score_batch(firms, model=None):
+    """
+    Like predict_batch, but also returns how sure the model is.
+
+    Returns:
+        classes: numpy array of predicted classes (see LABELS)
+        probs: numpy array with the probability of each predicted class
+        version: version of the model that made the predictions
+    """
+    if model is None:
+        model = registry.get()
+    x = feature_frame(firms, model)
+    if len(x) == 0:
+        return np.array([], dtype=int), np.array([]), model.version
+    proba = model.estimator.predict_proba(x)
+    best = proba.argmax(axis=1)
+    return model.estimator.classes_[best], proba[np.arange(len(best)), best], model.version
+
+
+def stored_features(firms):
+    """
+    Model input for filings as stored in analyst_formd. Indefinite
+    amounts are stored as 0, so the web app has always scored stored
+    filings with both tot_off_inf and tot_rem_inf set; ingestion and
+    re-scoring follow the same convention so all scores agree.
+
+    Args:
+        firms: data frame with FormD field names
+    """
+    firms = firms.copy()
+    firms["tot_off_inf"] = True
+    firms["tot_rem_inf"] = True
+    return firms
+
+
+def feature_frame(firms, model):
+    """
+    Builds the model's input from firms (see predict_batch). State and
+    industry group are encoded with a vectorized lookup into the
+    encoder classes; unseen values get UNKNOWN_CATEGORY.
+    """
+    if hasattr(firms, "values_list"):
+        # Django queryset of FormD rows
+        fields = [field for name, field in FEATURES if field is not None]
+        firms = pd.DataFrame.from_records(list(firms.values_list(*fields)), columns=fields)
+    firms = firms.rename(columns=dict((field, name) for name, field in FEATURES if field is not None))
+
+    x = pd.DataFrame(index=firms.index)
+    for name, field in FEATURES:
+        if name in firms:
+            x[name] = firms[name]
+    amounts = x[["tot_off", "tot_rem"]].replace([np.inf], np.nan)
+    if "tot_off_inf" not in x:
+        x["tot_off_inf"] = amounts["tot_off"].isnull()
+    if "tot_rem_inf" not in x:
+        x["tot_rem_inf"] = amounts["tot_rem"].isnull()
+    x = x.replace([np.inf], np.nan)
+
+    x["state"] = encode(model.state_encoder, x["state"])
+    x["ind_group_type"] = encode(model.encoder, x["ind_group_type"])
+    return x[[name for name, field in FEATURES]].fillna(0)
+
+
+def encode(encoder, values):
+    # get_indexer gives -1, i.e. UNKNOWN_CATEGORY, for values not in classes_
+    return pd.Index(encoder.classes_).get_indexer(values)
 
 
 def get_training_data(plausible=True):
@@ -196,9 +408,6 @@ def get_training_data(plausible=True):
     Returns:
         nothing, but writes the training data to a CSV
     """
-    df = pd.read_csv("data/all_data.csv", header=1)
-    train = pd.DataFrame(columns=df.columns)
-
     if plausible:
         train_info = [("amansa feeder", None),
                       ("farallon", "ONE MARITIME PLAZA, SUITE 2100"),
@@ -234,13 +443,7 @@ def get_training_data(plausible=True):
                       ("aqr global", None),
                       ("d. e. shaw", None)]
 
-    for name, address in train_info:
-        if address != None:
-            res = df[(df["name"].str.lower().str.contains(name)) 
-                & (df["street2"] == address)]
-        else:
-            res = df[(df["name"].str.lower().str.contains(name))]
-        train = train.append(res)
+    train = match_firms(iter_history(columns=COLUMNS), train_info)
 
     if plausible:
         train.to_csv("training_firms.csv")
@@ -250,5 +453,44 @@ def get_training_data(plausible=True):
     return 0
 
 
+def match_firms(history, train_info):
+    """
+    Finds the rows of the history whose lowercased name contains one
+    of the patterns in train_info, a chunk at a time so memory does
+    not grow with the size of the history.
+    Each chunk's names are lowercased once and tested against all
+    patterns with one combined regex; only the few matching rows are
+    then checked pattern by pattern.
+
+    Args:
+        history: iterable of data frames, e.g. data_clean.iter_history()
+        train_info: list of (name pattern, street2 or None)
+    Returns:
+        data frame of matches grouped by pattern in train_info order,
+            a row appearing once for every pattern it matches
+    """
+    combined = re.compile("|".join("(?:{0})".format(name) for name, address in train_info))
+    matches = [[] for _ in train_info]
+    columns = None
+    for chunk in history:
+        columns = chunk.columns
+        names = chunk["name"].str.lower()
+        hit = names.str.contains(combined).fillna(False).astype(bool)
+        if not hit.any():
+            continue
+        chunk, names = chunk[hit], names[hit]
+        for i, (name, address) in enumerate(train_info):
+            found = names.str.contains(name).fillna(False).astype(bool)
+            if address != None:
+                found &= (chunk["street2"] == address)
+            if found.any():
+                matches[i].append(chunk[found])
+
+    frames = [frame for pattern in matches for frame in pattern]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames)
+
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -5,6 +5,21 @@ Email: michael.byrnes@yale.edu
 Python Version: 2.7
 
 Converting scraped JSON data into usable data frame format for data analysis.
+
+The cleaned history is written as a Parquet dataset under
+data/history, partitioned by the year and quarter each form was
+filed (data/history/year=2018/quarter=2/...), with an explicit
+schema and categorical state and industry group columns. Loaders
+read only the columns and partitions they ask for.
+
+Scraper output is read one filing at a time (JSON Lines, or legacy
+dict files through an incremental decoder) and converted in
+parallel worker processes, in fixed-size chunks merged back in file
+order.
+
+Usage:
+    python data_clean.py --workers 4
+    python data_clean.py --csv all_data.csv
 """
 from __future__ import print_function
 from __future__ import unicode_literals
@@ -14,106 +29,537 @@ try:
     import ujson as json
 except ImportError:
     import json
+import json as std_json
 import pprint as pp
 import glob
+import re
+import os
+import codecs
+import argparse
+import itertools
+import collections
+import multiprocessing
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
 
 reload(sys)
 sys.setdefaultencoding('utf8')
 
 
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=HISTORY_DIR, help="Directory of the Parquet history.")
+    parser.add_argument("--csv", default=None, help="Write an old-style all_data.csv file instead.")
+    parser.add_argument("-w", "--workers", type=int, default=multiprocessing.cpu_count(), help="Number of conversion processes.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Filings per column chunk.")
+    args = parser.parse_args()
+    return args
+
+
 def main():
-    json_files = glob.glob("data/json_data/scraped_formd_dict_*")
+    args = parse_command_line()
+    json_files = sorted(glob.glob("data/json_data/scraped_formd_dict_*"))
+    json_files += sorted(glob.glob("data/json_data/scraped_formd_*.jsonl"))
     print(json_files)
-    make_df_from_json(json_files, "all_data.csv")
-    
+    if args.csv:
+        count = make_df_from_json(json_files, args.csv, args.batch_size, args.workers)
+        out = args.csv
+    else:
+        count = make_history(json_files, args.out, args.batch_size, args.workers)
+        out = args.out
+    print("data_clean: {0} filings written to {1}".format(count, out))
+
+
+COLUMNS = ["name", 
+           "cik", 
+           "city",
+           "state",
+           "street1",
+           "street2",
+           "zip_code",
+           "year_of_incorp", 
+           "min_inv", 
+           "tot_off", 
+           "tot_sold", 
+           "tot_rem", 
+           "ind_group_type", 
+           "has_non_accred", 
+           "num_non_accred", 
+           "tot_num_inv",
+           "filing_url",
+           "previous_accession_number",
+           "date_filed"
+           ]
+
+NUMERIC_COLUMNS = ["min_inv", "tot_off", "tot_sold", "tot_rem", "num_non_accred", "tot_num_inv"]
+
+# identify the filing and the filing it amends; None when unknown
+KEY_COLUMNS = ["filing_url", "previous_accession_number"]
+
+TEXT_COLUMNS = ["name", "cik", "city", "state", "street1", "street2", "zip_code", "year_of_incorp", "ind_group_type"]
+
+# analyst_secondaryissuer and analyst_relatedperson columns, see issuer_rows and person_rows
+ISSUER_COLUMNS = ["cik", "name", "year_of_incorp", "street1", "street2", "zip_code", "city", "state", "phone"]
+PERSON_COLUMNS = ["first_name", "last_name", "street1", "street2", "zip_code", "city", "state"]
+
+# stored as dictionary-encoded categoricals
+CATEGORY_COLUMNS = ["state", "ind_group_type"]
 
-def make_df_from_json(json_files, out_file):
+# filings per data frame when streaming
+BATCH_SIZE = 5000
+
+# bytes of a JSON Lines file converted per task
+SPLIT_BYTES = 16 * 1024 * 1024
+
+HISTORY_DIR = "data/history"
+
+# partition keys; quarter 0 holds filings with no filing date
+PARTITION_COLUMNS = ["year", "quarter"]
+
+# year of an accession number such as 0001731234-18-000001
+accession_year = re.compile(r"\d{10}-(\d{2})-\d{6}")
+
+
+def history_schema():
+    """
+    Arrow schema of the history dataset, in COLUMNS order followed
+    by the partition keys.
+    """
+    types = {"has_non_accred": pa.bool_(),
+             "year": pa.int16(),
+             "quarter": pa.int8()}
+    for col in NUMERIC_COLUMNS:
+        types[col] = pa.float64()
+    for col in CATEGORY_COLUMNS:
+        types[col] = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([pa.field(col, types.get(col, pa.string())) for col in COLUMNS + PARTITION_COLUMNS])
+
+
+def make_df_from_json(json_files, out_file, batch_size=BATCH_SIZE, workers=None):
     """
     Converts JSON data output from the EDGAR scraper to a usable
     Pandas data frame format for classification.
+
+    This is the old single CSV format, which db_insert.py --csv still
+    reads; main() writes the Parquet history instead. Rows are
+    appended a chunk at a time, see iter_json_chunks.
+
+    Returns:
+        number of filings written
+    """
+    count = 0
+    with open(out_file, "wb") as f:
+        # the column names go in as the first data row, as they always have
+        pd.DataFrame([COLUMNS]).to_csv(f, encoding="utf8")
+        for df in iter_json_chunks(json_files, batch_size, workers):
+            df.index = range(count + 1, count + 1 + len(df))
+            df.to_csv(f, header=False, encoding="utf8")
+            count += len(df)
+    return count
+
+
+def iter_json_chunks(json_files, batch_size=BATCH_SIZE, workers=None):
+    """
+    Streams scraper output files as data frames of exactly batch_size
+    rows (the last one may be shorter), in file order.
+
+    JSON Lines files are split into byte ranges of about SPLIT_BYTES
+    and each legacy dict file is one task; worker processes convert
+    the tasks and the results are merged back in order, so the rows
+    come out the same however many workers there are. Only one task's
+    filings are parsed in a process at a time.
+    """
+    tasks = [task for json_file in json_files for task in json_tasks(json_file)]
+    if workers is None or workers > 1:
+        pool = multiprocessing.Pool(workers)
+        window = 2 * (workers or multiprocessing.cpu_count())
+    else:
+        pool = None
+        window = 1
+
+    pending = []
+    pending_rows = 0
+    try:
+        for (json_file, start, end), frames in iter_converted(tasks, batch_size, pool, window):
+            if not start:
+                print(json_file)
+            for df in frames:
+                pending.append(df)
+                pending_rows += len(df)
+                while pending_rows >= batch_size:
+                    merged = pd.concat(pending, ignore_index=True)
+                    yield merged.iloc[:batch_size]
+                    pending = [merged.iloc[batch_size:]]
+                    pending_rows -= batch_size
+        if pending_rows:
+            yield pd.concat(pending, ignore_index=True)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def iter_converted(tasks, batch_size, pool=None, window=1):
+    """
+    Yields (task, frames) in task order, frames being an iterator over
+    the task's data frames. At most window tasks are handed to the pool
+    ahead of the one being read, so the workers cannot run further
+    ahead of the consumer than that; a legacy dict file cannot be split
+    and goes to a worker whole. Without a pool the frames are converted
+    here a batch at a time as they are read.
+    """
+    upcoming = iter(tasks)
+    in_flight = collections.deque()
+    while True:
+        for task in itertools.islice(upcoming, window - len(in_flight)):
+            if pool is not None:
+                in_flight.append((task, pool.apply_async(convert_task, [(task, batch_size)])))
+            else:
+                in_flight.append((task, None))
+        if not in_flight:
+            return
+        task, result = in_flight.popleft()
+        if result is None:
+            yield task, iter_filing_batches(task_filings(task), batch_size)
+        else:
+            yield task, iter_popped(result.get())
+
+
+def iter_popped(frames):
+    """
+    Yields the frames of a list, dropping each from the list first.
+    """
+    frames.reverse()
+    while frames:
+        yield frames.pop()
+
+
+def json_tasks(json_file, split_bytes=SPLIT_BYTES):
+    """
+    Splits a scraper output file into (path, start, end) byte ranges
+    that begin and end on line boundaries; a legacy dict file is a
+    single (path, None, None) task.
+    """
+    if not json_file.endswith(".jsonl"):
+        return [(json_file, None, None)]
+    size = os.path.getsize(json_file)
+    bounds = [0]
+    with open(json_file, "rb") as f:
+        while bounds[-1] + split_bytes < size:
+            f.seek(bounds[-1] + split_bytes)
+            f.readline()
+            if f.tell() >= size:
+                break
+            bounds.append(f.tell())
+    bounds.append(size)
+    return [(json_file, start, end) for start, end in zip(bounds, bounds[1:])]
+
+
+def convert_task(job):
+    """
+    Converts one task from json_tasks to a list of data frames of at
+    most batch_size rows. Runs in a worker process.
+    """
+    task, batch_size = job
+    return list(iter_filing_batches(task_filings(task), batch_size))
+
+
+def task_filings(task):
+    """
+    Yields (url, contents) from one task from json_tasks.
+    """
+    json_file, start, end = task
+    if start is None:
+        return iter_json_filings(json_file)
+    return iter_jsonl_range(json_file, start, end)
+
+
+def iter_json_filings(json_file):
+    """
+    Yields (url, contents) from a scraper output file one filing at
+    a time, whether it is JSON Lines from backfill.py or a legacy
+    {url: contents, ...} dict file.
     """
-    table = [["name", 
-             "cik", 
-             "city",
-             "state",
-             "street1",
-             "street2",
-             "zip_code",
-             "year_of_incorp", 
-             "min_inv", 
-             "tot_off", 
-             "tot_sold", 
-             "tot_rem", 
-             "ind_group_type", 
-             "has_non_accred", 
-             "num_non_accred", 
-             "tot_num_inv"
-             ]]   
-
-    for json_dict in json_files:
-
-        with open(json_dict, "rb") as f:
-            data = json.load(f)
-        print(json_dict)
-
-        for i, key in enumerate(data):
-            # if i % 1000 == 0:
-            #     print(i)
-            entry = data[key] 
-            if entry == {}:
-                #print("missing entry {0}".format(i))
+    if json_file.endswith(".jsonl"):
+        return iter_jsonl_range(json_file)
+    return iter_json_dict(json_file)
+
+
+def iter_json_dict(json_file, read_size=1024 * 1024):
+    """
+    Incremental reader for a legacy dict file: decodes one key and
+    value at a time from a sliding buffer, so the whole JSON tree is
+    never in memory. Uses the standard library decoder, which also
+    accepts the Infinity the scraper writes for indefinite amounts.
+    """
+    decoder = std_json.JSONDecoder()
+    # a read can end part way through a multi-byte character
+    utf8 = codecs.getincrementaldecoder("utf8")()
+    with open(json_file, "rb") as f:
+        buf = utf8.decode(f.read(read_size)).lstrip()
+        if not buf.startswith("{"):
+            raise ValueError("{0} is not a JSON object".format(json_file))
+        pos = 1
+        eof = False
+        key = None
+        while True:
+            # skip separators between the key, the colon and the value
+            while pos < len(buf) and buf[pos] in " \t\r\n,:":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "}" and key is None:
+                return
+            try:
+                # top-level keys are strings and values objects or null,
+                # so a value cut off by the buffer never decodes
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    raise
+                # the next item runs past the buffer; slide it and read more
+                chunk = f.read(read_size)
+                eof = not chunk
+                buf = buf[pos:] + utf8.decode(chunk, final=eof)
+                pos = 0
                 continue
-            row = []
-
-            primary_issuer = entry["Primary Issuer"]
-            cik = primary_issuer["cik"]
-            name = primary_issuer["entity_name"]
-            phone = primary_issuer["phone"]
-            year_of_incorp = primary_issuer["year_of_incorp"]
-            address = primary_issuer["address"]
-            city = address["city"]
-            state = address["state"]
-            street1 = address["street1"]
-            street2 = address["street2"]
-            zip_code = address["zip_code"]
-
-            secondary_issuers = entry["Secondary Issuers"]
-            related_people = entry["Related People"]
-            
-            offering_data = entry["Offering Data"]
-            min_inv = offering_data["min_investment_accepted"]
-            tot_off = offering_data["total_offering_amount"]
-            tot_sold = offering_data["total_amount_sold"]
-            tot_rem = offering_data["total_remaining"]
-            ind_group_type = offering_data["ind_group_type"]
-            has_non_accred = offering_data["has_non_accred"]
-            num_non_accred = offering_data["num_non_accred"]
-            tot_num_inv = offering_data["tot_num_inv"]            
-
-            row = [name, 
-                    cik, 
-                    city,
-                    state,
-                    street1,
-                    street2,
-                    zip_code,
-                    year_of_incorp,
-                    min_inv,
-                    tot_off,
-                    tot_sold,
-                    tot_rem,
-                    ind_group_type,
-                    has_non_accred,
-                    num_non_accred,
-                    tot_num_inv
-                    ]
-
-            table.append(row)
-
-    df = pd.DataFrame(table)
-    df.to_csv(out_file)
-
-    return 0
+            pos = end
+            if key is None:
+                key = value
+            else:
+                yield key, value
+                key = None
+
+
+def iter_jsonl_range(json_file, start=0, end=None):
+    """
+    Yields (url, contents) from the lines of a JSON Lines file that
+    start in [start, end).
+    """
+    with open(json_file, "rb") as f:
+        f.seek(start)
+        # one {"url": ..., "contents": ...} record per line from backfill.py
+        while end is None or f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                rec = json.loads(line)
+                yield rec["url"], rec["contents"]
+
+
+def filing_row(entry, url=None):
+    """
+    Flattens one filing's contents dict into a row of COLUMNS,
+    or None for a filing that could not be scraped.
+    """
+    if not entry:
+        return None
+
+    primary_issuer = entry["Primary Issuer"]
+    address = primary_issuer["address"]
+    offering_data = entry["Offering Data"]
+
+    return [primary_issuer["entity_name"],
+            primary_issuer["cik"],
+            address["city"],
+            address["state"],
+            address["street1"],
+            address["street2"],
+            address["zip_code"],
+            primary_issuer["year_of_incorp"],
+            offering_data["min_investment_accepted"],
+            offering_data["total_offering_amount"],
+            offering_data["total_amount_sold"],
+            offering_data["total_remaining"],
+            offering_data["ind_group_type"],
+            offering_data["has_non_accred"],
+            offering_data["num_non_accred"],
+            offering_data["tot_num_inv"],
+            url,
+            offering_data.get("previous_accession_number"),
+            entry.get("Date Filed")
+            ]
+
+
+def make_df_from_filings(filings):
+    """
+    Builds a typed data frame straight from parsed filings, with no
+    intermediate JSON or CSV file.
+
+    Args:
+        filings: iterable of (url, contents) with contents as returned
+            by edgar.parse_filing
+    Returns:
+        data frame with COLUMNS; amounts are numeric, with inf for an
+            indefinite offering, and text fields stay strings
+    """
+    rows = [row for row in (filing_row(entry, url) for url, entry in filings) if row is not None]
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def iter_filing_batches(filings, batch_size=BATCH_SIZE):
+    """
+    Streams parsed (url, contents) pairs as data frames of at most
+    batch_size rows, so memory stays bounded however many filings
+    come through.
+    """
+    for batch in iter_batches(filings, batch_size):
+        yield make_df_from_filings(batch)
+
+
+def iter_batches(items, batch_size=BATCH_SIZE):
+    """
+    Yields lists of at most batch_size items.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def issuer_rows(entry):
+    """
+    Flattens a filing's secondary issuers into rows of ISSUER_COLUMNS.
+    """
+    rows = []
+    for issuer in (entry or {}).get("Secondary Issuers") or []:
+        address = issuer.get("address") or {}
+        rows.append([issuer.get("cik"),
+                     issuer.get("entity_name"),
+                     issuer.get("year_of_incorp"),
+                     address.get("street1"),
+                     address.get("street2"),
+                     address.get("zip_code"),
+                     address.get("city"),
+                     address.get("state"),
+                     issuer.get("phone")])
+    return rows
+
+
+def person_rows(entry):
+    """
+    Flattens a filing's related people into (row of PERSON_COLUMNS,
+    list of relationships) pairs. The parsers keep the whitespace
+    between relationship tags, which is dropped here.
+    """
+    rows = []
+    for person in (entry or {}).get("Related People") or []:
+        address = person.get("address") or {}
+        relationships = [rel.strip() for rel in person.get("relationships") or [] if rel and rel.strip()]
+        rows.append(([person.get("first_name"),
+                      person.get("last_name"),
+                      address.get("street1"),
+                      address.get("street2"),
+                      address.get("zip_code"),
+                      address.get("city"),
+                      address.get("state")],
+                     relationships))
+    return rows
+
+
+def make_history(json_files, out_dir=HISTORY_DIR, batch_size=BATCH_SIZE, workers=None):
+    """
+    Converts scraper output files to the Parquet history a chunk of
+    filings at a time, see iter_json_chunks.
+
+    Returns:
+        number of filings written
+    """
+    return write_history(iter_json_chunks(json_files, batch_size, workers), out_dir)
+
+
+def write_history(frames, out_dir=HISTORY_DIR):
+    """
+    Appends data frames of COLUMNS to the history dataset, one new
+    file per frame in each year/quarter partition it touches.
+    Filings with no filing date (scraped before it was kept) go in
+    quarter 0 of the year in their accession number.
+
+    Returns:
+        number of rows written
+    """
+    if pa is None:
+        raise ImportError("writing the history needs pyarrow")
+    schema = history_schema()
+    count = 0
+    for df in frames:
+        if not len(df):
+            continue
+        df = df[COLUMNS].copy()
+        for col in CATEGORY_COLUMNS:
+            df[col] = df[col].astype("category")
+        filed = df["date_filed"].fillna("").astype(unicode)
+        year = pd.to_numeric(filed.str[:4], errors="coerce")
+        month = pd.to_numeric(filed.str[5:7], errors="coerce")
+        df["year"] = year.fillna(df["filing_url"].map(filing_year)).fillna(0).astype(int)
+        df["quarter"] = ((month - 1) // 3 + 1).fillna(0).astype(int)
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        pq.write_to_dataset(table, out_dir, partition_cols=PARTITION_COLUMNS)
+        count += len(df)
+    return count
+
+
+def filing_year(url):
+    # EDGAR accession numbers carry the two-digit year they were assigned
+    match = accession_year.search(url) if isinstance(url, basestring) else None
+    if match is None:
+        return None
+    return 2000 + int(match.group(1))
+
+
+def iter_history(columns=None, years=None, quarters=None, path=HISTORY_DIR):
+    """
+    Yields the history one stored file at a time, so callers that
+    scan it keep only one file's rows in memory.
+
+    Args:
+        columns: columns to read, all of them if None
+        years, quarters: partitions to read, all of them if None
+        path: history dataset directory
+    Yields:
+        data frames with the requested columns; state and
+            ind_group_type come back categorical
+    """
+    if pa is None:
+        raise ImportError("reading the history needs pyarrow")
+    filters = []
+    if years is not None:
+        filters.append(("year", "in", set(int(year) for year in years)))
+    if quarters is not None:
+        filters.append(("quarter", "in", set(int(quarter) for quarter in quarters)))
+    dataset = pq.ParquetDataset(path, filters=filters or None)
+    read = None if columns is None else [col for col in columns if col not in PARTITION_COLUMNS]
+    for piece in sorted(dataset.pieces, key=lambda piece: piece.path):
+        df = piece.read(columns=read, partitions=dataset.partitions).to_pandas()
+        for col in PARTITION_COLUMNS:
+            if col in df:
+                df[col] = df[col].astype(int)
+        yield df if columns is None else df[columns]
+
+
+def load_history(columns=None, years=None, quarters=None, path=HISTORY_DIR):
+    """
+    Reads the requested columns and partitions of the history into
+    one data frame; see iter_history.
+    """
+    frames = list(iter_history(columns, years, quarters, path))
+    if not frames:
+        return pd.DataFrame(columns=columns or COLUMNS)
+    df = pd.concat(frames, ignore_index=True)
+    # each file has its own categories, so concat falls back to object
+    for col in CATEGORY_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype("category")
+    return df
 
 
 if __name__ == '__main__':
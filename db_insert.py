@@ -1,130 +1,507 @@
 from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import unicode_literals
-import os
 import time
 import pandas as pd
 import numpy as np
 import sqlite3
 import datetime as dt
-from classifier import clean_data
-from edgar import single_day
-from data_clean import make_df_from_json
+from classifier import clean_data, registry, score_batch, stored_features
+from edgar import scrape_day, daily_index_dates, accession_number
+from data_clean import iter_json_filings, iter_batches, make_df_from_filings, iter_history, issuer_rows, person_rows
+from data_clean import BATCH_SIZE, TEXT_COLUMNS, KEY_COLUMNS, HISTORY_DIR, ISSUER_COLUMNS, PERSON_COLUMNS
+import filing_cache
 import argparse
-try:
-    import ujson as json
-except ImportError:
-    import json
+import warnings
+import traceback
+
+DB_PATH = "webapp/formddb.sqlite3"
+# how far behind the high-water mark to look for days that failed to load
+LOOKBACK_DAYS = 31
+# seconds between checks of the ingest job queue, and between progress updates
+POLL_INTERVAL = 5
+PROGRESS_INTERVAL = 1
+# a day with no daily index while one of the next NO_INDEX_DAYS has one was a holiday
+NO_INDEX_DAYS = 7
+
+# analyst_formd column and the data frame column it is loaded from
+FORMD_FIELDS = [("cik", "cik"),
+                ("name", "name"),
+                ("year_of_incorp", "year_of_incorp"),
+                ("street1", "street1"),
+                ("street2", "street2"),
+                ("zip_code", "zip_code"),
+                ("city", "city"),
+                ("state", "state"),
+                ("ind_group_type", "ind_group_type"),
+                ("min_investment_accepted", "min_inv"),
+                ("total_offering_amount", "tot_off"),
+                ("total_amount_sold", "tot_sold"),
+                ("total_remaining", "tot_rem"),
+                ("has_non_accred", "has_non_accred"),
+                ("num_non_accred", "num_non_accred"),
+                ("tot_number_investors", "tot_num_inv"),
+                ("date_added", "date_added"),
+                ("accession_number", "accession_number"),
+                ("filing_url", "filing_url"),
+                ("previous_accession_number", "previous_accession_number")]
+
+# filled in by the scoring stage, see score_rows
+SCORE_FIELDS = ["predicted_class", "predicted_prob", "model_version"]
+
+# re-loading a filing updates its row in place; date_added keeps the first
+# load, and existing scores are kept if the filing could not be scored
+UPSERT_FIELDS = [field for field, col in FORMD_FIELDS] + SCORE_FIELDS
+UPSERT_FORMD = ("insert into analyst_formd ({0}) values ({1})"
+                " on conflict (accession_number) do update set {2}").format(
+    ",".join(UPSERT_FIELDS),
+    ",".join("?" * len(UPSERT_FIELDS)),
+    ",".join(["{0}=excluded.{0}".format(field) for field, col in FORMD_FIELDS
+              if field not in ("date_added", "accession_number")] +
+             ["{0}=coalesce(excluded.{0}, {0})".format(field) for field in SCORE_FIELDS]))
+
+ACCESSION = UPSERT_FIELDS.index("accession_number")
+
+# rows with no accession number (old all_data.csv files have no filing urls)
+# have no key to upsert on, and a unique index does not stop NULLs repeating,
+# so one is only inserted if no stored keyless row has the same values; unary
+# + keeps the other columns from being used to pick an index, so the lookup is by cik
+KEYLESS_FIELDS = [field for field, col in FORMD_FIELDS if field != "accession_number"]
+INSERT_KEYLESS = ("insert into analyst_formd ({0}) select {1} where not exists"
+                  " (select 1 from analyst_formd where +accession_number is null and cik = ? and {2})").format(
+    ",".join(UPSERT_FIELDS),
+    ",".join("?" * len(UPSERT_FIELDS)),
+    " and ".join("+{0} is ?".format(field) for field in KEYLESS_FIELDS if field != "cik"))
+KEYLESS_PARAMS = [UPSERT_FIELDS.index("cik")] + [UPSERT_FIELDS.index(field) for field in KEYLESS_FIELDS if field != "cik"]
+
+# link amendments in the batch to their originals, then earlier amendments to originals in the batch
+LINK_AMENDMENTS = ["update analyst_formd set amends_id ="
+                   " (select o.id from analyst_formd o where o.accession_number = analyst_formd.previous_accession_number)"
+                   " where {0} in (select accession_number from temp.formd_batch)".format(key)
+                   for key in ("accession_number", "previous_accession_number")]
+
+# invalidates the web app's page cache; part of every load's transaction
+BUMP_GENERATION = "update analyst_ingeststate set generation = generation + 1, updated_at = datetime('now') where id = 1"
+
+INSERT_ISSUER = "insert into analyst_secondaryissuer (filing_id,{0}) values (?,{1})".format(
+    ",".join(ISSUER_COLUMNS), ",".join("?" * len(ISSUER_COLUMNS)))
+INSERT_PERSON = "insert into analyst_relatedperson (id,filing_id,{0}) values (?,?,{1})".format(
+    ",".join(PERSON_COLUMNS), ",".join("?" * len(PERSON_COLUMNS)))
+INSERT_RELATIONSHIP = "insert into analyst_personrelationship (person_id, relationship) values (?, ?)"
+
+# a re-loaded filing's issuers and people replace the ones stored before
+DELETE_PEOPLE = ["delete from analyst_personrelationship where person_id in"
+                 " (select id from analyst_relatedperson where filing_id in (select id from temp.formd_batch_ids))",
+                 "delete from analyst_relatedperson where filing_id in (select id from temp.formd_batch_ids)",
+                 "delete from analyst_secondaryissuer where filing_id in (select id from temp.formd_batch_ids)"]
+
+# the related people's names in the full-text index, rebuilt once per filing
+# after its people are loaded (see migration 0012)
+REFRESH_PEOPLE = ("update analyst_formd_fts set people = coalesce("
+                  "(select group_concat(trim(coalesce(p.first_name, '') || ' ' || p.last_name), ' ')"
+                  " from analyst_relatedperson p where p.filing_id = analyst_formd_fts.rowid), '')"
+                  " where rowid in (select id from temp.formd_batch_ids)")
+
 
 def parse_command_line():
     parser = argparse.ArgumentParser()
     parser.add_argument("--historical", action="store_true", help="Add all historical files to database.")
+    parser.add_argument("--history-dir", default=HISTORY_DIR, help="Parquet history written by data_clean.py.")
+    parser.add_argument("--csv", default=None, help="Load an old all_data.csv file instead of the Parquet history.")
+    parser.add_argument("--since", default=None, help="Load every missing daily index from this date (YYYY-MM-DD).")
+    parser.add_argument("--load", metavar="FILE", default=None, help="Stream a scraper JSON or backfill .jsonl file into the database.")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Filings per insert batch.")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the local EDGAR file cache.")
+    parser.add_argument("--offline", action="store_true", help="Reprocess filings from the local cache only, no network.")
+    parser.add_argument("--worker", action="store_true", help="Run ingest jobs queued by the web app.")
+    parser.add_argument("--once", action="store_true", help="With --worker, exit once the queue is empty.")
     args = parser.parse_args()
     return args
 
 
 def main():
     args = parse_command_line()
+    filing_cache.configure(cache_dir=args.cache_dir, offline_mode=args.offline or None)
 
     if args.historical:
         tic = time.time()
-        conn = sqlite3.connect("webapp/formddb.sqlite3")
-        c = conn.cursor()
-        
-        reader = pd.read_csv("all_data.csv", header=1, chunksize=100000)
-        for df in reader:
-            df = df.iloc[:10,:]
-            add_forms(df, c)
-            conn.commit()
-            return 0
-                 
+        conn = connect()
+        if args.csv:
+            count = load_csv(conn, args.csv, args.batch_size)
+        else:
+            count = load_history(conn, args.history_dir, args.batch_size)
         toc = time.time()
-        print("db_insert: %s seconds elapsed\n" % (toc-tic))
+        print("db_insert: {0} rows in {1:.1f} seconds\n".format(count, toc-tic))
+    elif args.worker:
+        run_worker(once=args.once)
+    elif args.load:
+        conn = connect()
+        count = load_filings(conn, iter_json_filings(args.load), dt.date.today(), args.batch_size)
+        print("db_insert: {0} filings loaded from {1}".format(count, args.load))
     else:
-        for i in range(1,7):
+        since = None
+        if args.since:
+            since = dt.datetime.strptime(args.since, "%Y-%m-%d").date()
+        ingest_new(since)
+
+
+def ingest_new(since=None):
+    """
+    Incremental ingestion: loads every daily index that sec.gov has
+    published and that is not yet in the analyst_ingestedindex ledger.
+    Starts LOOKBACK_DAYS before the high-water mark so days that
+    failed part way are picked up again; on an empty ledger it starts
+    a week back, like the old fixed six-day window.
+
+    Args:
+        since: optional dt.date to start from instead
+    Returns:
+        list of index dates loaded
+    """
+    conn = connect()
+    ingested = set(parse_date(row[0]) for row in conn.execute("select index_date from analyst_ingestedindex"))
+    conn.close()
+
+    yesterday = dt.date.today() - dt.timedelta(days=1)
+    if since is None:
+        if ingested:
+            since = max(ingested) - dt.timedelta(days=LOOKBACK_DAYS)
+        else:
+            since = yesterday - dt.timedelta(days=6)
+
+    missing = [day for day in daily_index_dates(since, yesterday) if day not in ingested]
+    print("db_insert: {0} daily indexes to load since {1}".format(len(missing), since))
+    for day in missing:
+        full_process_form_d(day)
+    return missing
+
+
+def parse_date(value):
+    # connections opened with detect_types (e.g. Django's) return dates parsed
+    if isinstance(value, dt.date):
+        return value
+    return dt.datetime.strptime(value[:10], "%Y-%m-%d").date()
+
+
+def run_worker(db_path=DB_PATH, once=False, poll=POLL_INTERVAL):
+    """
+    Background job runner for the web app: runs the ingest jobs that
+    views.results queues in analyst_ingestjob, oldest first, so no
+    scraping happens in a request. Run one worker per database; jobs
+    left running by a worker that died are queued again on start.
+
+    Args:
+        once: return when the queue is empty instead of polling
+    """
+    conn = connect(db_path)
+    conn.execute("update analyst_ingestjob set status = 'queued' where status = 'running'")
+    conn.commit()
+    while True:
+        job = claim_job(conn)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll)
+            continue
+        run_job(conn, *job)
+
+
+def claim_job(conn):
+    """
+    Marks the oldest queued job running.
+
+    Returns:
+        (job id, index date) or None if the queue is empty
+    """
+    conn.commit()
+    conn.execute("begin immediate")
+    job = conn.execute("select id, index_date from analyst_ingestjob where status = 'queued'"
+                       " order by created_at, id limit 1").fetchone()
+    if job is not None:
+        conn.execute("update analyst_ingestjob set status = 'running', fetched = 0, total = null, error = null,"
+                     " attempts = attempts + 1, started_at = datetime('now') where id = ?", (job[0], ))
+    conn.commit()
+    return job
+
+
+def run_job(conn, job_id, index_date):
+    """
+    Ingests one job's daily index, recording progress as filings come
+    in and the outcome when it is done. Weekends and holidays have no
+    daily index, so their jobs are done with no filings; a day whose
+    index is not published yet fails and is retried later.
+    """
+    last = [0]
+
+    def progress(done, total):
+        if done == total or time.time() - last[0] >= PROGRESS_INTERVAL:
+            conn.execute("update analyst_ingestjob set fetched = ?, total = ? where id = ?", (done, total, job_id))
+            conn.commit()
+            last[0] = time.time()
+
+    print("db_insert: ingest job {0} for {1}".format(job_id, index_date))
+    try:
+        day = parse_date(index_date)
+        if has_daily_index(day):
+            loaded, failed = full_process_form_d(day, progress)
+        else:
+            loaded, failed = 0, 0
+            conn.execute("insert or replace into analyst_ingestedindex (index_date, filings, loaded_at)"
+                         " values (?, 0, datetime('now'))", (index_date, ))
+    except Exception as e:
+        traceback.print_exc()
+        conn.execute("update analyst_ingestjob set status = 'failed', error = ?, finished_at = datetime('now')"
+                     " where id = ?", ("{0}: {1}".format(type(e).__name__, e), job_id))
+    else:
+        conn.execute("update analyst_ingestjob set status = 'done', loaded = ?, failed = ?,"
+                     " finished_at = datetime('now') where id = ?", (loaded, failed, job_id))
+    conn.commit()
+
 
-            yesterday = dt.datetime.now() - dt.timedelta(days=i)    
-            if yesterday.isoweekday() in range(1, 6):
-                full_process_form_d(yesterday)
+def has_daily_index(day):
+    """
+    Whether sec.gov has a daily index for day. Raises IOError if it
+    cannot tell yet: no later day's index is published either.
+    """
+    if day.weekday() >= 5:
+        return False
+    published = daily_index_dates(day, day + dt.timedelta(days=NO_INDEX_DAYS))
+    if day in published:
+        return True
+    if not published:
+        raise IOError("the daily index for {0} is not published yet".format(day))
+    return False
 
 
-def full_process_form_d(day):
+def full_process_form_d(day, progress=None):
     """
     This function implements the full pipeline for
     (1) Scraping
     (2) Data Cleaning
     (3) Database Insertion
+    without writing any intermediate files.
 
     Args:
-        day: dt.Datetime object for the day you want to scrape
+        day: dt.Datetime or dt.date object for the day you want to scrape
+        progress: optional function called with (filings fetched, total)
     Returns:
-        nothing, but inserts data into sqlite database
+        (filings loaded, filings that could not be fetched); inserts data
+        into sqlite database and records the filings (and the day, once
+        complete) in the ingest ledger
     """
-    # scrape the data for a day
-    filings = single_day(day)
-    with open("tempdata", "wb") as f:
-        json.dump(filings,f)
-    
-    # clean it to df
-    out_file = "{0}_formds".format(day)
-    make_df_from_json(["tempdata"], out_file)
-
-
-    # add to database
-    conn = sqlite3.connect("webapp/formddb.sqlite3")
+    conn = connect()
     c = conn.cursor()
-    df = pd.read_csv(out_file, header=1)
-    add_forms(df, c, day)
+    index_date = day.strftime("%Y-%m-%d")
+    loaded = set(row[0] for row in c.execute(
+        "select accession_number from analyst_ingestedfiling where index_date = ?", (index_date,)))
+
+    # scrape the data for a day, skipping filings already loaded
+    filings, failed = scrape_day(day, skip=loaded, progress=progress)
+    # a day is small, so its rows and ledger entries go in one transaction
+    load_filings(c, filings.iteritems(), day, commit=False)
+    c.executemany("insert or ignore into analyst_ingestedfiling (accession_number, index_date) values (?, ?)",
+                  [(accession_number(url), index_date) for url in filings])
+    # the day only counts as done once every filing in it has been fetched
+    if not failed:
+        c.execute("insert or replace into analyst_ingestedindex (index_date, filings, loaded_at)"
+                  " values (?, ?, datetime('now'))", (index_date, len(loaded) + len(filings)))
     conn.commit()
-    
-    # clean up intermediate data after insertion
-    os.remove(out_file)
-    os.remove("tempdata")
+    return len(filings), len(failed)
+
+
+def load_filings(conn, filings, date_added, batch_size=BATCH_SIZE, commit=True):
+    """
+    Streams parsed filings into analyst_formd a batch at a time,
+    cleaning each batch in memory on the way, along with their
+    secondary issuers and related people.
+
+    Args:
+        conn: sqlite3 connection or cursor
+        filings: iterable of (url, contents) with contents as returned
+            by edgar.parse_filing
+        date_added: dt.date recorded on every row
+        batch_size: filings held in memory, and inserted per transaction
+        commit: commit after each batch; otherwise the caller commits
+    Returns:
+        number of rows inserted
+    """
+    count = 0
+    for batch in iter_batches(filings, batch_size):
+        df = make_df_from_filings(batch)
+        if len(df):
+            count += add_forms(df, conn, date_added)
+            add_people(conn, batch)
+            if commit:
+                conn.commit()
+    return count
+
+
+def load_history(conn, path=HISTORY_DIR, batch_size=BATCH_SIZE):
+    """
+    Loads the Parquet history written by data_clean.py, one
+    transaction per batch of rows. These rows have no date_added.
+    """
+    count = 0
+    for df in iter_history(path=path):
+        for start in range(0, len(df), batch_size):
+            count += add_forms(df.iloc[start:start + batch_size], conn)
+            conn.commit()
+    return count
+
+
+def load_csv(conn, csv_file, batch_size=BATCH_SIZE):
+    """
+    Loads a historical data file in the old CSV format, one
+    transaction per batch of rows. These rows have no date_added.
+    """
+    count = 0
+    reader = pd.read_csv(csv_file, header=1, chunksize=batch_size,
+                         dtype=dict((col, object) for col in TEXT_COLUMNS))
+    for df in reader:
+        count += add_forms(df, conn)
+        conn.commit()
+    return count
+
+
+def connect(db_path=DB_PATH):
+    """
+    Connection for bulk loading: WAL lets the web app keep reading
+    while batches are written, and synchronous=NORMAL only syncs the
+    log at checkpoints instead of on every commit.
+    """
+    conn = sqlite3.connect(db_path, timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
 
 
-def add_forms(df, conn, date_added):
+def form_rows(df, date_added=None):
+    """
+    Converts a data frame of COLUMNS from data_clean.py into parameter
+    tuples for UPSERT_FORMD. Missing text becomes "" and missing or
+    infinite amounts become 0, as in clean_data. Filing keys stay None
+    when unknown, e.g. for data files written before they were kept.
+    """
+    df = df.copy()
+    for col in TEXT_COLUMNS:
+        # categoricals from the history cannot take a new "" value
+        df[col] = df[col].astype(object).where(df[col].notnull(), "")
+    keys = {}
+    for col in KEY_COLUMNS:
+        if col in df:
+            keys[col] = [value if isinstance(value, basestring) else None for value in df.pop(col).tolist()]
+        else:
+            keys[col] = [None] * len(df)
+    keys["accession_number"] = [accession_number(url) if url else None for url in keys["filing_url"]]
     df = clean_data(df, categorical=False)
-    names = df.iloc[:,1].tolist()
-    cik = df.iloc[:,2].tolist()
-    city = df.iloc[:,3].tolist()
-    state = df.iloc[:,4].tolist()
-    street1 = df.iloc[:,5].tolist()
-    street2 = df.iloc[:,6].tolist()
-    zip_code = df.iloc[:,7].tolist()
-    year_of_incorp = df.iloc[:,8].tolist()
-    min_inv = df.iloc[:,9].tolist()
-    tot_off = df.iloc[:,10].tolist()
-    tot_sold = df.iloc[:,11].tolist()
-    tot_rem = df.iloc[:,12].tolist()
-    ind_group_type = df.iloc[:,13].tolist()
-    has_non_accred = df.iloc[:,14].astype(int).tolist()
-    num_non_accred = df.iloc[:,15].tolist()
-    tot_num_inv = df.iloc[:,16].tolist()
-    df["date_added"] = dt.datetime.strftime(date_added, "%Y-%m-%d")
-    date_added = df.iloc[:,19].tolist()
-
-    sql_vals = ", ".join('("%s", "%s", "%s", "%s", "%s", "%s", "%s", "%s", "%s", %s, %s, %s, %s, "%s", %s, %s, "%s")' %
-        (cik[i],
-         names[i],
-         year_of_incorp[i],
-         street1[i],
-         street2[i],
-         zip_code[i],
-         city[i],
-         state[i],
-         ind_group_type[i],
-         min_inv[i],
-         tot_off[i],
-         tot_sold[i],
-         tot_rem[i],
-         has_non_accred[i],
-         num_non_accred[i],
-         tot_num_inv[i],
-         date_added[i]) for i in range(len(df)))
-
-    conn.execute("insert into analyst_formd (cik,name,year_of_incorp,street1,street2,zip_code,city,state,ind_group_type,min_investment_accepted,total_offering_amount,total_amount_sold,total_remaining,has_non_accred,num_non_accred,tot_number_investors,date_added) "
-                " values {0}".format(sql_vals))
-    return 0
+    df["has_non_accred"] = df["has_non_accred"].astype(bool)
+    df["date_added"] = date_added.strftime("%Y-%m-%d") if date_added is not None else None
+
+    columns = []
+    for field, col in FORMD_FIELDS:
+        if col in TEXT_COLUMNS:
+            columns.append([unicode(value) for value in df[col].tolist()])
+        elif col == "has_non_accred":
+            columns.append(df[col].astype(int).tolist())
+        elif col == "date_added":
+            columns.append(df[col].tolist())
+        elif col in keys:
+            columns.append(keys[col])
+        else:
+            columns.append(df[col].astype(np.int64).tolist())
+    return zip(*columns)
+
+
+def score_rows(rows):
+    """
+    Scores rows from form_rows with the current classifier model.
+
+    Returns:
+        list of (predicted_class, predicted_prob, model_version) per
+            row, all None if there is no model to score with; loading
+            never depends on the model and rescore.py fills them in
+    """
+    try:
+        model = registry.get()
+    except (IOError, OSError) as e:
+        warnings.warn("filings left unscored, no classifier model: {0}".format(e))
+        return [(None, None, None)] * len(rows)
+    firms = pd.DataFrame.from_records(rows, columns=[field for field, col in FORMD_FIELDS])
+    classes, probs, version = score_batch(stored_features(firms), model)
+    return zip(classes.tolist(), probs.tolist(), [version] * len(rows))
+
+
+def add_forms(df, conn, date_added=None):
+    """
+    Scores a data frame of filings and upserts them into analyst_formd
+    with a single parameterized executemany keyed on accession number,
+    so loading the same filings again is safe (rows with no accession
+    number are skipped if an identical one is stored, see
+    INSERT_KEYLESS), then links amendments
+    to the filings they amend, and bumps the ingest generation so the
+    web app's cached pages are invalidated. Committing is left to the
+    caller so a batch is one transaction.
+
+    Returns:
+        number of rows inserted or updated
+    """
+    rows = form_rows(df, date_added)
+    rows = [row + score for row, score in zip(rows, score_rows(rows))]
+    conn.executemany(UPSERT_FORMD, [row for row in rows if row[ACCESSION] is not None])
+    conn.executemany(INSERT_KEYLESS, [row + tuple(row[i] for i in KEYLESS_PARAMS)
+                                      for row in rows if row[ACCESSION] is None])
+
+    conn.execute("create temp table if not exists formd_batch (accession_number text primary key)")
+    conn.execute("delete from temp.formd_batch")
+    conn.executemany("insert or ignore into temp.formd_batch values (?)",
+                     [(row[ACCESSION], ) for row in rows if row[ACCESSION] is not None])
+    for sql in LINK_AMENDMENTS:
+        conn.execute(sql)
+    conn.execute(BUMP_GENERATION)
+    return len(rows)
+
+
+def add_people(conn, filings):
+    """
+    Bulk loads the secondary issuers, related people and their
+    relationships of a batch of filings just upserted by add_forms,
+    replacing any stored for them before, and refreshes the filings'
+    people in the full-text index. Filings with no accession number
+    cannot be matched to their row and are skipped.
+
+    Args:
+        conn: sqlite3 connection or cursor, in add_forms' transaction
+        filings: list of (url, contents) with contents as returned
+            by edgar.parse_filing
+    Returns:
+        number of related people inserted
+    """
+    filing_ids = dict(conn.execute("select accession_number, id from analyst_formd"
+                                   " where accession_number in (select accession_number from temp.formd_batch)"))
+    conn.execute("create temp table if not exists formd_batch_ids (id integer primary key)")
+    conn.execute("delete from temp.formd_batch_ids")
+    conn.executemany("insert into temp.formd_batch_ids values (?)", [(i, ) for i in filing_ids.values()])
+    for sql in DELETE_PEOPLE:
+        conn.execute(sql)
+
+    issuers, people, relationships = [], [], []
+    # the batch's write lock is held, so ids can be handed out here
+    next_id = conn.execute("select coalesce(max(id), 0) + 1 from analyst_relatedperson").fetchone()[0]
+    for url, entry in filings:
+        filing_id = filing_ids.get(accession_number(url)) if url else None
+        if filing_id is None:
+            continue
+        issuers.extend([filing_id] + row for row in issuer_rows(entry))
+        for row, roles in person_rows(entry):
+            row[1] = row[1] or ""
+            people.append([next_id, filing_id] + row)
+            relationships.extend((next_id, role) for role in roles)
+            next_id += 1
+    conn.executemany(INSERT_ISSUER, issuers)
+    conn.executemany(INSERT_PERSON, people)
+    conn.executemany(INSERT_RELATIONSHIP, relationships)
+    conn.execute(REFRESH_PEOPLE)
+    return len(people)
 
 
 if __name__ == "__main__":
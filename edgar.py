@@ -14,11 +14,12 @@ from __future__ import print_function
 from __future__ import unicode_literals
 import sys
 import os
+import io
 import argparse
-import urllib2, socket
 import re
+import socket
+import httplib
 import datetime
-import ssl
 try:
     import ujson as json
 except ImportError:
@@ -26,9 +27,15 @@ except ImportError:
 from bs4 import BeautifulSoup
 import pprint as pp
 import pickle
-import gzip
+import zlib
 import time
+from collections import namedtuple
 from parse_form_d import extract_issuer_info, extract_address, extract_offering_data
+from fetcher import fetch_all, DEFAULT_WORKERS, DEFAULT_RATE
+import http_client
+import filing_cache
+import backfill
+from formd_xml import parse_submission, filed_as_of_date
 
 reload(sys)
 sys.setdefaultencoding('utf8')
@@ -40,14 +47,20 @@ def parse_command_line():
     parser.add_argument("-q", "--quarter", action="store_true", help="Get all filings in last quarter.")
     parser.add_argument("--all", action="store_true", help="Get all filings since Q3 1994.")
     parser.add_argument("-p", "--pickle", action="store_true", help="Use pickled data instead of scraping.")
-    parser.add_argument("--full", action="store_true", help="Use pickled data instead of scraping.")
+    parser.add_argument("--full", action="store_true", help="Build the Form D manifest from the pickled full-index files.")
     parser.add_argument("-c", "--complete", action="store_true", help="use complete_formd.pkl data.")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_WORKERS, help="Number of concurrent fetch workers.")
+    parser.add_argument("-r", "--rate", type=float, default=DEFAULT_RATE, help="Maximum requests per second to sec.gov.")
+    parser.add_argument("--shard", default="0/1", help="Backfill shard to work on with --complete, e.g. 2/4.")
+    parser.add_argument("--cache-dir", default=None, help="Directory of the local EDGAR file cache.")
+    parser.add_argument("--offline", action="store_true", help="Serve everything from the local cache, no network.")
     args = parser.parse_args()
     return args
 
 
 def main():
     args = parse_command_line()
+    filing_cache.configure(cache_dir=args.cache_dir, offline_mode=args.offline or None)
     
     base_url = "https://www.sec.gov/Archives/edgar/daily-index/"
     archive_url = "https://www.sec.gov/Archives/"
@@ -55,7 +68,7 @@ def main():
     if args.single:
         now = datetime.datetime.now() 
         yesterday = now - datetime.timedelta(days=1)
-        filings = single_day(yesterday)
+        filings = single_day(yesterday, workers=args.workers, rate=args.rate)
         print(filings)
 
     elif args.quarter:
@@ -66,7 +79,7 @@ def main():
         quarter_num = (yesterday.month-1)//3 + 1
         quarter = "QTR{0}".format(quarter_num)
         quarter_url = "{0}{1}/{2}/".format(base_url, year, quarter)
-        form_files = traverse(quarter_url)
+        form_files = traverse(quarter_url, workers=args.workers, rate=args.rate)
         print(form_files)
         with open("last_quarter_form_files.pkl", "wb") as f:
             pickle.dump(form_files, f)
@@ -74,7 +87,7 @@ def main():
     elif args.all:
         # get all files for all time
         base_url = "https://www.sec.gov/Archives/edgar/full-index/"
-        form_files = full_index_traverse(base_url)
+        form_files = full_index_traverse(base_url, workers=args.workers, rate=args.rate)
         print(form_files)
         with open("all_form_files_fullindex.pkl", "wb") as f:
             pickle.dump(form_files, f)
@@ -85,33 +98,11 @@ def main():
             with open("complete_formd.pkl", "rb") as f:
                 form_files = pickle.load(f)   
 
-            filings = {}
-            for i, rel_link in enumerate(form_files):
-                full_url = archive_url + rel_link
-                try:
-                    contents = get_file_contents(full_url)
-                except ssl.SSLError as e:
-                    time.sleep(2)
-                    try:
-                        contents = get_file_contents(full_url)
-                    except ssl.SSLError as e:
-                        contents = {}
-                except ValueError as e:
-                    print("Value Error hit - empty contents")
-                    contents = {}
-                filings[full_url] = contents
-                
-                # save periodically to deal with unanticipated parsing errors
-                if i % 2000 == 0 and i != 0:
-                    print(i)
-                    print("saving...")
-                    with open("scraped_formd_dict_{0}.json".format(i % 24000), "wb") as f:
-                        json.dump(filings, f)
-                    print("saved.")
-                    time.sleep(1)
-            # final save
-            with open("scraped_formd_dict_{0}.json".format(i % 24000), "wb") as f:
-                json.dump(filings, f)
+            # progress lives in a durable queue, so rerunning resumes where it stopped
+            conn = backfill.connect(backfill.QUEUE_DB)
+            backfill.seed(conn, (archive_url + rel_link for rel_link in form_files))
+            shard, num_shards = backfill.parse_shard(args.shard)
+            backfill.run(backfill.QUEUE_DB, shard, num_shards, workers=args.workers, rate=args.rate)
             
         else:
             # only get file contents for one quarter of data based on -q flag output
@@ -131,101 +122,228 @@ def main():
         with open("all_form_files_fullindex.pkl", "rb") as f:
             all_form_files = pickle.load(f)
 
-        all_form_files = all_form_files[90:]
-        all_urls = []
-        total_len = 0
-        for i, form_file in enumerate(all_form_files):
-
-            links = get_relative_links(form_file)
-            all_urls = all_urls + links
-            total_len += len(links)
-            print("{0}: {1}".format(form_file, total_len))
-            if i == 100:
-                print(len(all_urls))
-
-
-            with open("form_d_links_{0}.pkl".format(i+100), "wb") as f:
-                pickle.dump(all_urls, f)
+        added = build_manifest(all_form_files, workers=args.workers, rate=args.rate)
+        print("{0} Form D filings added to {1}".format(added, MANIFEST_FILE))
     return 0
 
 
-def single_day(day):
+def single_day(day, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
     """
     Retrieves the filings for a single day of Form D publication.
 
     Args:
         day: dt.Datetime object specifying a date to scrape
+        workers: number of filings to download concurrently
+        rate: maximum requests per second across all workers
     Return:
         filings: dictionary of filings where the key is the 
             full url of the filing and the value is a dict
             of the relevant contents as pulled by the 
             get_file_contents() function from parse_form_d.py
     """
-    base_url = "https://www.sec.gov/Archives/edgar/daily-index/"
-    archive_url = "https://www.sec.gov/Archives/"
+    filings, failed = scrape_day(day, workers=workers, rate=rate)
+    for full_url in failed:
+        filings[full_url] = {}
+    return filings
 
-    formatted_day = day.strftime("%Y%m%d")
-    year = day.strftime("%Y")
-    
-    quarter_num = (day.month-1)//3 + 1
-    quarter = "QTR{0}".format(quarter_num)
 
-    idx_file = "{3}/{0}/{1}/form.{2}.idx".format(year, quarter, formatted_day, base_url)
-    
-    rel_url_list = get_relative_links(idx_file)
+def scrape_day(day, skip=(), workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, progress=None):
+    """
+    Scrapes one day's Form D filings, leaving out any already loaded.
+
+    Args:
+        day: dt.Datetime or dt.date of the daily index to scrape
+        skip: collection of accession numbers not to fetch again
+        workers: number of filings to download concurrently
+        rate: maximum requests per second across all workers
+        progress: optional function called with (filings done, total)
+            before the first filing and after each one
+    Return:
+        filings: dict of full url to contents for every filing fetched
+        failed: list of full urls that could not be fetched
+    """
+    archive_url = "https://www.sec.gov/Archives/"
+    urls = [archive_url + record.path for record in iter_index_records(daily_index_url(day))
+            if accession_number(record.path) not in skip]
 
     filings = {}
-    for i, url in enumerate(rel_url_list):
-        full_url = archive_url + url
-        contents = get_file_contents(full_url)
-        print(i)
+    failed = []
+    if progress is not None:
+        progress(0, len(urls))
+    results = fetch_all(urls, parse=parse_filing, workers=workers, rate=rate)
+    for i, (full_url, contents, error) in enumerate(results):
+        if progress is not None:
+            progress(i + 1, len(urls))
+        if error is not None:
+            print("    Could not get page: {0}".format(full_url), file=sys.stderr)
+            failed.append(full_url)
+            continue
         filings[full_url] = contents
 
-    return filings
+    return filings, failed
+
+
+def daily_index_url(day):
+    base_url = "https://www.sec.gov/Archives/edgar/daily-index/"
+    quarter = "QTR{0}".format((day.month-1)//3 + 1)
+    return "{0}{1}/{2}/form.{3}.idx".format(base_url, day.strftime("%Y"), quarter, day.strftime("%Y%m%d"))
+
+
+def daily_index_dates(start, end):
+    """
+    Lists the days between start and end (inclusive) that have a daily
+    form index, using each quarter's index.json directory listing.
+    Weekends and holidays have no index file.
+
+    Args:
+        start, end: dt.date bounds
+    Returns:
+        sorted list of dt.date
+    Raises:
+        IOError if a quarter's listing cannot be retrieved
+    """
+    base_url = "https://www.sec.gov/Archives/edgar/daily-index/"
+    form_pattern = re.compile(r"^form\.(\d{8})\.idx$")
+    dates = []
+    year, quarter = start.year, (start.month-1)//3 + 1
+    while (year, quarter) <= (end.year, (end.month-1)//3 + 1):
+        listing = "{0}{1}/QTR{2}/index.json".format(base_url, year, quarter)
+        response = get_page(listing)
+        if response == 0:
+            raise IOError("Could not get daily index listing: {0}".format(listing))
+        for item in json.load(response)["directory"]["item"]:
+            match = form_pattern.match(item["href"])
+            if match:
+                day = parse_index_date(match.group(1))
+                if start <= day <= end:
+                    dates.append(day)
+        year, quarter = (year + 1, 1) if quarter == 4 else (year, quarter + 1)
+    return sorted(dates)
+
+
+def accession_number(path):
+    """
+    Accession number of a filing from its path or url,
+    e.g. "edgar/data/1234/0001234-18-000001.txt" -> "0001234-18-000001".
+    """
+    return path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+
+
+IndexRecord = namedtuple("IndexRecord", ["form_type", "company", "cik", "date_filed", "path"])
+
+FORM_D_TYPES = ("D", "D/A")
+MANIFEST_FILE = "form_d_manifest.jsonl"
 
 
 def get_relative_links(idx_file):
     """
-    Uses regular expressions to extract the relative urls
-    for Form D and Form D/A filings.
+    Extracts the relative urls for Form D and Form D/A filings.
 
     Args:
         idx_file - url to form filings
     Returns:
         rel_url_list - list of strings of form "edgar/data/[numbers]/[filename].txt"
     """
-    response = get_page(idx_file)
+    return [record.path for record in iter_index_records(idx_file)]
 
-    # handles gzip-compressed files
-    if idx_file.endswith(".gz"):
-        with open("temp.txt", "w") as f:
-            content = response.read()
-            f.write(content)
-            f.close()
-        
-        with gzip.open("temp.txt", "rb") as f:
-            data = f.readlines()
-        os.remove("temp.txt")
-    else:
-        data = response.readlines()
-
-    rel_url_pattern = re.compile(r"edgar/data/[\S]+txt")
-    rel_url_list = []
-    for i, line in enumerate(data):
-        # check if the line is for a Form D or Form D/A
+
+def iter_index_records(idx_file, form_types=FORM_D_TYPES):
+    """
+    Streams a form index file (daily form.YYYYMMDD.idx or full-index
+    form.idx, optionally .gz) and yields one record per filing of the
+    requested form types. The body is read off the connection (or the
+    cache file) a chunk at a time by open_page, and compressed files
+    are inflated chunk by chunk as they are read, so memory use does
+    not grow with the size of the index.
+
+    Args:
+        idx_file - url to form filings
+        form_types - form types to keep, e.g. ("D", "D/A")
+    Returns:
+        generator of IndexRecord(form_type, company, cik, date_filed, path)
+            where date_filed is a datetime.date and path is of the
+            form "edgar/data/[numbers]/[filename].txt"
+    Raises:
+        IOError if the index file cannot be retrieved
+    """
+    response = open_page(idx_file)
+    if response == 0:
+        raise IOError("Could not get index file: {0}".format(idx_file))
+    return iter_closing(parse_index(response, compressed=idx_file.endswith(".gz"), form_types=form_types),
+                        response)
+
+
+def iter_closing(items, response):
+    """
+    Yields the items, closing the response once they are done or the
+    caller stops early.
+    """
+    try:
+        for item in items:
+            yield item
+    finally:
+        response.close()
+
+
+def parse_index(response, compressed=False, form_types=FORM_D_TYPES):
+    """
+    Yields IndexRecords from an index file that has already been
+    opened or downloaded. See iter_index_records.
+
+    Args:
+        response - file-like object with the raw index file body
+        compressed - True if the body is gzipped (.idx.gz)
+        form_types - form types to keep
+    """
+    # the form type column runs up to the "Company Name" header; the
+    # other columns are read from the right since names contain spaces
+    company_col = 12
+    prefixes = tuple("{0} ".format(form_type).encode("ascii") for form_type in form_types)
+    for line in iter_lines(response, compressed=compressed):
+        if not line.startswith(prefixes):
+            if line.startswith(b"Form Type"):
+                company_col = line.index(b"Company Name")
+            continue
         line = unicode(line, errors="replace")
-        if line.startswith("D ") or line.startswith("D/A "):
-            # if so, get the url at the end
-            match = re.search(rel_url_pattern, line)
-            
-            if match == None:
-                print("Failed to parse Form D line")
-            else:
-                rel_url = match.group(0)
-            
-            rel_url_list.append(rel_url)
-    
-    return rel_url_list
+        form_type = line[:company_col].rstrip()
+        if form_type not in form_types:
+            continue
+        fields = line[company_col:].rsplit(None, 3)
+        if len(fields) != 4 or not fields[3].startswith("edgar/data/"):
+            print("Failed to parse Form D line: {0}".format(line.rstrip()), file=sys.stderr)
+            continue
+        company, cik, date_filed, path = fields
+        yield IndexRecord(form_type, company, cik, parse_index_date(date_filed), path)
+
+
+def iter_lines(response, compressed=False, chunk_size=65536):
+    """
+    Yields the lines of a response body, gunzipping on the fly.
+    """
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if compressed else None
+    pending = b""
+    while True:
+        chunk = response.read(chunk_size)
+        if not chunk:
+            break
+        if inflater is not None:
+            chunk = inflater.decompress(chunk)
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    if inflater is not None:
+        pending += inflater.flush()
+    for line in pending.split(b"\n"):
+        if line:
+            yield line
+
+
+def parse_index_date(date_filed):
+    # daily indexes use 20180502, full-index files use 2018-05-02
+    if "-" in date_filed:
+        return datetime.datetime.strptime(date_filed, "%Y-%m-%d").date()
+    return datetime.datetime.strptime(date_filed, "%Y%m%d").date()
 
 
 def get_file_contents(url):
@@ -235,14 +353,46 @@ def get_file_contents(url):
     Args:
         url - full url for a valid Form
     Returns:
-        contents_dict - dict with four keys as follows:
+        contents_dict - dict with five keys as follows:
             Primary Issuer: contains contact info for primary issuer
             Secondary Issuers: contains info about secondary issuers
             Related People: info on key individuals working at firm
             Offering Data: all numerical data and fund type data
+            Date Filed: "YYYY-MM-DD" from the EDGAR header, or None
             See parse_formd.py for more information.
     """
-    soup = make_soup(url)
+    response = get_page(url)
+    if response == 0:
+        print("    Could not get page: {0}".format(url), file=sys.stderr)
+        return {}
+    return parse_filing(response.read())
+
+
+def parse_filing(text):
+    """
+    Parse the raw text of a Form D or D/A submission that has
+    already been downloaded, e.g. by fetcher.fetch_all. Uses the
+    streaming parser in formd_xml.py.
+
+    Args:
+        text - full body of the .txt submission
+    Returns:
+        contents_dict - same dict as get_file_contents()
+    """
+    return parse_submission(text)
+
+
+def extract_contents(soup):
+    """
+    Pull the Form D fields out of a BeautifulSoup of the submission.
+    This is the original soup-based parser; parse_filing replaces it
+    and it is kept as the reference for parity checks.
+
+    Args:
+        soup - BeautifulSoup of the full .txt submission
+    Returns:
+        contents_dict - see get_file_contents()
+    """
     if soup.xml == None:
         return {}
     form_d = soup.xml.edgarsubmission
@@ -291,72 +441,143 @@ def get_file_contents(url):
     contents_dict["Related People"] = related_people
     contents_dict["Offering Data"] = offering_data
 
+    date_filed = None
+    header = soup.find("sec-header")
+    if header != None:
+        date_filed = filed_as_of_date(header.get_text())
+    contents_dict["Date Filed"] = date_filed
+
     return contents_dict
 
 
-def traverse(url):
+def traverse(url, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
     """
-    Recursively traverse the EDGAR data directory tree 
-    and return the names of all form files.
+    Traverse the EDGAR data directory tree and return the
+    names of all form files.
 
     Args:
-        url - base url from which to begin the recursive traversal.
+        url - base url from which to begin the traversal.
     Returns:
         form_files - list of filenames to each be parsed by get_links_list
     """
-    form_files = []
-    url_json = url + "index.json"
-    response = get_page(url_json)
-    data = json.load(response)
-    items = data["directory"]["item"]
-    
-    for rel_link in items:
-        href = rel_link["href"]
-        full_link = url + href
-
-        # if the item is a subdirectory, traverse it
-        if rel_link["type"] == "dir":
-            print(href)
-            form_files = form_files + traverse(full_link)
-        
-        # if the item is a file, add to list
-        if rel_link["type"] == "file":
-            if href.startswith("form"):
-                form_files.append(full_link)
-    
-    return form_files
+    return list(discover_index_files(url, "form", workers=workers, rate=rate))
+
 
-def full_index_traverse(url):
+def full_index_traverse(url, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
     """
-    Recursively traverse the EDGAR data directory tree 
-    and return the names of all form files.
+    Traverse the EDGAR full-index directory tree and return
+    the names of all form.idx files.
 
     Args:
-        url - base url from which to begin the recursive traversal.
+        url - base url from which to begin the traversal.
     Returns:
         form_files - list of filenames to each be parsed by get_links_list
     """
-    form_files = []
-    url_json = url + "index.json"
-    response = get_page(url_json)
-    data = json.load(response)
-    items = data["directory"]["item"]
-    
-    for rel_link in items:
-        href = rel_link["href"]
-        full_link = url + href
-
-        # if the item is a subdirectory, traverse it
-        if rel_link["type"] == "dir":
-            print(href)
-            form_files = form_files + full_index_traverse(full_link)
-        
-        # if the item is a file, add to list
-        if rel_link["type"] == "file":
-            if href.startswith("form.idx"):
-                form_files.append(full_link)
-    
-    return form_files
+    return list(discover_index_files(url, "form.idx", workers=workers, rate=rate))
+
+
+def discover_index_files(url, prefix, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """
+    Breadth-first walk of an EDGAR directory tree. Every directory
+    listing (index.json) on one level of the tree is fetched in
+    parallel, and matching files are yielded as soon as their
+    directory has been read.
+
+    Args:
+        url - base url of the tree, ending in "/"
+        prefix - yield files whose names start with this, e.g. "form.idx"
+        workers - number of listings to fetch concurrently
+        rate - maximum requests per second
+    Returns:
+        generator of full urls of the matching files
+    """
+    level = [url]
+    while level:
+        next_level = []
+        listings = (dir_url + "index.json" for dir_url in level)
+        for listing_url, data, error in fetch_all(listings, parse=json.loads, workers=workers, rate=rate):
+            if error is not None:
+                print("    Could not list {0}: {1}".format(listing_url, error), file=sys.stderr)
+                continue
+            dir_url = listing_url[:-len("index.json")]
+            for item in data["directory"]["item"]:
+                href = item["href"]
+                if item["type"] == "dir":
+                    next_level.append(dir_url + href)
+                elif item["type"] == "file" and href.startswith(prefix):
+                    yield dir_url + href
+        # keep the walk in a stable order from one level to the next
+        level = sorted(next_level)
+
+
+def build_manifest(index_files, manifest_file=MANIFEST_FILE, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """
+    Reads every form index file and appends its Form D filings to a
+    JSON Lines manifest, one record per filing, followed by a marker
+    {"index": ..., "done": true, "filings": n} for the index file, even
+    when it has no Form D filings. Index files with a marker are
+    skipped, so an interrupted run can be resumed; see done_index_files.
+
+    Args:
+        index_files - urls of form index files
+        manifest_file - path of the manifest to append to
+    Returns:
+        number of filings added
+    """
+    done = done_index_files(manifest_file)
+    added = 0
+    todo = [idx_file for idx_file in index_files if idx_file not in done]
+    with open(manifest_file, "ab") as out:
+        for idx_file, body, error in fetch_all(todo, workers=workers, rate=rate):
+            if error is not None:
+                print("    Could not get index file: {0}".format(idx_file), file=sys.stderr)
+                continue
+            lines = []
+            for record in parse_index(io.BytesIO(body), compressed=idx_file.endswith(".gz")):
+                entry = record._asdict()
+                entry["date_filed"] = record.date_filed.isoformat()
+                entry["index"] = idx_file
+                lines.append(json.dumps(entry) + "\n")
+            added += len(lines)
+            lines.append(json.dumps({"index": idx_file, "done": True, "filings": len(lines)}) + "\n")
+            # one write per index file keeps its records and marker together
+            out.write("".join(lines))
+            out.flush()
+            print("{0}: {1}".format(idx_file, len(lines) - 1))
+    return added
+
+
+def done_index_files(manifest_file):
+    """
+    Index files with a done marker in a manifest written by
+    build_manifest. A run that was interrupted can leave a partly
+    written last line, which is cut off here so the next run appends
+    whole lines; records of an index file with no marker are written
+    again when it is re-read (backfill.py --seed ignores duplicates).
+
+    Returns:
+        set of index file urls
+    """
+    done = set()
+    if not os.path.exists(manifest_file):
+        return done
+    with open(manifest_file, "r+b") as f:
+        end = 0
+        position = 0
+        for line in f:
+            position += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not line.endswith(b"\n"):
+                continue
+            end = position
+            if entry.get("done"):
+                done.add(entry["index"])
+        if end < position:
+            f.truncate(end)
+    return done
 
 
 #### Helper Functions for Web Scraping
@@ -371,13 +592,43 @@ def make_soup(url):
 
     return BeautifulSoup(html, 'lxml')
     
-def get_page(url):
+def open_page(url, timeout=http_client.DEFAULT_TIMEOUT):
+    """
+    Like get_page, but the body is streamed: read from the connection
+    or the cache file as it is consumed rather than all at once. The
+    caller should close() the response.
+
+    Returns:
+        file-like response with read(size) and close(), or 0 if the
+            page could not be retrieved
+    """
+    try:
+        response = filing_cache.get_stream(url, timeout=timeout)
+    except (filing_cache.CacheMiss, http_client.HTTPError, httplib.HTTPException, socket.error) as e:
+        return 0
+    if response.status != 200:
+        response.close()
+        return 0
+    return response
+
+
+def get_page(url, timeout=http_client.DEFAULT_TIMEOUT):
+    """
+    Fetch a url through the local cache in filing_cache.py, which
+    goes to the shared keep-alive pool in http_client on a miss.
+
+    Args:
+        url - full url to fetch
+        timeout - socket timeout in seconds for this request
+    Returns:
+        file-like response with the decoded body, or 0 if the page
+            could not be retrieved (or is not cached in offline mode)
+    """
     try:
-        socket.setdefaulttimeout(2)
-        response = urllib2.urlopen(url)
-    except urllib2.URLError as e:
+        response = filing_cache.get(url, timeout=timeout)
+    except (filing_cache.CacheMiss, http_client.HTTPError, httplib.HTTPException, socket.error) as e:
         return 0
-    except socket.timeout as e:
+    if response.status != 200:
         return 0
     return response
     
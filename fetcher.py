@@ -0,0 +1,127 @@
+"""
+File: fetcher.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Concurrent Form D Fetching
+
+Bounded-concurrency fetch engine used by the scraper to
+download many filings at once. A fixed pool of worker
+threads pulls urls from a shared queue and requests them
+through the local filing cache (falling back to the keep-alive
+pool in http_client), and a single
+rate limiter shared by all workers keeps the whole pool
+under the SEC's fair-access limit; filings served from the
+cache are not throttled. Results are yielded in completion order.
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import time
+import threading
+import Queue
+import http_client
+import filing_cache
+from http_client import DEFAULT_TIMEOUT
+
+# the SEC asks automated tools to stay at or below 10 requests per second
+DEFAULT_WORKERS = 8
+DEFAULT_RATE = 10
+
+_DONE = object()
+
+
+class RateLimiter(object):
+    """
+    Thread-safe limiter that spaces calls to wait() so that no
+    more than `rate` of them complete per second across all threads.
+    A rate of None or 0 disables limiting.
+    """
+    def __init__(self, rate=DEFAULT_RATE):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.time()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.time()
+            slot = max(self._next, now)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def fetch_all(urls, parse=None, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, timeout=DEFAULT_TIMEOUT):
+    """
+    Fetch every url with a bounded pool of worker threads and
+    stream the results back as they complete.
+
+    Args:
+        urls: iterable of full urls, consumed lazily
+        parse: optional function applied to each response body
+            inside the worker, e.g. edgar.parse_filing
+        workers: number of concurrent worker threads
+        rate: global cap on requests per second (None for no cap)
+        timeout: per-request socket timeout in seconds
+    Returns:
+        generator of (url, result, error) tuples in completion order,
+            where result is the parsed body (or raw body if no parse
+            function is given) and error is None or the exception hit
+    """
+    limiter = RateLimiter(rate)
+    tasks = Queue.Queue(maxsize=workers * 2)
+    results = Queue.Queue()
+    stop = threading.Event()
+
+    def feed():
+        for url in urls:
+            while not stop.is_set():
+                try:
+                    tasks.put(url, timeout=0.5)
+                    break
+                except Queue.Full:
+                    continue
+            if stop.is_set():
+                return
+        for _ in range(workers):
+            tasks.put(_DONE)
+
+    def work():
+        while not stop.is_set():
+            try:
+                url = tasks.get(timeout=0.5)
+            except Queue.Empty:
+                continue
+            if url is _DONE:
+                break
+            try:
+                # only requests that go to the network count against the rate
+                response = filing_cache.get(url, timeout=timeout, wait=limiter.wait)
+                if response.status != 200:
+                    raise http_client.HTTPError(response.status, url)
+                body = response.read()
+                result = parse(body) if parse is not None else body
+                results.put((url, result, None))
+            except Exception as e:
+                results.put((url, {} if parse is not None else None, e))
+        results.put(_DONE)
+
+    threads = [threading.Thread(target=feed)]
+    threads += [threading.Thread(target=work) for _ in range(workers)]
+    for t in threads:
+        t.daemon = True
+        t.start()
+
+    finished = 0
+    try:
+        while finished < workers:
+            item = results.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            yield item
+    finally:
+        # stops the pool if the caller abandons the generator early
+        stop.set()
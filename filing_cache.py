@@ -0,0 +1,308 @@
+"""
+File: filing_cache.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Local Cache of Raw EDGAR Files
+
+On-disk, gzip-compressed cache of everything the scraper pulls
+from the EDGAR archive, laid out by archive path so filings end
+up sharded by CIK:
+
+    <cache dir>/edgar/data/<cik>/<accession>.txt.gz
+    <cache dir>/edgar/daily-index/<year>/<quarter>/form.<date>.idx.gz
+
+Filings never change once accepted, so a cached filing is served
+without touching the network. Index files and directory listings
+do change, so they are revalidated with If-None-Match and
+If-Modified-Since and only re-downloaded when sec.gov says they
+changed. In offline mode only the cache is used, which lets the
+parsers be re-run over the whole corpus without any requests.
+get_stream does the same for bodies too large to hold in memory:
+a cached file is read from disk as it is consumed, and a
+downloaded one is written to the cache as it is read.
+"""
+from __future__ import unicode_literals
+import os
+import gzip
+import json
+import time
+import tempfile
+import http_client
+
+CACHE_DIR = os.environ.get("FORMD_CACHE_DIR", "data/edgar_cache")
+offline = os.environ.get("FORMD_OFFLINE", "") not in ("", "0")
+
+ARCHIVE_MARKER = "/Archives/"
+FILING_PREFIX = "edgar/data/"
+
+
+class CacheMiss(Exception):
+    pass
+
+
+def configure(cache_dir=None, offline_mode=None):
+    """
+    Change the cache directory and/or switch offline mode on or off
+    for the whole process.
+    """
+    global CACHE_DIR, offline
+    if cache_dir is not None:
+        CACHE_DIR = cache_dir
+    if offline_mode is not None:
+        offline = offline_mode
+
+
+def archive_path(url):
+    """
+    Relative archive path of a url, e.g. "edgar/data/1234/0001234-18-000001.txt",
+    or None if the url is not in the EDGAR archive.
+    """
+    idx = url.find(ARCHIVE_MARKER)
+    if idx == -1:
+        return None
+    path = url[idx + len(ARCHIVE_MARKER):].split("?", 1)[0]
+    if not path or path.endswith("/") or ".." in path.split("/"):
+        return None
+    return path
+
+
+def is_immutable(path):
+    return path.startswith(FILING_PREFIX) and path.endswith(".txt")
+
+
+def cache_file(path):
+    if not path.endswith(".gz"):
+        path += ".gz"
+    return os.path.join(CACHE_DIR, *path.split("/"))
+
+
+def get(url, timeout=http_client.DEFAULT_TIMEOUT, wait=None):
+    """
+    GET a url through the cache.
+
+    Args:
+        url - full url; urls outside the EDGAR archive are not cached
+        timeout - socket timeout for a network request
+        wait - optional function called before a network request, but
+            not when the url is served from the cache, e.g. a rate
+            limiter's wait
+    Returns:
+        http_client.Response; status 200 whether it came from the
+            cache or the network, any other status is passed through
+    Raises:
+        CacheMiss in offline mode when the url is not cached, otherwise
+            whatever http_client.get raises
+    """
+    path = archive_path(url)
+    if path is None:
+        if offline:
+            raise CacheMiss(url)
+        if wait is not None:
+            wait()
+        return http_client.get(url, timeout=timeout)
+
+    filename = cache_file(path)
+    body, meta = _read(filename, path)
+
+    if body is not None and (offline or is_immutable(path)):
+        return http_client.Response(url, 200, {}, body)
+    if offline:
+        raise CacheMiss(url)
+
+    headers = {}
+    if body is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    if wait is not None:
+        wait()
+    response = http_client.get(url, headers=headers, timeout=timeout)
+    if response.status == 304 and body is not None:
+        return http_client.Response(url, 200, {}, body)
+    if response.status == 200:
+        _write(filename, path, response)
+    return response
+
+
+def get_stream(url, timeout=http_client.DEFAULT_TIMEOUT, wait=None):
+    """
+    Like get, but the body is read as it is consumed: from the cache
+    file on a hit, or from the connection on a miss, written to the
+    cache as it goes and only stored once it has been read to the end.
+    The caller should close() the response.
+
+    Returns:
+        file-like response with read(size) and close(); any status
+            other than 200 is passed through with its body read
+    """
+    path = archive_path(url)
+    if path is None:
+        if offline:
+            raise CacheMiss(url)
+        if wait is not None:
+            wait()
+        return http_client.stream(url, timeout=timeout)
+
+    filename = cache_file(path)
+    cached = os.path.exists(filename)
+    meta = _read_meta(filename, path) if cached else {}
+
+    if cached and (offline or is_immutable(path)):
+        return CachedFile(filename, path)
+    if offline:
+        raise CacheMiss(url)
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    if wait is not None:
+        wait()
+    response = http_client.stream(url, headers=headers, timeout=timeout)
+    if response.status == 304 and cached:
+        return CachedFile(filename, path)
+    if response.status == 200:
+        return CachingReader(response, filename, path)
+    return response
+
+
+class CachingReader(object):
+    """
+    Passes a streamed response through, writing what is read to a
+    temporary file that replaces the cache file once the whole body
+    has been read. Closing it early leaves the cache unchanged.
+    """
+    def __init__(self, response, filename, path):
+        self.response = response
+        self.url = response.url
+        self.status = response.status
+        self.headers = response.headers
+        self.filename = filename
+        self.path = path
+        _make_dirs(os.path.dirname(filename))
+        fd, self.tmp = tempfile.mkstemp(dir=os.path.dirname(filename))
+        self.file = os.fdopen(fd, "wb")
+        if path.endswith(".gz"):
+            self.out = self.file
+        else:
+            self.out = gzip.GzipFile(fileobj=self.file, mode="wb", compresslevel=6)
+        self.closed = False
+
+    def read(self, size=-1):
+        data = self.response.read(size)
+        if data:
+            self.out.write(data)
+        # an empty read, or a read of everything, is the end of the body
+        if (not data or size < 0) and not self.closed:
+            self._finish(True)
+        return data
+
+    def close(self):
+        if not self.closed:
+            self.response.close()
+            self._finish(False)
+
+    def _finish(self, complete):
+        self.closed = True
+        if self.out is not self.file:
+            self.out.close()
+        self.file.close()
+        if complete:
+            os.rename(self.tmp, self.filename)
+            _write_meta(self.filename, self.path, self.headers)
+        else:
+            os.remove(self.tmp)
+
+    def getcode(self):
+        return self.status
+
+    def info(self):
+        return self.headers
+
+
+class CachedFile(object):
+    """
+    A cache file opened for reading, with a response's status.
+    """
+    def __init__(self, filename, path):
+        self.status = 200
+        self.headers = {}
+        if path.endswith(".gz"):
+            self.file = open(filename, "rb")
+        else:
+            self.file = gzip.open(filename, "rb")
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def close(self):
+        self.file.close()
+
+    def getcode(self):
+        return self.status
+
+    def info(self):
+        return self.headers
+
+
+def _read_meta(filename, path):
+    meta = {}
+    if not is_immutable(path) and os.path.exists(filename + ".meta"):
+        with open(filename + ".meta", "rb") as f:
+            meta = json.load(f)
+    return meta
+
+
+def _read(filename, path):
+    if not os.path.exists(filename):
+        return None, {}
+    if path.endswith(".gz"):
+        # already-compressed index files are stored as downloaded
+        with open(filename, "rb") as f:
+            body = f.read()
+    else:
+        with gzip.open(filename, "rb") as f:
+            body = f.read()
+    return body, _read_meta(filename, path)
+
+
+def _make_dirs(directory):
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # another worker created it first
+            pass
+
+
+def _write(filename, path, response):
+    directory = os.path.dirname(filename)
+    _make_dirs(directory)
+
+    body = response.getvalue()
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "wb") as f:
+        if path.endswith(".gz"):
+            f.write(body)
+        else:
+            with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6) as gz:
+                gz.write(body)
+    # rename is atomic, so concurrent readers never see a partial file
+    os.rename(tmp, filename)
+    _write_meta(filename, path, response.headers)
+
+
+def _write_meta(filename, path, response_headers):
+    if not is_immutable(path):
+        headers = dict((k.lower(), v) for k, v in response_headers.items())
+        meta = {"etag": headers.get("etag"),
+                "last_modified": headers.get("last-modified"),
+                "fetched": time.time()}
+        with open(filename + ".meta", "wb") as f:
+            json.dump(meta, f)
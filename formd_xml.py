@@ -0,0 +1,269 @@
+"""
+File: formd_xml.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Streaming Form D XML Parser
+
+Pulls the <XML> document out of a raw .txt EDGAR submission
+and parses it incrementally with lxml's iterparse, handling
+each section of the Form D (primary issuer, issuer list, each
+related person, offering data) as soon as it closes and then
+discarding it. No BeautifulSoup tree is ever built.
+
+The output is the same dict as edgar.get_file_contents used to
+build from BeautifulSoup, including its quirks: values are the
+BeautifulSoup `.string` of the tag (None when a tag has several
+children), and relationship lists keep the whitespace text
+between <relationship> tags. The one difference is a value split
+by an XML comment, which is read whole here (BeautifulSoup gives
+None). See parse_form_d.py for the fields.
+"""
+from __future__ import unicode_literals
+import io
+import re
+from lxml import etree
+
+xml_section = re.compile(br"<XML>\s*(.*?)\s*</XML>", re.S | re.I)
+filed_as_of = re.compile(r"FILED AS OF DATE:\s*(\d{4})(\d{2})(\d{2})")
+
+SECTIONS = ("primaryissuer", "issuerlist", "relatedpersonslist", "offeringdata")
+
+
+def parse_submission(text):
+    """
+    Parse a full .txt Form D or D/A submission.
+
+    Args:
+        text - raw body of the submission as downloaded from EDGAR
+    Returns:
+        contents_dict - dict with the same keys as
+            edgar.get_file_contents, or {} if there is no XML document
+    """
+    if isinstance(text, unicode):
+        text = text.encode("utf8")
+    match = xml_section.search(text)
+    if match is None:
+        return {}
+
+    sections = {}
+    people = []
+    context = etree.iterparse(io.BytesIO(match.group(1)), events=("end",), recover=True)
+    for event, elem in context:
+        name = _name(elem)
+        if name is None:
+            continue
+        # lowercase tag names once so lookups below can run inside lxml
+        elem.tag = name
+        if name == "relatedpersoninfo":
+            people.append(extract_related_person(elem))
+        elif name == "relatedpersonslist" and name not in sections:
+            sections[name] = people
+        elif name in SECTIONS and name not in sections:
+            sections[name] = _extract_section(name, elem)
+        else:
+            continue
+        # drop the finished element and anything before it
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+    if "primaryissuer" not in sections:
+        raise ValueError("Form D XML has no primaryIssuer")
+    if "relatedpersonslist" not in sections:
+        raise ValueError("Form D XML has no relatedPersonsList")
+    if "offeringdata" not in sections:
+        raise ValueError("Form D XML has no offeringData")
+
+    contents_dict = {}
+    contents_dict["Primary Issuer"] = sections["primaryissuer"]
+    contents_dict["Secondary Issuers"] = sections.get("issuerlist", [])
+    contents_dict["Related People"] = sections["relatedpersonslist"]
+    contents_dict["Offering Data"] = sections["offeringdata"]
+    contents_dict["Date Filed"] = filed_as_of_date(text[:match.start()])
+    return contents_dict
+
+
+def filed_as_of_date(header):
+    """
+    "YYYY-MM-DD" from the FILED AS OF DATE line of an EDGAR header,
+    or None if there is no such line.
+    """
+    if isinstance(header, bytes):
+        header = header.decode("latin-1")
+    date = filed_as_of.search(header)
+    if date is None:
+        return None
+    return "-".join(date.groups())
+
+
+def _extract_section(name, elem):
+    if name == "primaryissuer":
+        return extract_issuer_info(elem)
+    if name == "issuerlist":
+        return [extract_issuer_info(issuer) for issuer in elem
+                if isinstance(issuer.tag, basestring) and issuer.tag != "over100issuerflag"]
+    return extract_offering_data(elem)
+
+
+#### Element helpers mirroring the BeautifulSoup lookups in parse_form_d.py
+def _name(elem):
+    tag = elem.tag
+    if not isinstance(tag, basestring):
+        return None
+    return tag.rsplit("}", 1)[-1].lower()
+
+
+def _find(elem, name):
+    """
+    First descendant with the given (lowercase) name, like `tag.name` in
+    BeautifulSoup. Returns None if there is no such element.
+    """
+    if elem is None:
+        raise AttributeError(name)
+    return elem.find(".//" + name)
+
+
+def _string(elem):
+    """
+    Equivalent of BeautifulSoup's `.string`: the text of a leaf element,
+    the string of an only child, otherwise None. Unlike `.string`, the
+    text of a leaf is not lost when a comment splits it; the comment is
+    left out.
+    """
+    if elem is None:
+        raise AttributeError("string")
+    children = [child for child in elem if isinstance(child.tag, basestring)]
+    if not children:
+        # itertext skips comments and processing instructions but keeps the text after them
+        text = "".join(elem.itertext())
+        return unicode(text) if text else None
+    if len(children) == 1 and not elem.text and not children[0].tail:
+        return _string(children[0])
+    return None
+
+
+def _path(elem, *names):
+    for name in names:
+        elem = _find(elem, name)
+    return elem
+
+
+#### Form D sections, see parse_form_d.py
+def extract_issuer_info(elem):
+    year_of_incorp = _path(elem, "yearofinc", "value")
+    if year_of_incorp is not None:
+        year_of_incorp = _string(year_of_incorp)
+
+    return {"cik": _string(_find(elem, "cik")),
+            "entity_name": _string(_find(elem, "entityname")),
+            "address": extract_address(_find(elem, "issueraddress")),
+            "phone": _string(_find(elem, "issuerphonenumber")),
+            "year_of_incorp": year_of_incorp}
+
+
+def extract_address(elem):
+    street1 = _string(_find(elem, "street1"))
+    street2 = _find(elem, "street2")
+    if street2 is not None:
+        street2 = _string(street2)
+    city = _string(_find(elem, "city"))
+    state = _string(_find(elem, "stateorcountry"))
+    full_state_name = _find(elem, "stateorcountrydescription")
+    if full_state_name is not None:
+        full_state_name = _string(full_state_name)
+    zip_code = _find(elem, "zipcode")
+    if zip_code is not None:
+        zip_code = _string(zip_code)
+
+    return {"street1": street1,
+            "street2": street2,
+            "city": city,
+            "state": state,
+            "full_state_name": full_state_name,
+            "zip_code": zip_code}
+
+
+def extract_related_person(elem):
+    relationships = []
+    rel_list = _find(elem, "relatedpersonrelationshiplist")
+    if rel_list.text:
+        relationships.append(unicode(rel_list.text))
+    for rel in rel_list:
+        if isinstance(rel.tag, basestring):
+            relationships.append(_string(rel))
+        if rel.tail:
+            relationships.append(unicode(rel.tail))
+
+    return {"first_name": _string(_path(elem, "relatedpersonname", "firstname")),
+            "last_name": _string(_path(elem, "relatedpersonname", "lastname")),
+            "address": extract_address(_find(elem, "relatedpersonaddress")),
+            "relationships": relationships}
+
+
+def extract_offering_data(elem):
+    ind_group_type = _string(_path(elem, "industrygroup", "industrygrouptype"))
+    issuer_size = _string(_find(elem, "issuersize"))
+
+    type_of_filing = _find(elem, "typeoffiling")
+    is_amend = _string(_path(type_of_filing, "neworamendment", "isamendment"))
+    new = is_amend == "false"
+    previous_accession_number = _path(type_of_filing, "neworamendment", "previousaccessionnumber")
+    if previous_accession_number is not None:
+        previous_accession_number = _string(previous_accession_number)
+
+    date_of_first_sale = None
+    date = _find(type_of_filing, "dateoffirstsale")
+    if date is not None:
+        yet = _find(date, "yettooccur")
+        if yet is None or _string(yet) != "true":
+            date_of_first_sale = _string(_find(date, "value"))
+
+    sec_types = _find(elem, "typesofsecuritiesoffered")
+    is_equity = True if _find(sec_types, "isequitytype") is not None else None
+    is_debt = True if _find(sec_types, "isdebttype") is not None else None
+    is_pooled_fund = True if _find(sec_types, "ispooledinvestmentfundtype") is not None else None
+    is_other = True if _find(sec_types, "isothertype") is not None else None
+
+    min_investment_accepted = int(_string(_find(elem, "minimuminvestmentaccepted")))
+
+    sales_amts = _find(elem, "offeringsalesamounts")
+    offer_amt = _string(_find(sales_amts, "totalofferingamount"))
+    total_amount_sold = int(_string(_find(sales_amts, "totalamountsold")))
+    if offer_amt == "Indefinite":
+        total_offering_amount = float("inf")
+        total_remaining = float("inf")
+    else:
+        total_offering_amount = int(offer_amt)
+        remaining = _string(_find(sales_amts, "totalremaining"))
+        total_remaining = float("inf") if remaining == "Indefinite" else int(remaining)
+
+    has_non_accred = None
+    num_non_accred = None
+    tot_num_inv = None
+    inv_info = _find(elem, "investors")
+    if inv_info is not None:
+        has_non_accred = _string(_find(inv_info, "hasnonaccreditedinvestors")) == "true"
+        if has_non_accred:
+            num_non_accred = _find(inv_info, "numbernonaccreditedinvestors")
+            if num_non_accred is not None:
+                num_non_accred = _string(num_non_accred)
+        tot_num_inv = _string(_find(inv_info, "totalnumberalreadyinvested"))
+
+    return {"ind_group_type": ind_group_type,
+            "issuer_size": issuer_size,
+            "new": new,
+            "previous_accession_number": previous_accession_number,
+            "date_of_first_sale": date_of_first_sale,
+            "is_equity": is_equity,
+            "is_debt": is_debt,
+            "is_pooled_fund": is_pooled_fund,
+            "is_other": is_other,
+            "min_investment_accepted": min_investment_accepted,
+            "total_offering_amount": total_offering_amount,
+            "total_amount_sold": total_amount_sold,
+            "total_remaining": total_remaining,
+            "has_non_accred": has_non_accred,
+            "num_non_accred": num_non_accred,
+            "tot_num_inv": tot_num_inv}
@@ -0,0 +1,262 @@
+"""
+File: http_client.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Pooled HTTP Client for EDGAR
+
+Keep-alive connection pool shared by every request the scraper
+makes to sec.gov. Connections are kept open per host and handed
+out to whichever thread needs one, so the TLS handshake is paid
+once per connection rather than once per filing. Requests carry
+their own timeout, ask for gzip/deflate transfer compression and
+are retried with exponential backoff on network errors and on
+the SEC's throttling and server error responses. Large bodies
+(index files) can be streamed: they are read off the socket and
+decompressed a chunk at a time instead of being held in memory.
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import sys
+import time
+import random
+import socket
+import httplib
+import urlparse
+import threading
+import zlib
+
+USER_AGENT = "Yale CS490 Form D research michael.byrnes@yale.edu"
+DEFAULT_TIMEOUT = 10
+MAX_RETRIES = 4
+BACKOFF = 0.5
+MAX_IDLE_PER_HOST = 16
+# bytes read off the socket at a time by a StreamingResponse
+STREAM_CHUNK = 65536
+
+# statuses worth retrying: throttled or a transient server-side failure
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, url):
+        Exception.__init__(self, "HTTP {0} for {1}".format(status, url))
+        self.status = status
+        self.url = url
+
+
+class Response(io.BytesIO):
+    """
+    Fully read and decoded response body. Behaves like the file
+    object urllib2.urlopen returns (read, readlines, iteration),
+    with the status and headers attached.
+    """
+    def __init__(self, url, status, headers, body):
+        io.BytesIO.__init__(self, body)
+        self.url = url
+        self.status = status
+        self.headers = headers
+
+    def getcode(self):
+        return self.status
+
+    def info(self):
+        return self.headers
+
+
+class StreamingResponse(object):
+    """
+    Response whose body is read from the connection as it is consumed
+    and decoded chunk by chunk, for bodies too large to hold in
+    memory. The connection goes back to the pool once the body has
+    been read to the end; closing it early drops the connection.
+    """
+    def __init__(self, url, raw, release):
+        self.url = url
+        self.status = raw.status
+        self.headers = dict(raw.getheaders())
+        self._raw = raw
+        self._release = release
+        self._decoder = _decoder(raw.getheader("content-encoding", ""))
+        self._buffer = b""
+        self._done = False
+
+    def read(self, size=-1):
+        while not self._done and (size < 0 or len(self._buffer) < size):
+            chunk = self._raw.read(STREAM_CHUNK)
+            if chunk:
+                self._buffer += self._decoder.decompress(chunk) if self._decoder else chunk
+            else:
+                if self._decoder is not None:
+                    self._buffer += self._decoder.flush()
+                self._done = True
+                self._release(True)
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        if not self._done:
+            self._done = True
+            self._release(False)
+        self._buffer = b""
+
+    def getcode(self):
+        return self.status
+
+    def info(self):
+        return self.headers
+
+
+class ConnectionPool(object):
+    """
+    Thread-safe pool of persistent HTTP(S) connections keyed by
+    (scheme, host).
+    """
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST):
+        self.max_idle_per_host = max_idle_per_host
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _checkout(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                conn = idle.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+        scheme, host = key
+        conn_class = httplib.HTTPSConnection if scheme == "https" else httplib.HTTPConnection
+        return conn_class(host, timeout=timeout), False
+
+    def _checkin(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, url, headers=None, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, stream=False):
+        """
+        GET a url, retrying with exponential backoff.
+
+        Args:
+            url: full http or https url
+            headers: optional dict of extra request headers
+            timeout: socket timeout in seconds for this request only
+            retries: number of retries after the first attempt
+            stream: return a 200 response's body as a StreamingResponse
+                instead of reading it all; errors while reading it are
+                not retried
+        Returns:
+            Response with the decoded body; non-2xx statuses that are
+                not worth retrying (404, 304, ...) are returned as-is
+        Raises:
+            HTTPError or socket.error once the retries run out
+        """
+        parts = urlparse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path + ("?" + parts.query if parts.query else "")
+        request_headers = {"User-Agent": USER_AGENT,
+                           "Accept-Encoding": "gzip, deflate",
+                           "Connection": "keep-alive"}
+        if headers:
+            request_headers.update(headers)
+
+        attempt = 0
+        while True:
+            conn, reused = self._checkout(key, timeout)
+            try:
+                conn.request("GET", path, headers=request_headers)
+                raw = conn.getresponse()
+                if stream and raw.status == 200:
+                    return StreamingResponse(url, raw, self._releaser(key, conn, raw))
+                body = raw.read()
+            except (httplib.HTTPException, socket.error) as e:
+                conn.close()
+                # an idle keep-alive connection the server already dropped
+                if reused and not isinstance(e, socket.timeout):
+                    continue
+                if attempt >= retries:
+                    raise
+            else:
+                if raw.getheader("connection", "").lower() == "close":
+                    conn.close()
+                else:
+                    self._checkin(key, conn)
+                if raw.status not in RETRY_STATUSES:
+                    body = _decode(body, raw.getheader("content-encoding", ""))
+                    return Response(url, raw.status, dict(raw.getheaders()), body)
+                if attempt >= retries:
+                    raise HTTPError(raw.status, url)
+            delay = BACKOFF * (2 ** attempt) * (1 + random.random())
+            print("    retrying {0} in {1:.1f}s".format(url, delay), file=sys.stderr)
+            time.sleep(delay)
+            attempt += 1
+
+    def _releaser(self, key, conn, raw):
+        def release(finished):
+            if finished and raw.getheader("connection", "").lower() != "close":
+                self._checkin(key, conn)
+            else:
+                conn.close()
+        return release
+
+    def close(self):
+        with self._lock:
+            for idle in self._idle.values():
+                for conn in idle:
+                    conn.close()
+            self._idle = {}
+
+
+def _decoder(encoding):
+    """
+    zlib decompressobj for a Content-Encoding, or None for identity.
+    Raw deflate without the zlib header is not supported when streaming.
+    """
+    encoding = encoding.lower()
+    if encoding == "gzip":
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.decompressobj()
+    return None
+
+
+def _decode(body, encoding):
+    encoding = encoding.lower()
+    if encoding == "gzip":
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # some servers send raw deflate without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+# process-wide pool used by edgar.get_page and fetcher.fetch_all
+pool = ConnectionPool()
+
+
+def get(url, headers=None, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES):
+    """
+    GET a url through the shared connection pool.
+    See ConnectionPool.request.
+    """
+    return pool.request(url, headers=headers, timeout=timeout, retries=retries)
+
+
+def stream(url, headers=None, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES):
+    """
+    GET a url through the shared connection pool, streaming a 200
+    response's body. See ConnectionPool.request.
+    """
+    return pool.request(url, headers=headers, timeout=timeout, retries=retries, stream=True)
@@ -90,6 +90,9 @@ def extract_offering_data(off_data):
         new = True
     else:
         new = False
+    previous_accession_number = type_of_filing.neworamendment.previousaccessionnumber
+    if previous_accession_number != None:
+        previous_accession_number = previous_accession_number.string
 
     date = type_of_filing.dateoffirstsale
     yet = None
@@ -152,6 +155,7 @@ def extract_offering_data(off_data):
             #"fund_type": fund_type,
             "issuer_size": issuer_size,
             "new": new, 
+            "previous_accession_number": previous_accession_number,
             "date_of_first_sale": date_of_first_sale,
             "is_equity": is_equity, 
             "is_debt": is_debt, 
@@ -0,0 +1,109 @@
+"""
+File: rescore.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Bulk Re-scoring of Stored Form D Filings
+
+Recomputes the predicted class and probability stored on every
+analyst_formd row with the current classifier model, e.g. after a
+new model is promoted. Rows already scored by the current model
+version are skipped unless --all is given, so an interrupted run
+can simply be started again.
+
+The table is split into id ranges that worker processes read and
+score in parallel; the main process writes each chunk's scores
+back in one transaction, so there is only ever one writer.
+
+Usage:
+    python rescore.py --workers 4
+    python rescore.py --all --chunk-size 20000
+"""
+from __future__ import print_function
+from __future__ import unicode_literals
+import time
+import sqlite3
+import argparse
+import multiprocessing
+import pandas as pd
+from classifier import registry, score_batch, stored_features, FEATURES
+from db_insert import DB_PATH, BUMP_GENERATION, connect
+
+CHUNK_SIZE = 10000
+
+SCORE_COLUMNS = ["id"] + [field for name, field in FEATURES if field is not None]
+
+
+def parse_command_line():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db", default=DB_PATH, help="Path of the web app's database.")
+    parser.add_argument("--all", action="store_true", help="Re-score rows already scored by the current model.")
+    parser.add_argument("-w", "--workers", type=int, default=multiprocessing.cpu_count(), help="Number of scoring processes.")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows scored per task.")
+    args = parser.parse_args()
+    return args
+
+
+def main():
+    args = parse_command_line()
+    tic = time.time()
+    count = rescore(args.db, args.workers, args.chunk_size, args.all)
+    print("rescore: {0} filings in {1:.1f}s with model {2}".format(count, time.time() - tic, registry.get().version))
+    return 0
+
+
+def rescore(db_path, workers=None, chunk_size=CHUNK_SIZE, rescore_all=False):
+    """
+    Re-scores analyst_formd in parallel chunks.
+
+    Returns:
+        number of rows scored
+    """
+    version = registry.get().version
+    conn = connect(db_path)
+    low, high = conn.execute("select min(id), max(id) from analyst_formd").fetchone()
+    if low is None:
+        return 0
+    tasks = [(db_path, start, start + chunk_size, None if rescore_all else version)
+             for start in range(low, high + 1, chunk_size)]
+
+    count = 0
+    pool = multiprocessing.Pool(workers)
+    try:
+        for scores in pool.imap_unordered(score_chunk, tasks):
+            conn.executemany("update analyst_formd set predicted_class = ?, predicted_prob = ?, model_version = ?"
+                             " where id = ?", scores)
+            conn.execute(BUMP_GENERATION)
+            conn.commit()
+            count += len(scores)
+    finally:
+        pool.close()
+        pool.join()
+    return count
+
+
+def score_chunk(task):
+    """
+    Scores the rows with start <= id < end, skipping those already
+    scored by skip_version. Runs in a worker process.
+
+    Returns:
+        list of (predicted_class, predicted_prob, model_version, id)
+    """
+    db_path, start, end, skip_version = task
+    conn = sqlite3.connect(db_path, timeout=60)
+    sql = "select {0} from analyst_formd where id >= ? and id < ?".format(",".join(SCORE_COLUMNS))
+    params = [start, end]
+    if skip_version is not None:
+        sql += " and (model_version is null or model_version != ?)"
+        params.append(skip_version)
+    firms = pd.DataFrame.from_records(conn.execute(sql, params).fetchall(), columns=SCORE_COLUMNS)
+    conn.close()
+
+    classes, probs, version = score_batch(stored_features(firms))
+    return zip(classes.tolist(), probs.tolist(), [version] * len(firms), firms["id"].tolist())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+File: test_backfill.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Tests of the resumable backfill queue in backfill.py.
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import json
+import socket
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import backfill
+
+
+class Crash(Exception):
+    pass
+
+
+def filing_url(i):
+    return "{0}edgar/data/{1}/{1:010d}-18-000001.txt".format(backfill.ARCHIVE_URL, i)
+
+
+class RunTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = os.path.join(self.tmp, "backfill.sqlite3")
+        self.out = os.path.join(self.tmp, "scraped_formd")
+        self.urls = [filing_url(i) for i in range(1, 26)]
+        self.errors = {}
+        self.crash_after = None
+        self.saved = backfill.fetch_all, backfill.BATCH_SIZE, backfill.RETRY_DELAY
+        backfill.fetch_all = self.fetch_all
+        backfill.BATCH_SIZE = 4
+        backfill.RETRY_DELAY = 0
+        backfill.seed(backfill.connect(self.db), self.urls)
+
+    def tearDown(self):
+        backfill.fetch_all, backfill.BATCH_SIZE, backfill.RETRY_DELAY = self.saved
+        shutil.rmtree(self.tmp)
+
+    def fetch_all(self, urls, parse=None, workers=None, rate=None):
+        for i, url in enumerate(urls):
+            if i == self.crash_after:
+                raise Crash()
+            error = self.errors.get(url)
+            if error is not None:
+                self.errors[url] = None
+            yield url, {"url": url}, error
+
+    def results(self, shard=0):
+        with open("{0}_{1}.jsonl".format(self.out, shard), "rb") as f:
+            return [json.loads(line)["url"] for line in f]
+
+    def statuses(self):
+        return dict(backfill.connect(self.db).execute("select url, status from queue").fetchall())
+
+    def test_run(self):
+        self.assertEqual(backfill.run(self.db, out_prefix=self.out, workers=1), 25)
+        self.assertEqual(sorted(self.results()), sorted(self.urls))
+        self.assertEqual(set(self.statuses().values()), set(["done"]))
+
+    def test_crash_between_checkpoints(self):
+        # 10 results written, 8 of them checkpointed
+        self.crash_after = 10
+        with self.assertRaises(Crash):
+            backfill.run(self.db, out_prefix=self.out, workers=1)
+        self.assertEqual(len(self.results()), 10)
+        self.assertEqual(list(self.statuses().values()).count("done"), 8)
+
+        self.crash_after = None
+        self.assertEqual(backfill.run(self.db, out_prefix=self.out, workers=1), 17)
+        self.assertEqual(sorted(self.results()), sorted(self.urls))
+
+    def test_retry_and_failed(self):
+        self.errors[self.urls[0]] = socket.error("connection reset")
+        self.errors[self.urls[1]] = ValueError("no primaryIssuer")
+        self.assertEqual(backfill.run(self.db, out_prefix=self.out, workers=1), 26)
+        statuses = self.statuses()
+        self.assertEqual(statuses[self.urls[0]], "done")
+        self.assertEqual(statuses[self.urls[1]], "failed")
+        self.assertEqual(sorted(self.results()), sorted(self.urls[:1] + self.urls[2:]))
+
+    def test_shards(self):
+        for shard in range(3):
+            backfill.run(self.db, shard, 3, out_prefix=self.out, workers=1)
+        shards = [self.results(shard) for shard in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(self.urls))
+        for shard, urls in enumerate(shards):
+            self.assertTrue(all(backfill.bucket(url) % 3 == shard for url in urls))
+
+    def test_seed_keeps_status(self):
+        backfill.run(self.db, out_prefix=self.out, workers=1)
+        conn = backfill.connect(self.db)
+        self.assertEqual(backfill.seed(conn, self.urls + [filing_url(99)]), 1)
+        self.assertEqual(backfill.status_counts(conn), [("done", 25), ("pending", 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,227 @@
+"""
+File: test_classifier.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Tests of the model registry, batched prediction, model search and
+training data builder in classifier.py.
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from sklearn import tree
+from sklearn.externals import joblib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import classifier
+
+STATES = np.array(["CA", "CT", "NY"], dtype=object)
+INDUSTRIES = np.array(["Hedge Fund", "Other Technology", "Pooled Investment Fund"], dtype=object)
+
+
+def random_firms(n, seed=1):
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({
+        "state": rng.choice(STATES, n),
+        "min_inv": rng.randint(0, 5, n) * 250000,
+        "tot_off": rng.choice([1e6, 5e7, np.inf], n),
+        "tot_sold": rng.randint(0, 10, n) * 1000000,
+        "tot_rem": rng.choice([0, 1e6, np.inf], n),
+        "ind_group_type": rng.choice(INDUSTRIES, n),
+        "has_non_accred": rng.randint(0, 2, n).astype(bool),
+        "num_non_accred": rng.randint(0, 5, n),
+        "tot_num_inv": rng.randint(1, 100, n),
+    }, columns=[name for name, field in classifier.FEATURES if field is not None])
+
+
+def write_model(model_dir, max_depth=4, seed=1):
+    """
+    Fits a small tree on random firms and saves it and its encoders
+    the way the registry expects to find them.
+    """
+    firms = random_firms(200, seed)
+    x = firms.copy()
+    x["tot_off_inf"] = np.isinf(x["tot_off"])
+    x["tot_rem_inf"] = np.isinf(x["tot_rem"])
+    x = x.replace([np.inf], np.nan).fillna(0)
+    x["state"] = STATES.searchsorted(x["state"])
+    x["ind_group_type"] = INDUSTRIES.searchsorted(x["ind_group_type"])
+    y = (x["tot_num_inv"] > 50) & (x["ind_group_type"] != 1)
+    clf = tree.DecisionTreeClassifier(max_depth=max_depth, random_state=seed)
+    clf.fit(x[[name for name, field in classifier.FEATURES]], y.astype(int))
+    joblib.dump(clf, os.path.join(model_dir, classifier.MODEL_FILE))
+    np.save(os.path.join(model_dir, classifier.ENCODER_FILE), INDUSTRIES)
+    np.save(os.path.join(model_dir, classifier.STATE_ENCODER_FILE), STATES)
+    return clf
+
+
+class ModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.clf = write_model(self.tmp)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+
+class ModelRegistryTests(ModelTestCase):
+    def test_loaded_once(self):
+        registry = classifier.ModelRegistry(self.tmp, check_interval=0)
+        model = registry.get()
+        self.assertIs(registry.get(), model)
+        self.assertEqual(list(model.state_encoder.classes_), list(STATES))
+        self.assertEqual(len(model.version), 12)
+
+    def test_reloaded_when_replaced(self):
+        registry = classifier.ModelRegistry(self.tmp, check_interval=0)
+        model = registry.get()
+        write_model(self.tmp, max_depth=2, seed=2)
+        path = os.path.join(self.tmp, classifier.MODEL_FILE)
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        reloaded = registry.get()
+        self.assertIsNot(reloaded, model)
+        self.assertNotEqual(reloaded.version, model.version)
+        self.assertEqual(reloaded.estimator.max_depth, 2)
+
+    def test_checked_at_most_every_interval(self):
+        registry = classifier.ModelRegistry(self.tmp, check_interval=60)
+        model = registry.get()
+        os.remove(os.path.join(self.tmp, classifier.MODEL_FILE))
+        self.assertIs(registry.get(), model)
+
+    def test_missing_model(self):
+        registry = classifier.ModelRegistry(os.path.join(self.tmp, "none"))
+        self.assertRaises(OSError, registry.get)
+
+
+class PredictBatchTests(ModelTestCase):
+    def setUp(self):
+        super(PredictBatchTests, self).setUp()
+        self.model = classifier.ModelRegistry(self.tmp).get()
+        self.firms = random_firms(300, seed=3)
+
+    def predict_row(self, firm):
+        # the old path: encode one firm's categories and predict it alone
+        row = [firm[name] for name, field in classifier.FEATURES if field is not None]
+        row[0] = self.model.state_encoder.transform([row[0]])[0]
+        row[5] = self.model.encoder.transform([row[5]])[0]
+        row += [np.isinf(firm["tot_off"]), np.isinf(firm["tot_rem"])]
+        row = [0 if np.isinf(value) else value for value in row]
+        return self.clf.predict(np.array([row], dtype=float))[0]
+
+    def test_matches_per_row_prediction(self):
+        expected = [self.predict_row(firm) for i, firm in self.firms.iterrows()]
+        self.assertEqual(classifier.predict_batch(self.firms, self.model).tolist(), expected)
+
+    def test_field_names(self):
+        fields = self.firms.rename(columns=dict((name, field) for name, field in classifier.FEATURES if field))
+        self.assertEqual(classifier.predict_batch(fields, self.model).tolist(),
+                         classifier.predict_batch(self.firms, self.model).tolist())
+
+    def test_tree_predict(self):
+        saved = classifier.registry
+        classifier.registry = classifier.ModelRegistry(self.tmp)
+        try:
+            for i in range(20):
+                firm = self.firms.iloc[[i]].copy()
+                firm["tot_off_inf"] = np.isinf(firm["tot_off"])
+                firm["tot_rem_inf"] = np.isinf(firm["tot_rem"])
+                self.assertEqual(classifier.tree_predict(firm), classifier.LABELS[self.predict_row(self.firms.iloc[i])])
+        finally:
+            classifier.registry = saved
+
+    def test_unknown_categories(self):
+        firms = self.firms.iloc[:3].copy()
+        firms["state"] = ["ZZ", "CT", "ZZ"]
+        firms["ind_group_type"] = ["Banking", "Banking", "Hedge Fund"]
+        x = classifier.feature_frame(firms, self.model)
+        self.assertEqual(x["state"].tolist(), [classifier.UNKNOWN_CATEGORY, 1, classifier.UNKNOWN_CATEGORY])
+        self.assertEqual(x["ind_group_type"].tolist(), [classifier.UNKNOWN_CATEGORY] * 2 + [0])
+        self.assertEqual(len(classifier.predict_batch(firms, self.model)), 3)
+
+    def test_scores(self):
+        classes, probs, version = classifier.score_batch(self.firms, self.model)
+        x = classifier.feature_frame(self.firms, self.model)
+        self.assertEqual(classes.tolist(), classifier.predict_batch(self.firms, self.model).tolist())
+        self.assertTrue(np.allclose(probs, self.clf.predict_proba(x).max(axis=1)))
+        self.assertEqual(version, self.model.version)
+
+    def test_empty(self):
+        self.assertEqual(len(classifier.predict_batch(self.firms.iloc[:0], self.model)), 0)
+
+
+class ModelSearchTests(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(4)
+        self.x = pd.DataFrame(rng.rand(120, 4), columns=["a", "b", "c", "d"])
+        self.y = ((self.x["a"] + rng.rand(120) * 0.5) > 0.7).astype(int)
+        self.candidates = [("tree", {"max_depth": k, "min_samples_leaf": 5}) for k in (1, 2, 4)] + \
+                          [("knn", {"n_neighbors": 5, "weights": "uniform"})]
+
+    def test_results(self):
+        results = classifier.model_search(self.x, self.y, self.candidates, folds=4, n_jobs=1)
+        self.assertEqual(sorted(results["candidate"]), range(len(self.candidates)))
+        self.assertEqual(results["mean_accuracy"].tolist(), sorted(results["mean_accuracy"], reverse=True))
+
+        # the same folds as fitting each candidate on its own
+        folds = list(classifier.StratifiedKFold(np.asarray(self.y), n_folds=4, shuffle=True, random_state=1))
+        for i, row in results.iterrows():
+            kind, params = self.candidates[row["candidate"]]
+            scores = [classifier.make_model(kind, params).fit(self.x.values[train], self.y.values[train])
+                      .score(self.x.values[test], self.y.values[test]) for train, test in folds]
+            self.assertAlmostEqual(row["mean_accuracy"], np.mean(scores))
+            self.assertEqual((row["model"], row["params"]), (kind, params))
+
+    def test_parallel_matches_serial(self):
+        serial = classifier.model_search(self.x, self.y, self.candidates, folds=4, n_jobs=1)
+        parallel = classifier.model_search(self.x, self.y, self.candidates, folds=4, n_jobs=2)
+        columns = ["candidate", "mean_accuracy", "std_accuracy"]
+        self.assertTrue(serial[columns].equals(parallel[columns]))
+
+
+class MatchFirmsTests(unittest.TestCase):
+    def setUp(self):
+        self.history = pd.DataFrame({
+            "name": ["Farallon Capital Offshore", "FARALLON PARTNERS", "Lone Star Fund IX", "Elliott Associates LP",
+                     "Lone Balsam LP", "Acme Widgets", None, "Two Sigma Lone Star Feeder", "Sankaty Credit"],
+            "street2": ["ONE MARITIME PLAZA, SUITE 2100", "", None, "", "", "", "", "", "Suite 5"],
+            "state": ["CA", "CA", "TX", "FL", "CT", "NY", "NY", "NY", "MA"],
+        }, columns=["name", "street2", "state"])
+        self.train_info = [("farallon", "ONE MARITIME PLAZA, SUITE 2100"), ("lone star", None),
+                           ("elliott associates", None), ("sankaty", None), ("two sigma", None)]
+
+    def old_way(self, df):
+        # get_training_data before the history was read in chunks
+        train = pd.DataFrame()
+        for name, address in self.train_info:
+            found = df["name"].str.lower().str.contains(name).fillna(False).astype(bool)
+            if address is not None:
+                found &= (df["street2"] == address)
+            train = train.append(df[found])
+        return train
+
+    def test_matches_the_old_way_in_chunks(self):
+        chunks = [self.history.iloc[start:start + 3] for start in range(0, len(self.history), 3)]
+        found = classifier.match_firms(iter(chunks), self.train_info)
+        self.assertTrue(found.equals(self.old_way(self.history)))
+        # grouped by pattern, with a firm matching two patterns listed twice
+        self.assertEqual(found.index.tolist(), [0, 2, 7, 3, 8, 7])
+
+    def test_no_matches(self):
+        found = classifier.match_firms(iter([self.history]), [("renaissance", None)])
+        self.assertEqual(len(found), 0)
+        self.assertEqual(list(found.columns), list(self.history.columns))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+"""
+File: test_data_clean.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Tests of the scraper output readers and data frame builders in
+data_clean.py.
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import glob
+import json
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import data_clean
+import db_insert
+from edgar import parse_filing
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+
+
+def load_filings():
+    filings = []
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, "*.txt"))):
+        with open(path, "rb") as f:
+            filings.append(parse_filing(f.read()))
+    return filings
+
+
+def filing_url(cik, i):
+    return "https://www.sec.gov/Archives/edgar/data/{0}/{0:010d}-18-{1:06d}.txt".format(cik, i)
+
+
+class JsonChunkTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.filings = load_filings()
+        self.urls = []
+        self.files = []
+        # two legacy dict files and a JSON Lines file
+        for k in range(2):
+            entries = dict((filing_url(k + 1, i), self.filings[i % len(self.filings)]) for i in range(40))
+            self.files.append(self.write(entries, "scraped_formd_dict_{0}.json".format(k)))
+        jsonl = os.path.join(self.tmp, "scraped_formd_0.jsonl")
+        with open(jsonl, "wb") as f:
+            for i in range(60):
+                f.write(json.dumps({"url": filing_url(3, i), "contents": self.filings[i % len(self.filings)]}) + "\n")
+        self.files.append(jsonl)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def write(self, entries, name):
+        path = os.path.join(self.tmp, name)
+        with open(path, "wb") as f:
+            json.dump(entries, f)
+        return path
+
+    def chunks(self, workers):
+        return list(data_clean.iter_json_chunks(self.files, 25, workers))
+
+    def test_exact_batches(self):
+        frames = self.chunks(1)
+        self.assertEqual([len(df) for df in frames], [25] * 5 + [15])
+        self.assertEqual(list(frames[0].columns), data_clean.COLUMNS)
+
+    def test_workers_give_the_same_rows(self):
+        serial = self.chunks(1)
+        parallel = self.chunks(2)
+        self.assertEqual(len(serial), len(parallel))
+        for a, b in zip(serial, parallel):
+            self.assertTrue(a.reset_index(drop=True).equals(b.reset_index(drop=True)))
+
+    def test_legacy_files_go_to_the_pool(self):
+        split_bytes = os.path.getsize(self.files[-1]) // 4
+        tasks = [task for json_file in self.files for task in data_clean.json_tasks(json_file, split_bytes)]
+        self.assertEqual(tasks[:2], [(self.files[0], None, None), (self.files[1], None, None)])
+        self.assertTrue(len(tasks) > 3)
+        submitted = []
+
+        class Pool(object):
+            def apply_async(self, func, args):
+                submitted.append(args[0][0])
+                return Result(func(*args))
+
+        class Result(object):
+            def __init__(self, value):
+                self.value = value
+
+            def get(self):
+                return self.value
+
+        frames = [df for task, frames in data_clean.iter_converted(tasks, 25, Pool(), 2) for df in frames]
+        self.assertEqual(submitted, tasks)
+        self.assertEqual(sum(len(df) for df in frames), 140)
+
+
+class FilingFrameTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.filings = [(filing_url(i + 1, 1), filing) for i, filing in enumerate(load_filings())]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_types(self):
+        df = data_clean.make_df_from_filings(self.filings + [(filing_url(9, 1), {})])
+        self.assertEqual(list(df.columns), data_clean.COLUMNS)
+        # the filing that could not be scraped is left out
+        self.assertEqual(len(df), 2)
+        for col in data_clean.NUMERIC_COLUMNS:
+            self.assertTrue(df[col].dtype.kind in "if", col)
+        # leading zeros survive and an indefinite offering is inf
+        self.assertEqual(df["cik"].tolist(), ["0001731234", "0001731299"])
+        self.assertEqual(df["zip_code"].tolist(), ["06830", "06830"])
+        self.assertEqual(df["tot_off"].tolist(), [float("inf"), 25000000.0])
+        self.assertEqual(df["previous_accession_number"].tolist(), ["0001731234-17-000004", None])
+
+    def test_same_rows_as_the_csv_round_trip(self):
+        # the old path: scraper JSON, then CSV, then a data frame read back from it
+        json_file = self.write({"url": url, "contents": contents} for url, contents in self.filings)
+        csv_file = os.path.join(self.tmp, "all_data.csv")
+        data_clean.make_df_from_json([json_file], csv_file)
+        round_trip = pd.read_csv(csv_file, header=1, dtype=dict((col, object) for col in data_clean.TEXT_COLUMNS))
+
+        in_memory = data_clean.make_df_from_filings(self.filings)
+        self.assertEqual(db_insert.form_rows(in_memory), db_insert.form_rows(round_trip))
+
+    def write(self, entries):
+        path = os.path.join(self.tmp, "scraped_formd_0.jsonl")
+        with open(path, "wb") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        return path
+
+
+class HistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        filings = load_filings()
+        self.frame = data_clean.make_df_from_filings(
+            [(filing_url(i + 1, 1), filings[i % 2]) for i in range(6)])
+        self.frame["date_filed"] = ["2018-05-02", "2018-05-03", "2017-11-30", "2018-01-02", None, None]
+        # no filing date: the year comes from the accession number
+        self.frame.loc[5, "filing_url"] = "https://www.sec.gov/Archives/edgar/data/6/0000000006-16-000001.txt"
+        self.history = os.path.join(self.tmp, "history")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def partitions(self):
+        return sorted(os.path.relpath(root, self.history) for root, dirs, files in os.walk(self.history) if files)
+
+    def read(self, **kwargs):
+        df = data_clean.load_history(path=self.history, **kwargs)
+        return df.sort_values("filing_url").reset_index(drop=True)
+
+    def test_round_trip(self):
+        self.assertEqual(data_clean.write_history([self.frame.iloc[:3], self.frame.iloc[3:]], self.history), 6)
+        self.assertEqual(self.partitions(), ["year=2016/quarter=0", "year=2017/quarter=4", "year=2018/quarter=0",
+                                             "year=2018/quarter=1", "year=2018/quarter=2"])
+        df = self.read()
+        expected = self.frame.sort_values("filing_url").reset_index(drop=True)
+        for col in data_clean.COLUMNS:
+            self.assertEqual(df[col].astype(object).where(df[col].notnull(), None).tolist(),
+                             expected[col].astype(object).where(expected[col].notnull(), None).tolist(), col)
+        self.assertEqual(str(df["state"].dtype), "category")
+        self.assertEqual(sorted(df["year"].tolist()), [2016, 2017, 2018, 2018, 2018, 2018])
+
+    def test_partition_filters(self):
+        data_clean.write_history([self.frame], self.history)
+        self.assertEqual(len(self.read(years=[2018])), 4)
+        self.assertEqual(len(self.read(years=[2018], quarters=[2])), 2)
+        df = data_clean.load_history(columns=["name", "quarter"], years=[2017], path=self.history)
+        self.assertEqual(list(df.columns), ["name", "quarter"])
+        self.assertEqual(df["quarter"].tolist(), [4])
+
+    def test_appends(self):
+        data_clean.write_history([self.frame], self.history)
+        data_clean.write_history([self.frame.iloc[:2]], self.history)
+        self.assertEqual(len(self.read()), 8)
+        self.assertEqual(sum(1 for df in data_clean.iter_history(path=self.history)), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+File: test_db_insert.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Tests of the incremental ingest in db_insert.py. Loading into the
+web app's tables is tested with the web app (webapp/analyst/tests.py).
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import datetime as dt
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import db_insert
+
+
+def weekdays(start, end):
+    days = [start + dt.timedelta(days=i) for i in range((end - start).days + 1)]
+    return [day for day in days if day.weekday() < 5]
+
+
+class IngestNewTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = os.path.join(self.tmp, "formddb.sqlite3")
+        conn = sqlite3.connect(self.db)
+        conn.execute("create table analyst_ingestedindex (id integer primary key, index_date date unique,"
+                     " filings integer, loaded_at datetime)")
+        conn.commit()
+        self.saved = db_insert.connect, db_insert.daily_index_dates, db_insert.full_process_form_d
+        db_insert.connect = lambda: sqlite3.connect(self.db)
+        db_insert.daily_index_dates = weekdays
+        self.loaded = []
+        db_insert.full_process_form_d = self.loaded.append
+        self.yesterday = dt.date.today() - dt.timedelta(days=1)
+
+    def tearDown(self):
+        db_insert.connect, db_insert.daily_index_dates, db_insert.full_process_form_d = self.saved
+        shutil.rmtree(self.tmp)
+
+    def ledger(self, days):
+        conn = sqlite3.connect(self.db)
+        conn.executemany("insert into analyst_ingestedindex (index_date, filings, loaded_at)"
+                         " values (?, 1, datetime('now'))", [(day.strftime("%Y-%m-%d"), ) for day in days])
+        conn.commit()
+
+    def test_empty_ledger_loads_the_last_week(self):
+        self.assertEqual(db_insert.ingest_new(), weekdays(self.yesterday - dt.timedelta(days=6), self.yesterday))
+        self.assertEqual(self.loaded, weekdays(self.yesterday - dt.timedelta(days=6), self.yesterday))
+
+    def test_loads_only_missing_days(self):
+        mark = weekdays(self.yesterday - dt.timedelta(days=16), self.yesterday - dt.timedelta(days=10))[-1]
+        published = weekdays(mark - dt.timedelta(days=db_insert.LOOKBACK_DAYS), self.yesterday)
+        # a day that failed part way, well behind the high-water mark
+        gap = published[3]
+        self.ledger([day for day in published if day <= mark and day != gap])
+        self.assertEqual(db_insert.ingest_new(), [gap] + [day for day in published if day > mark])
+
+    def test_since(self):
+        since = self.yesterday - dt.timedelta(days=60)
+        self.ledger(weekdays(self.yesterday - dt.timedelta(days=20), self.yesterday))
+        self.assertEqual(db_insert.ingest_new(since), weekdays(since, self.yesterday - dt.timedelta(days=21)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+"""
+File: test_edgar.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Tests of the EDGAR index readers and the filing manifest in edgar.py.
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import json
+import shutil
+import io
+import datetime
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import edgar
+
+INDEX_HEADER = (b"Form Type   Company Name                                                  CIK         Date Filed  File Name\n"
+                b"---------------------------------------------------------------------------------------------------------------\n")
+
+
+def index_line(form_type, company, cik, path):
+    return "{0:<12}{1:<62}{2:<12}{3:<12}{4}\n".format(form_type, company, cik, "20180502", path).encode("ascii")
+
+
+class BuildManifestTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.manifest = os.path.join(self.tmp, "form_d_manifest.jsonl")
+        self.bodies = {
+            "a.idx": INDEX_HEADER + index_line("D", "Alpha Fund LP", "1", "edgar/data/1/0000000001-18-000001.txt"),
+            "b.idx": INDEX_HEADER + index_line("D", "Beta Fund LP", "2", "edgar/data/2/0000000002-18-000001.txt") +
+                     index_line("D/A", "Beta Fund LP", "2", "edgar/data/2/0000000002-18-000002.txt"),
+            "c.idx": INDEX_HEADER + index_line("10-K", "Gamma Inc", "3", "edgar/data/3/x.txt"),
+        }
+        self.fetched = []
+        self.fetch_all = edgar.fetch_all
+        edgar.fetch_all = self.fake_fetch_all
+
+    def tearDown(self):
+        edgar.fetch_all = self.fetch_all
+        shutil.rmtree(self.tmp)
+
+    def fake_fetch_all(self, urls, workers=None, rate=None):
+        for url in urls:
+            self.fetched.append(url)
+            yield url, self.bodies[url], None
+
+    def entries(self):
+        with open(self.manifest, "rb") as f:
+            return [json.loads(line) for line in f]
+
+    def test_records_and_markers(self):
+        added = edgar.build_manifest(["a.idx", "b.idx", "c.idx"], self.manifest)
+        self.assertEqual(added, 3)
+        entries = self.entries()
+        self.assertEqual([e["path"] for e in entries if "path" in e],
+                         ["edgar/data/1/0000000001-18-000001.txt", "edgar/data/2/0000000002-18-000001.txt",
+                          "edgar/data/2/0000000002-18-000002.txt"])
+        self.assertEqual([(e["index"], e["filings"]) for e in entries if e.get("done")],
+                         [("a.idx", 1), ("b.idx", 2), ("c.idx", 0)])
+
+    def test_resume_skips_finished_index_files(self):
+        edgar.build_manifest(["a.idx", "c.idx"], self.manifest)
+        self.fetched = []
+        added = edgar.build_manifest(["a.idx", "b.idx", "c.idx"], self.manifest)
+        # c.idx has no Form D filings but is still done
+        self.assertEqual(self.fetched, ["b.idx"])
+        self.assertEqual(added, 2)
+
+    def test_resume_after_interrupted_write(self):
+        edgar.build_manifest(["a.idx"], self.manifest)
+        # a crash part way through writing b.idx: one record, no marker, and a torn line
+        with open(self.manifest, "ab") as f:
+            f.write(json.dumps({"index": "b.idx", "path": "edgar/data/2/0000000002-18-000001.txt"}) + "\n")
+            f.write(b'{"index": "b.idx", "path": "edgar/da')
+        self.assertEqual(edgar.done_index_files(self.manifest), set(["a.idx"]))
+
+        self.fetched = []
+        edgar.build_manifest(["a.idx", "b.idx"], self.manifest)
+        self.assertEqual(self.fetched, ["b.idx"])
+        entries = self.entries()
+        self.assertEqual(set(e["index"] for e in entries if e.get("done")), set(["a.idx", "b.idx"]))
+        self.assertIn("edgar/data/2/0000000002-18-000002.txt", [e.get("path") for e in entries])
+
+        # and the manifest stays readable for the next resume
+        self.fetched = []
+        edgar.build_manifest(["a.idx", "b.idx"], self.manifest)
+        self.assertEqual(self.fetched, [])
+
+
+class ScrapeDayTests(unittest.TestCase):
+    def setUp(self):
+        self.body = (INDEX_HEADER +
+                     index_line("D", "Alpha Fund LP", "1", "edgar/data/1/0000000001-18-000001.txt") +
+                     index_line("10-K", "Gamma Inc", "3", "edgar/data/3/0000000003-18-000001.txt") +
+                     index_line("D", "Beta Fund LP", "2", "edgar/data/2/0000000002-18-000001.txt") +
+                     index_line("D/A", "Beta Fund LP", "2", "edgar/data/2/0000000002-18-000002.txt"))
+        self.saved = edgar.iter_index_records, edgar.fetch_all
+        edgar.iter_index_records = lambda url: edgar.parse_index(io.BytesIO(self.body))
+        edgar.fetch_all = self.fake_fetch_all
+        self.missing = set()
+
+    def tearDown(self):
+        edgar.iter_index_records, edgar.fetch_all = self.saved
+
+    def fake_fetch_all(self, urls, parse=None, workers=None, rate=None):
+        for url in urls:
+            if url in self.missing:
+                yield url, None, IOError("404")
+            else:
+                yield url, {"url": url}, None
+
+    def test_skip_and_failures(self):
+        url = "https://www.sec.gov/Archives/edgar/data/2/0000000002-18-00000{0}.txt"
+        self.missing.add(url.format(2))
+        calls = []
+        filings, failed = edgar.scrape_day(datetime.date(2018, 5, 2), skip=set(["0000000001-18-000001"]),
+                                           progress=lambda done, total: calls.append((done, total)))
+        self.assertEqual(list(filings), [url.format(1)])
+        self.assertEqual(failed, [url.format(2)])
+        self.assertEqual(calls, [(0, 2), (1, 2), (2, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+File: test_fetcher.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Tests of the concurrent rate-limited fetcher in fetcher.py.
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import time
+import itertools
+import threading
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import fetcher
+import http_client
+import filing_cache
+
+
+class FakeResponse(object):
+    def __init__(self, status, body):
+        self.status = status
+        self.body = body
+
+    def read(self):
+        return self.body
+
+
+class FetchAllTests(unittest.TestCase):
+    def setUp(self):
+        self.get = filing_cache.get
+        filing_cache.get = self.fake_get
+        self.requested = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        filing_cache.get = self.get
+
+    def fake_get(self, url, timeout=None, wait=None):
+        # every url goes to the network, so every one waits on the limiter
+        wait()
+        with self.lock:
+            self.requested.append(url)
+        if url.endswith("missing"):
+            return FakeResponse(404, b"")
+        return FakeResponse(200, url.encode("ascii"))
+
+    def test_results_and_errors(self):
+        urls = ["u{0}".format(i) for i in range(20)] + ["missing", "bad"]
+
+        def parse(body):
+            if body == b"bad":
+                raise ValueError("no primaryIssuer")
+            return {"body": body}
+
+        results = dict((url, (result, error)) for url, result, error in
+                       fetcher.fetch_all(urls, parse=parse, workers=4, rate=None))
+        self.assertEqual(sorted(results), sorted(urls))
+        self.assertEqual(results["u3"], ({"body": b"u3"}, None))
+        self.assertIsInstance(results["missing"][1], http_client.HTTPError)
+        self.assertEqual(results["bad"][0], {})
+        self.assertIsInstance(results["bad"][1], ValueError)
+
+    def test_rate_limit(self):
+        # 11 requests at 20 a second take at least half a second on any number of workers
+        tic = time.time()
+        results = list(fetcher.fetch_all(["u{0}".format(i) for i in range(11)], workers=4, rate=20))
+        self.assertEqual(len(results), 11)
+        self.assertGreaterEqual(time.time() - tic, 0.49)
+
+    def test_abandoned_generator_stops_the_pool(self):
+        threads = threading.active_count()
+        fed = []
+
+        def urls():
+            for i in itertools.count():
+                fed.append(i)
+                yield "u{0}".format(i)
+
+        results = fetcher.fetch_all(urls(), workers=4, rate=None)
+        for item in itertools.islice(results, 5):
+            pass
+        results.close()
+        time.sleep(1.5)
+        self.assertEqual(threading.active_count(), threads)
+        # the feeder stopped pulling urls: it reads at most a full queue ahead
+        count = len(fed)
+        time.sleep(0.2)
+        self.assertEqual(len(fed), count)
+
+
+class RateLimiterTests(unittest.TestCase):
+    def test_spacing(self):
+        limiter = fetcher.RateLimiter(50)
+        tic = time.time()
+        for _ in range(6):
+            limiter.wait()
+        self.assertGreaterEqual(time.time() - tic, 0.099)
+
+    def test_no_limit(self):
+        limiter = fetcher.RateLimiter(None)
+        tic = time.time()
+        for _ in range(1000):
+            limiter.wait()
+        self.assertLess(time.time() - tic, 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""
+File: test_filing_cache.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Tests of the local EDGAR file cache in filing_cache.py.
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import http_client
+import filing_cache
+
+ARCHIVE = "https://www.sec.gov/Archives/"
+FILING_URL = ARCHIVE + "edgar/data/1234/0001234-18-000001.txt"
+INDEX_URL = ARCHIVE + "edgar/daily-index/2018/QTR2/form.20180502.idx"
+
+
+class FakeStream(object):
+    def __init__(self, response):
+        self.url = response.url
+        self.status = response.status
+        self.headers = response.headers
+        self.body = response
+        self.closed = False
+
+    def read(self, size=-1):
+        return self.body.read(size)
+
+    def close(self):
+        self.closed = True
+
+
+class CacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        filing_cache.configure(cache_dir=self.tmp, offline_mode=False)
+        self.saved = http_client.get, http_client.stream
+        http_client.get = self.fake_get
+        http_client.stream = lambda url, headers=None, timeout=None: FakeStream(self.fake_get(url, headers))
+        self.requests = []
+        self.waits = []
+        self.bodies = {FILING_URL: b"<SEC-DOCUMENT>filing", INDEX_URL: b"Form Type   Company Name\n"}
+        self.etag = '"v1"'
+
+    def tearDown(self):
+        http_client.get, http_client.stream = self.saved
+        filing_cache.configure(cache_dir="data/edgar_cache", offline_mode=False)
+        shutil.rmtree(self.tmp)
+
+    def fake_get(self, url, headers=None, timeout=None):
+        headers = headers or {}
+        self.requests.append((url, headers))
+        if headers.get("If-None-Match") == self.etag:
+            return http_client.Response(url, 304, {}, b"")
+        if url not in self.bodies:
+            return http_client.Response(url, 404, {}, b"")
+        return http_client.Response(url, 200, {"ETag": self.etag}, self.bodies[url])
+
+    def get(self, url):
+        return filing_cache.get(url, wait=lambda: self.waits.append(url))
+
+    def test_filing_served_from_cache(self):
+        self.assertEqual(self.get(FILING_URL).read(), self.bodies[FILING_URL])
+        response = self.get(FILING_URL)
+        self.assertEqual((response.status, response.read()), (200, self.bodies[FILING_URL]))
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.waits, [FILING_URL])
+
+    def test_index_revalidated(self):
+        self.get(INDEX_URL)
+        response = self.get(INDEX_URL)
+        self.assertEqual((response.status, response.read()), (200, self.bodies[INDEX_URL]))
+        self.assertEqual(self.requests[1][1].get("If-None-Match"), '"v1"')
+
+        # changed on sec.gov: downloaded again and the cache replaced
+        self.etag = '"v2"'
+        self.bodies[INDEX_URL] += b"D           Alpha Fund LP\n"
+        self.assertEqual(self.get(INDEX_URL).read(), self.bodies[INDEX_URL])
+        self.etag = '"v2"'
+        self.assertEqual(self.get(INDEX_URL).read(), self.bodies[INDEX_URL])
+        self.assertEqual(len(self.requests), 4)
+
+    def test_errors_not_cached(self):
+        url = ARCHIVE + "edgar/data/1234/0001234-18-000002.txt"
+        self.assertEqual(self.get(url).status, 404)
+        self.assertEqual(self.get(url).status, 404)
+        self.assertEqual(len(self.requests), 2)
+
+    def test_offline(self):
+        self.get(FILING_URL)
+        filing_cache.configure(offline_mode=True)
+        self.assertEqual(self.get(FILING_URL).read(), self.bodies[FILING_URL])
+        with self.assertRaises(filing_cache.CacheMiss):
+            self.get(INDEX_URL)
+        self.assertEqual(len(self.requests), 1)
+
+    def test_stream(self):
+        response = filing_cache.get_stream(INDEX_URL)
+        self.assertEqual(response.read(4) + response.read(), self.bodies[INDEX_URL])
+        response.close()
+        response = filing_cache.get_stream(INDEX_URL)
+        self.assertIsInstance(response, filing_cache.CachedFile)
+        self.assertEqual(response.read(), self.bodies[INDEX_URL])
+        response.close()
+
+    def test_stream_closed_early(self):
+        response = filing_cache.get_stream(INDEX_URL)
+        response.read(4)
+        response.close()
+        self.assertEqual(os.listdir(os.path.dirname(filing_cache.cache_file("edgar/daily-index/2018/QTR2/x"))), [])
+        self.assertFalse(filing_cache.get_stream(FILING_URL).read() is None)
+        self.assertEqual(self.get(INDEX_URL).read(), self.bodies[INDEX_URL])
+        self.assertNotIn("If-None-Match", self.requests[-1][1])
+
+    def test_outside_archive(self):
+        url = "https://www.sec.gov/cgi-bin/browse-edgar"
+        self.bodies[url] = b"<html>"
+        self.get(url)
+        self.get(url)
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(os.listdir(self.tmp), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+File: test_formd_xml.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Parity of the streaming Form D parser (formd_xml.parse_submission)
+with the original BeautifulSoup parser (edgar.extract_contents).
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import glob
+import unittest
+from bs4 import BeautifulSoup
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from edgar import extract_contents
+from formd_xml import parse_submission
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
+
+
+def load_filings():
+    filings = []
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, "*.txt"))):
+        with open(path, "rb") as f:
+            filings.append(f.read())
+    return filings
+
+
+def soup_parse(text):
+    return extract_contents(BeautifulSoup(text, 'lxml'))
+
+
+class ParityTests(unittest.TestCase):
+    def setUp(self):
+        self.filings = load_filings()
+
+    def test_filings_match_soup_parser(self):
+        self.assertTrue(self.filings)
+        for text in self.filings:
+            self.assertEqual(parse_submission(text), soup_parse(text))
+
+    def test_comment_inside_value(self):
+        text = self.filings[0]
+        commented = text.replace(b"<entityName>Example Fund", b"<entityName>Example <!-- fund name --> Fund", 1)
+        commented = commented.replace(b"<street1>1 Main St</street1>", b"<street1>1 Main<!---->St</street1>", 1)
+        self.assertNotEqual(commented, text)
+        issuer = parse_submission(commented)["Primary Issuer"]
+        self.assertEqual(issuer["entity_name"], "Example  Fund & Co LP")
+        self.assertEqual(issuer["address"]["street1"], "1 MainSt")
+
+        # everything else is still parsed as the soup parser does
+        expected = soup_parse(text)
+        expected["Primary Issuer"]["entity_name"] = "Example  Fund & Co LP"
+        expected["Primary Issuer"]["address"]["street1"] = "1 MainSt"
+        self.assertEqual(parse_submission(commented), expected)
+
+    def test_no_xml_document(self):
+        self.assertEqual(parse_submission(b"<SEC-DOCUMENT>no form here</SEC-DOCUMENT>"), {})
+
+    def test_missing_section(self):
+        text = self.filings[0]
+        start = text.index(b"<offeringData>")
+        end = text.index(b"</offeringData>") + len(b"</offeringData>")
+        with self.assertRaises(ValueError):
+            parse_submission(text[:start] + text[end:])
+
+    def test_filed_as_of_date(self):
+        for text in self.filings:
+            contents = parse_submission(text)
+            self.assertEqual(contents["Date Filed"], "2018-05-02")
+            self.assertEqual(contents["Date Filed"], soup_parse(text)["Date Filed"])
+
+
+if __name__ == '__main__':
+    unittest.main()
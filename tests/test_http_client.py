@@ -0,0 +1,141 @@
+"""
+File: test_http_client.py
+Author: Michael Byrnes
+Email: michael.byrnes@yale.edu
+Python Version: 2.7
+
+Tests of the keep-alive connection pool in http_client.py against a
+local HTTP/1.1 server.
+
+Usage: python -m unittest discover tests
+"""
+from __future__ import unicode_literals
+import os
+import sys
+import gzip
+import io
+import threading
+import unittest
+import BaseHTTPServer
+import SocketServer
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import http_client
+
+BODY = b"Form Type   Company Name\n" * 2000
+
+
+def gzipped(body):
+    out = io.BytesIO()
+    with gzip.GzipFile(fileobj=out, mode="wb") as f:
+        f.write(body)
+    return out.getvalue()
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.connections.add(self.client_address)
+        server.requests.append(self.path)
+        status, body, headers = 200, BODY, {}
+        if self.path == "/gzip":
+            body, headers = gzipped(BODY), {"Content-Encoding": "gzip"}
+        elif self.path == "/missing":
+            status, body = 404, b""
+        elif self.path == "/flaky" and server.failures > 0:
+            server.failures -= 1
+            status, body = 503, b""
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.path == "/drop":
+            # the server drops the connection without saying so, as an idle timeout would
+            self.close_connection = 1
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.server.connections = set()
+        self.server.requests = []
+        self.server.failures = 0
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base = "http://127.0.0.1:{0}".format(self.server.server_address[1])
+        self.pool = http_client.ConnectionPool()
+        self.backoff = http_client.BACKOFF
+        http_client.BACKOFF = 0
+
+    def tearDown(self):
+        http_client.BACKOFF = self.backoff
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        for _ in range(3):
+            self.assertEqual(self.pool.request(self.base + "/index").read(), BODY)
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_gzip(self):
+        response = self.pool.request(self.base + "/gzip")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), BODY)
+
+    def test_not_found_is_returned(self):
+        self.assertEqual(self.pool.request(self.base + "/missing").status, 404)
+        self.assertEqual(self.server.requests, ["/missing"])
+
+    def test_retries(self):
+        self.server.failures = 2
+        self.assertEqual(self.pool.request(self.base + "/flaky", retries=2).status, 200)
+        self.assertEqual(len(self.server.requests), 3)
+
+        self.server.failures = 3
+        with self.assertRaises(http_client.HTTPError) as raised:
+            self.pool.request(self.base + "/flaky", retries=2)
+        self.assertEqual(raised.exception.status, 503)
+
+    def test_stale_connection(self):
+        self.pool.request(self.base + "/drop")
+        # the pooled connection is dead; a fresh one is opened without using up a retry
+        self.assertEqual(self.pool.request(self.base + "/index", retries=0).read(), BODY)
+        self.assertEqual(len(self.server.connections), 2)
+
+    def test_stream(self):
+        response = self.pool.request(self.base + "/gzip", stream=True)
+        chunks = []
+        while True:
+            chunk = response.read(1000)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        self.assertEqual(b"".join(chunks), BODY)
+        # read to the end, so the connection went back to the pool
+        self.pool.request(self.base + "/index")
+        self.assertEqual(len(self.server.connections), 1)
+
+    def test_stream_closed_early(self):
+        response = self.pool.request(self.base + "/index", stream=True)
+        response.read(10)
+        response.close()
+        self.assertEqual(self.pool.request(self.base + "/index").read(), BODY)
+        self.assertEqual(len(self.server.connections), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,7 @@
 from django.contrib import admin
 
-from .models import FormD
+from .models import FormD, SecondaryIssuer, RelatedPerson
 # Register your models here.
-admin.site.register(FormD)
\ No newline at end of file
+admin.site.register(FormD)
+admin.site.register(SecondaryIssuer)
+admin.site.register(RelatedPerson)
@@ -20,3 +20,47 @@ class AnalystForm(ModelForm):
         'email': 'Email',
         }
 
+
+#Filters and position for browsing FormD filings, newest first. after is the
+#cursor of the last filing on the previous page, "<date_added>_<id>" (or
+#"none_<id>" for filings with no date_added)
+class BrowseForm(forms.Form):
+    state = forms.CharField(required=False, max_length=10)
+    industry = forms.CharField(required=False, max_length=100)
+    min_offering = forms.IntegerField(required=False, min_value=0)
+    max_offering = forms.IntegerField(required=False, min_value=0)
+    date_from = forms.DateField(required=False, input_formats=['%Y-%m-%d'])
+    date_to = forms.DateField(required=False, input_formats=['%Y-%m-%d'])
+    after = forms.RegexField(required=False, regex=r'^(\d{4}-\d{2}-\d{2}|none)_\d+$')
+    limit = forms.IntegerField(required=False, min_value=1, max_value=500)
+    format = forms.ChoiceField(required=False, choices=[('html', 'HTML'), ('json', 'JSON')])
+
+    def clean_after(self):
+        after = self.cleaned_data['after']
+        if not after:
+            return None
+        date, form_id = after.split('_')
+        if date == 'none':
+            return (None, int(form_id))
+        try:
+            return (forms.DateField(input_formats=['%Y-%m-%d']).clean(date), int(form_id))
+        except forms.ValidationError:
+            raise forms.ValidationError('after must be a cursor from a previous page')
+
+#Firm name search: prefix matches every word as the start of a word, fuzzy
+#also tolerates misspelled words, contains matches any part of the name
+class SearchForm(forms.Form):
+    q = forms.CharField(max_length=200)
+    mode = forms.ChoiceField(required=False, choices=[('prefix', 'Prefix'), ('fuzzy', 'Fuzzy'), ('contains', 'Contains')])
+    limit = forms.IntegerField(required=False, min_value=1, max_value=500)
+    format = forms.ChoiceField(required=False, choices=[('html', 'HTML'), ('json', 'JSON')])
+
+    def clean(self):
+        cleaned_data = super(SearchForm, self).clean()
+        if cleaned_data.get('mode') == 'contains' and len(cleaned_data.get('q', '').strip()) < 3:
+            raise forms.ValidationError('contains searches need at least three characters')
+        return cleaned_data
+
+#The browse filters, for exporting every matching filing as CSV or Parquet
+class ExportForm(BrowseForm):
+    format = forms.ChoiceField(required=False, choices=[('csv', 'CSV'), ('parquet', 'Parquet')])
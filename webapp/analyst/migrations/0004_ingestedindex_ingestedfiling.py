@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0003_analyst'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestedFiling',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('accession_number', models.CharField(max_length=25, unique=True)),
+                ('index_date', models.DateField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='IngestedIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index_date', models.DateField(unique=True)),
+                ('filings', models.IntegerField(default=0)),
+                ('loaded_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0004_ingestedindex_ingestedfiling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formd',
+            name='accession_number',
+            field=models.CharField(max_length=25, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='formd',
+            name='filing_url',
+            field=models.CharField(max_length=200, null=True),
+        ),
+        migrations.AddField(
+            model_name='formd',
+            name='previous_accession_number',
+            field=models.CharField(db_index=True, max_length=25, null=True),
+        ),
+        migrations.AddField(
+            model_name='formd',
+            name='amends',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='amendments', to='analyst.FormD'),
+        ),
+    ]
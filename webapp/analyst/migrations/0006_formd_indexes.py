@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0005_formd_accession_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='formd',
+            index=models.Index(fields=['cik', 'date_added'], name='formd_cik_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='formd',
+            index=models.Index(fields=['date_added', 'id'], name='formd_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='formd',
+            index=models.Index(fields=['state', 'date_added'], name='formd_state_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='formd',
+            index=models.Index(fields=['ind_group_type', 'date_added'], name='formd_industry_date_idx'),
+        ),
+    ]
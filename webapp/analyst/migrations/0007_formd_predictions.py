@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0006_formd_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='formd',
+            name='predicted_class',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='formd',
+            name='predicted_prob',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='formd',
+            name='model_version',
+            field=models.CharField(db_index=True, max_length=40, null=True),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0007_formd_predictions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecondaryIssuer',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cik', models.CharField(db_index=True, max_length=100)),
+                ('name', models.CharField(db_index=True, max_length=500)),
+                ('year_of_incorp', models.CharField(max_length=30, null=True)),
+                ('street1', models.CharField(max_length=100, null=True)),
+                ('street2', models.CharField(max_length=100, null=True)),
+                ('zip_code', models.CharField(max_length=10, null=True)),
+                ('city', models.CharField(max_length=100, null=True)),
+                ('state', models.CharField(max_length=10, null=True)),
+                ('phone', models.CharField(max_length=30, null=True)),
+                ('filing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='secondary_issuers', to='analyst.FormD')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RelatedPerson',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_name', models.CharField(max_length=100, null=True)),
+                ('last_name', models.CharField(max_length=100)),
+                ('street1', models.CharField(max_length=100, null=True)),
+                ('street2', models.CharField(max_length=100, null=True)),
+                ('zip_code', models.CharField(max_length=10, null=True)),
+                ('city', models.CharField(max_length=100, null=True)),
+                ('state', models.CharField(max_length=10, null=True)),
+                ('filing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_people', to='analyst.FormD')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PersonRelationship',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('relationship', models.CharField(max_length=50)),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='relationships', to='analyst.RelatedPerson')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='relatedperson',
+            index=models.Index(fields=['last_name', 'first_name'], name='person_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='personrelationship',
+            index=models.Index(fields=['relationship', 'person'], name='relationship_person_idx'),
+        ),
+    ]
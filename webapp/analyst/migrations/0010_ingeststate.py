@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_state(apps, schema_editor):
+    IngestState = apps.get_model('analyst', 'IngestState')
+    IngestState.objects.create(id=1, generation=0, updated_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0009_ingestjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
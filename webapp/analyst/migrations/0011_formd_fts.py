@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Full-text indexes over analyst_formd for views.search. Triggers on
+# analyst_formd keep them in sync with every load path (db_insert, rescore,
+# the ORM); the people column is refreshed by db_insert.add_people and by
+# the RelatedPerson signals in models.py (see migration 0012):
+#   analyst_formd_fts      - words of the name, city, street and related
+#                            people's names, for prefix and fuzzy search
+#   analyst_formd_trigram  - trigrams of the name, for substring search
+#   analyst_formd_fts_vocab - the words in analyst_formd_fts, for fuzzy search
+STREET = "trim(coalesce({0}.street1, '') || ' ' || coalesce({0}.street2, ''))"
+PEOPLE = ("(select group_concat(trim(coalesce(p.first_name, '') || ' ' || p.last_name), ' ')"
+          " from analyst_relatedperson p where p.filing_id = {0})")
+
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE analyst_formd_fts USING fts5("
+    "name, city, street, people, tokenize = 'unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE analyst_formd_trigram USING fts5(name, tokenize = 'trigram')",
+    "CREATE VIRTUAL TABLE analyst_formd_fts_vocab USING fts5vocab(analyst_formd_fts, row)",
+
+    "INSERT INTO analyst_formd_fts (rowid, name, city, street, people)"
+    " SELECT f.id, f.name, f.city, {0}, coalesce({1}, '') FROM analyst_formd f".format(
+        STREET.format("f"), PEOPLE.format("f.id")),
+    "INSERT INTO analyst_formd_trigram (rowid, name) SELECT id, name FROM analyst_formd",
+
+    "CREATE TRIGGER analyst_formd_fts_insert AFTER INSERT ON analyst_formd BEGIN"
+    " INSERT INTO analyst_formd_fts (rowid, name, city, street, people)"
+    " VALUES (new.id, new.name, new.city, {0}, '');"
+    " INSERT INTO analyst_formd_trigram (rowid, name) VALUES (new.id, new.name);"
+    " END".format(STREET.format("new")),
+    "CREATE TRIGGER analyst_formd_fts_update AFTER UPDATE OF name, city, street1, street2 ON analyst_formd"
+    " WHEN old.name IS NOT new.name OR old.city IS NOT new.city"
+    " OR old.street1 IS NOT new.street1 OR old.street2 IS NOT new.street2 BEGIN"
+    " UPDATE analyst_formd_fts SET name = new.name, city = new.city, street = {0} WHERE rowid = new.id;"
+    " UPDATE analyst_formd_trigram SET name = new.name WHERE rowid = new.id;"
+    " END".format(STREET.format("new")),
+    "CREATE TRIGGER analyst_formd_fts_delete AFTER DELETE ON analyst_formd BEGIN"
+    " DELETE FROM analyst_formd_fts WHERE rowid = old.id;"
+    " DELETE FROM analyst_formd_trigram WHERE rowid = old.id;"
+    " END",
+    "CREATE TRIGGER analyst_relatedperson_fts_insert AFTER INSERT ON analyst_relatedperson BEGIN"
+    " UPDATE analyst_formd_fts SET people = coalesce({0}, '') WHERE rowid = new.filing_id;"
+    " END".format(PEOPLE.format("new.filing_id")),
+    "CREATE TRIGGER analyst_relatedperson_fts_delete AFTER DELETE ON analyst_relatedperson BEGIN"
+    " UPDATE analyst_formd_fts SET people = coalesce({0}, '') WHERE rowid = old.filing_id;"
+    " END".format(PEOPLE.format("old.filing_id")),
+]
+
+DROP_SQL = [
+    "DROP TRIGGER analyst_relatedperson_fts_delete",
+    "DROP TRIGGER analyst_relatedperson_fts_insert",
+    "DROP TRIGGER analyst_formd_fts_delete",
+    "DROP TRIGGER analyst_formd_fts_update",
+    "DROP TRIGGER analyst_formd_fts_insert",
+    "DROP TABLE analyst_formd_fts_vocab",
+    "DROP TABLE analyst_formd_trigram",
+    "DROP TABLE analyst_formd_fts",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0010_ingeststate'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FTS_SQL, DROP_SQL),
+    ]
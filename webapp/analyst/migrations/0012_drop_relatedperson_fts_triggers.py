@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# The people column of analyst_formd_fts was rebuilt from all of a filing's
+# related people on every person inserted or deleted, so loading a filing's
+# people cost O(people^2). db_insert.add_people now refreshes it once per
+# filing (REFRESH_PEOPLE) in the same transaction that loads them.
+PEOPLE = ("(select group_concat(trim(coalesce(p.first_name, '') || ' ' || p.last_name), ' ')"
+          " from analyst_relatedperson p where p.filing_id = {0})")
+
+DROP_SQL = [
+    "DROP TRIGGER analyst_relatedperson_fts_insert",
+    "DROP TRIGGER analyst_relatedperson_fts_delete",
+]
+
+TRIGGER_SQL = [
+    "CREATE TRIGGER analyst_relatedperson_fts_insert AFTER INSERT ON analyst_relatedperson BEGIN"
+    " UPDATE analyst_formd_fts SET people = coalesce({0}, '') WHERE rowid = new.filing_id;"
+    " END".format(PEOPLE.format("new.filing_id")),
+    "CREATE TRIGGER analyst_relatedperson_fts_delete AFTER DELETE ON analyst_relatedperson BEGIN"
+    " UPDATE analyst_formd_fts SET people = coalesce({0}, '') WHERE rowid = old.filing_id;"
+    " END".format(PEOPLE.format("old.filing_id")),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0011_formd_fts'),
+    ]
+
+    operations = [
+        migrations.RunSQL(DROP_SQL, TRIGGER_SQL),
+    ]
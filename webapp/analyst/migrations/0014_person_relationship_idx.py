@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0013_ingestjob_attempts'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='personrelationship',
+            name='relationship_person_idx',
+        ),
+        migrations.AddIndex(
+            model_name='personrelationship',
+            index=models.Index(fields=['person', 'relationship'], name='person_relationship_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analyst', '0014_person_relationship_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='formd',
+            index=models.Index(fields=['total_offering_amount', 'date_added', 'id'], name='formd_offering_date_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from __future__ import unicode_literals
 
-from django.db import models
+from django.db import models, connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 
 # Create your models here.
@@ -23,6 +25,136 @@ class FormD(models.Model):
     num_non_accred = models.IntegerField()
     tot_number_investors = models.IntegerField()
     date_added = models.DateField(null=True)
+    accession_number = models.CharField(max_length=25, null=True, unique=True)
+    filing_url = models.CharField(max_length=200, null=True)
+    #a D/A names the filing it amends; amends is linked once both are loaded
+    previous_accession_number = models.CharField(max_length=25, null=True, db_index=True)
+    amends = models.ForeignKey('self', null=True, on_delete=models.SET_NULL, related_name='amendments')
+    #classification scored when the filing is loaded (or re-scored), and
+    #the version of the model that scored it
+    predicted_class = models.IntegerField(null=True)
+    predicted_prob = models.FloatField(null=True)
+    model_version = models.CharField(max_length=40, null=True, db_index=True)
+
+    #indexes for the web app's lookups: by cik (detail pages), newest first
+    #(recent and classify), newest first within a state or industry, and
+    #browse's offering amount range, whose rows are then sorted by date
+    class Meta:
+        indexes = [
+            models.Index(fields=['cik', 'date_added'], name='formd_cik_date_idx'),
+            models.Index(fields=['date_added', 'id'], name='formd_date_id_idx'),
+            models.Index(fields=['state', 'date_added'], name='formd_state_date_idx'),
+            models.Index(fields=['ind_group_type', 'date_added'], name='formd_industry_date_idx'),
+            models.Index(fields=['total_offering_amount', 'date_added', 'id'], name='formd_offering_date_idx'),
+        ]
+
+
+#Issuers named on a filing besides the primary issuer, e.g. a fund's general partner
+class SecondaryIssuer(models.Model):
+    filing = models.ForeignKey(FormD, on_delete=models.CASCADE, related_name='secondary_issuers')
+    cik = models.CharField(max_length=100, db_index=True)
+    name = models.CharField(max_length=500, db_index=True)
+    year_of_incorp = models.CharField(max_length=30, null=True)
+    street1 = models.CharField(max_length=100, null=True)
+    street2 = models.CharField(max_length=100, null=True)
+    zip_code = models.CharField(max_length=10, null=True)
+    city = models.CharField(max_length=100, null=True)
+    state = models.CharField(max_length=10, null=True)
+    phone = models.CharField(max_length=30, null=True)
+
+
+#Executive officers, directors and promoters listed on a filing
+class RelatedPerson(models.Model):
+    filing = models.ForeignKey(FormD, on_delete=models.CASCADE, related_name='related_people')
+    first_name = models.CharField(max_length=100, null=True)
+    last_name = models.CharField(max_length=100)
+    street1 = models.CharField(max_length=100, null=True)
+    street2 = models.CharField(max_length=100, null=True)
+    zip_code = models.CharField(max_length=10, null=True)
+    city = models.CharField(max_length=100, null=True)
+    state = models.CharField(max_length=10, null=True)
+
+    #lookups by name, e.g. every filing listing a given person
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name', 'first_name'], name='person_name_idx'),
+        ]
+
+
+#The people column of the full-text index (migration 0011) lists the names of
+#a filing's related people. db_insert refreshes it once per filing after a
+#load (REFRESH_PEOPLE); a person saved or deleted through the ORM or the admin
+#refreshes it for their filing here. Queryset update() and bulk_create() send
+#no signals, so they leave it stale.
+REFRESH_PEOPLE = ("update analyst_formd_fts set people = coalesce("
+                  "(select group_concat(trim(coalesce(p.first_name, '') || ' ' || p.last_name), ' ')"
+                  " from analyst_relatedperson p where p.filing_id = %s), '')"
+                  " where rowid = %s")
+
+@receiver(post_save, sender=RelatedPerson)
+@receiver(post_delete, sender=RelatedPerson)
+def refresh_people(sender, instance, **kwargs):
+    with connection.cursor() as cursor:
+        cursor.execute(REFRESH_PEOPLE, [instance.filing_id, instance.filing_id])
+
+
+#A related person's role on the filing ("Executive Officer", "Director",
+#"Promoter"); a person can have several
+class PersonRelationship(models.Model):
+    person = models.ForeignKey(RelatedPerson, on_delete=models.CASCADE, related_name='relationships')
+    relationship = models.CharField(max_length=50)
+
+    #person first: relationship has only three values, so it cannot narrow a lookup
+    class Meta:
+        indexes = [
+            models.Index(fields=['person', 'relationship'], name='person_relationship_idx'),
+        ]
+
+
+#Ledger of daily index files that db_insert has fully loaded; the latest
+#index_date is the high-water mark for incremental ingestion
+class IngestedIndex(models.Model):
+    index_date = models.DateField(unique=True)
+    filings = models.IntegerField(default=0)
+    loaded_at = models.DateTimeField()
+
+
+#Every filing db_insert has processed, so a partially loaded day can be
+#resumed without fetching the same filings again
+class IngestedFiling(models.Model):
+    accession_number = models.CharField(max_length=25, unique=True)
+    index_date = models.DateField()
+
+
+#Single row (id 1) whose generation db_insert and rescore bump whenever they
+#change analyst_formd; the views' page cache and ETags are keyed on it
+class IngestState(models.Model):
+    generation = models.IntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+
+#Background ingestion of one daily index, queued by the results view and run
+#by "python db_insert.py --worker"; status goes queued -> running -> done or failed
+class IngestJob(models.Model):
+    index_date = models.DateField(unique=True)
+    status = models.CharField(max_length=10, default='queued')
+    #progress while running: filings fetched so far out of total in the index
+    fetched = models.IntegerField(default=0)
+    total = models.IntegerField(null=True)
+    loaded = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    error = models.TextField(null=True)
+    #times the job has been run; failed jobs are retried up to views.JOB_ATTEMPTS times
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField()
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    #the worker claims the oldest queued job
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='ingestjob_status_idx'),
+        ]
 
 
 #Model for the profile of a student. This info is gathered when the user creates an account
@@ -1,3 +1,590 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.urlresolvers import reverse
+from django.core.cache import cache
+from django.db import connection
+import os
+import sys
+import glob
+import json
+import shutil
+import sqlite3
+import tempfile
+import io
+import copy
+import datetime
+import numpy as np
+import pandas as pd
+from sklearn import tree
+from sklearn.externals import joblib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+sys.path.insert(0, ROOT)
+import db_insert
+import rescore
+import classifier
+import data_clean
+from edgar import parse_filing
+from .models import FormD, RelatedPerson, SecondaryIssuer, PersonRelationship, IngestJob, IngestedIndex, IngestState
+from django.utils import timezone
+from . import views
+
+DATA_DIR = os.path.join(ROOT, "benchmarks", "data")
 
 # Create your tests here.
+
+def load_filings():
+    filings = []
+    for path in sorted(glob.glob(os.path.join(DATA_DIR, "*.txt"))):
+        with open(path, "rb") as f:
+            filings.append(parse_filing(f.read()))
+    return filings
+
+def filing_url(cik, i):
+    return "https://www.sec.gov/Archives/edgar/data/{0}/{0:010d}-18-{1:06d}.txt".format(cik, i)
+
+#Base for tests that load filings with db_insert, which takes a sqlite3
+#connection: the test database's own connection is used, in autocommit
+class LoadTestCase(TransactionTestCase):
+    def setUp(self):
+        connection.ensure_connection()
+        self.conn = connection.connection
+        # created by migration 0010, but flushed after every TransactionTestCase
+        IngestState.objects.get_or_create(id=1, defaults={'updated_at': timezone.now()})
+        self.tmp = tempfile.mkdtemp()
+        self.filings = load_filings()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def frame(self, n, cik=1):
+        return data_clean.make_df_from_filings(
+            [(filing_url(cik, i), self.filings[i % len(self.filings)]) for i in range(n)])
+
+    def write_csv(self, df, columns=data_clean.COLUMNS):
+        #in make_df_from_json's format: the column names are the first data row
+        path = os.path.join(self.tmp, "all_data.csv")
+        with open(path, "wb") as f:
+            pd.DataFrame([columns]).to_csv(f, encoding="utf8")
+            df.index = range(1, len(df) + 1)
+            df[columns].to_csv(f, header=False, encoding="utf8")
+        return path
+
+#Loading the same history again must not add rows (user-011)
+class RerunLoadTests(LoadTestCase):
+    def test_csv_twice(self):
+        path = self.write_csv(self.frame(30))
+        for attempt in range(2):
+            db_insert.load_csv(self.conn, path, batch_size=7)
+            self.assertEqual(FormD.objects.count(), 30)
+
+    def test_csv_without_filing_urls_twice(self):
+        #old all_data.csv files have no filing urls, so no accession numbers
+        df = self.frame(30)
+        df["name"] = ["Fund {0}".format(i % 20) for i in range(30)]
+        columns = [col for col in data_clean.COLUMNS if col not in data_clean.KEY_COLUMNS + ["date_filed"]]
+        path = self.write_csv(df, columns)
+        for attempt in range(2):
+            db_insert.load_csv(self.conn, path, batch_size=7)
+            self.assertEqual(FormD.objects.count(), 20)
+            self.assertEqual(FormD.objects.filter(accession_number__isnull=True).count(), 20)
+
+    def test_history_twice(self):
+        df = self.frame(30)
+        df.loc[df.index[:5], "filing_url"] = None
+        df.loc[df.index[:5], "name"] = ["Keyless {0}".format(i) for i in range(5)]
+        data_clean.write_history([df], self.tmp)
+        for attempt in range(2):
+            db_insert.load_history(self.conn, self.tmp, batch_size=8)
+            self.assertEqual(FormD.objects.count(), 30)
+            self.assertEqual(FormD.objects.filter(accession_number__isnull=True).count(), 5)
+
+#Filings are bulk loaded a batch at a time with their values cleaned as
+#they were by the old one-row-at-a-time insert (user-010)
+class LoadFilingsTests(LoadTestCase):
+    def test_batches(self):
+        filings = [(filing_url(7, i), self.filings[i % 2]) for i in range(23)]
+        count = db_insert.load_filings(self.conn, filings, datetime.date(2018, 5, 2), batch_size=5)
+        self.assertEqual(count, 23)
+        self.assertEqual(FormD.objects.count(), 23)
+
+        fund = FormD.objects.get(accession_number="0000000007-18-000000")
+        self.assertEqual((fund.cik, fund.name, fund.zip_code), ("0001731234", "Example Fund & Co LP", "06830"))
+        # an indefinite offering is stored as 0, as clean_data always has
+        self.assertEqual((fund.total_offering_amount, fund.total_amount_sold, fund.total_remaining), (0, 5000000, 0))
+        self.assertEqual((fund.has_non_accred, fund.num_non_accred, fund.tot_number_investors), (True, 2, 12))
+        self.assertEqual(fund.date_added, datetime.date(2018, 5, 2))
+        self.assertEqual(fund.filing_url, filing_url(7, 0))
+
+        company = FormD.objects.get(accession_number="0000000007-18-000001")
+        self.assertEqual((company.total_offering_amount, company.num_non_accred), (25000000, 0))
+
+    def test_unscraped_filings_skipped(self):
+        filings = [(filing_url(7, 0), self.filings[0]), (filing_url(7, 1), {})]
+        self.assertEqual(db_insert.load_filings(self.conn, filings, datetime.date(2018, 5, 2)), 1)
+        self.assertEqual(FormD.objects.count(), 1)
+
+#A filing's secondary issuers and related people are loaded into their own
+#tables, and replaced when the filing is loaded again (user-020)
+class PeopleTests(LoadTestCase):
+    def load(self, filings):
+        db_insert.load_filings(self.conn, filings, datetime.date(2018, 5, 2))
+
+    def people(self):
+        return sorted((person.filing.accession_number, person.first_name, person.last_name, person.city,
+                       tuple(sorted(person.relationships.values_list("relationship", flat=True))))
+                      for person in RelatedPerson.objects.all())
+
+    def test_people_and_issuers(self):
+        self.load([(filing_url(7, 0), self.filings[0]), (filing_url(7, 1), self.filings[1])])
+        self.assertEqual(self.people(), [
+            ("0000000007-18-000000", "Jane", "Doe", "Greenwich", ("Director", "Executive Officer")),
+            ("0000000007-18-000000", "John", "Smith", "London", ("Promoter", )),
+            ("0000000007-18-000001", "Jane", "Doe", "Greenwich", ("Director", "Executive Officer")),
+            ("0000000007-18-000001", "John", "Smith", "London", ("Promoter", )),
+        ])
+        issuer = SecondaryIssuer.objects.get(filing__accession_number="0000000007-18-000000")
+        self.assertEqual((issuer.cik, issuer.name, issuer.phone), ("0001731235", "Example GP LLC", "203-555-0100"))
+        self.assertEqual(SecondaryIssuer.objects.count(), 2)
+
+    def test_reload_replaces(self):
+        self.load([(filing_url(7, 0), self.filings[0])])
+        changed = copy.deepcopy(self.filings[0])
+        del changed["Related People"][1]
+        self.load([(filing_url(7, 0), changed)])
+        self.assertEqual([person[2] for person in self.people()], ["Doe"])
+        self.assertEqual(PersonRelationship.objects.count(), 2)
+        self.assertEqual(SecondaryIssuer.objects.count(), 1)
+
+#The results page queues an ingest job instead of scraping in the request,
+#and db_insert's worker runs it (user-021)
+class IngestJobTests(LoadTestCase):
+    WEDNESDAY = datetime.date(2018, 5, 2)
+    SATURDAY = datetime.date(2018, 5, 5)
+
+    def setUp(self):
+        super(IngestJobTests, self).setUp()
+        self.saved = db_insert.has_daily_index, db_insert.full_process_form_d
+        db_insert.has_daily_index = lambda day: day.weekday() < 5
+        db_insert.full_process_form_d = self.fake_process
+        self.outcome = (12, 0)
+
+    def tearDown(self):
+        db_insert.has_daily_index, db_insert.full_process_form_d = self.saved
+        super(IngestJobTests, self).tearDown()
+
+    def fake_process(self, day, progress):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        progress(5, 12)
+        progress(12, 12)
+        return self.outcome
+
+    def run_worker(self):
+        job = db_insert.claim_job(self.conn)
+        db_insert.run_job(self.conn, *job)
+        return IngestJob.objects.get(id=job[0])
+
+    def test_queued_once(self):
+        job = views.ingest_job(self.WEDNESDAY)
+        self.assertEqual((job.status, job.attempts), ("queued", 0))
+        self.assertEqual(views.ingest_job(self.WEDNESDAY).id, job.id)
+        self.assertIsNone(views.ingest_job(self.SATURDAY))
+
+        IngestedIndex.objects.create(index_date=datetime.date(2018, 5, 3), filings=3, loaded_at=timezone.now())
+        self.assertIsNone(views.ingest_job(datetime.date(2018, 5, 3)))
+
+    def test_worker_runs_the_job(self):
+        views.ingest_job(self.WEDNESDAY)
+        job = self.run_worker()
+        self.assertEqual((job.status, job.fetched, job.total, job.loaded, job.failed, job.attempts),
+                         ("done", 12, 12, 12, 0, 1))
+        self.assertIsNone(db_insert.claim_job(self.conn))
+
+    def test_day_with_no_index(self):
+        IngestJob.objects.create(index_date=self.SATURDAY, created_at=timezone.now())
+        job = self.run_worker()
+        self.assertEqual((job.status, job.loaded), ("done", 0))
+        self.assertTrue(IngestedIndex.objects.filter(index_date=self.SATURDAY).exists())
+
+    def test_failed_job_retried(self):
+        self.outcome = IOError("the daily index for 2018-05-02 is not published yet")
+        views.ingest_job(self.WEDNESDAY)
+        job = self.run_worker()
+        self.assertEqual(job.status, "failed")
+        self.assertIn("not published yet", job.error)
+
+        # not queued again until JOB_RETRY has passed
+        self.assertEqual(views.ingest_job(self.WEDNESDAY).status, "failed")
+        IngestJob.objects.update(finished_at=timezone.now() - views.JOB_RETRY - datetime.timedelta(seconds=1))
+        self.assertEqual(views.ingest_job(self.WEDNESDAY).status, "queued")
+
+        # and given up on after JOB_ATTEMPTS runs
+        IngestJob.objects.update(status="failed", attempts=views.JOB_ATTEMPTS)
+        self.assertEqual(views.ingest_job(self.WEDNESDAY).status, "failed")
+
+    def test_status(self):
+        self.outcome = (10, 2)
+        views.ingest_job(self.WEDNESDAY)
+        self.run_worker()
+        status = json.loads(self.client.get(reverse("analyst:results_status") + "?date=2018-05-02").content)
+        self.assertEqual((status["status"], status["loaded"], status["failed"], status["retry"]), ("done", 10, 2, True))
+        self.assertEqual(self.client.get(reverse("analyst:results_status") + "?date=May").status_code, 400)
+        status = json.loads(self.client.get(reverse("analyst:results_status") + "?date=2018-05-03").content)
+        self.assertEqual(status["status"], "none")
+
+#Pages are cached until the next load bumps the ingest generation, and
+#revalidated with its ETag (user-022)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        IngestState.objects.update_or_create(id=1, defaults={'generation': 7, 'updated_at': timezone.now()})
+        make_filing(1).save()
+        self.url = reverse("analyst:browse") + "?format=json"
+
+    def names(self, response):
+        return [row["name"] for row in json.loads(response.content)["results"]]
+
+    def test_cached_until_the_next_load(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first["ETag"], '"g7"')
+        self.assertEqual(self.names(first), ["Fund 1 LP"])
+
+        # filings saved without a load are not seen until the generation changes
+        make_filing(2).save()
+        self.assertEqual(self.names(self.client.get(self.url)), ["Fund 1 LP"])
+        IngestState.objects.filter(id=1).update(generation=8, updated_at=timezone.now())
+        second = self.client.get(self.url)
+        self.assertEqual(second["ETag"], '"g8"')
+        self.assertEqual(sorted(self.names(second)), ["Fund 1 LP", "Fund 2 LP"])
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        IngestState.objects.filter(id=1).update(generation=8, updated_at=timezone.now())
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_errors_not_cached(self):
+        self.assertEqual(self.client.get(self.url + "&limit=0").status_code, 400)
+        self.assertEqual(self.client.get(self.url + "&limit=0").status_code, 400)
+        self.assertEqual(len(cache._cache), 0)
+
+    @override_settings(ANALYST_PAGE_CACHE=False)
+    def test_switched_off(self):
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header("ETag"))
+        make_filing(2).save()
+        self.assertEqual(len(self.names(self.client.get(self.url))), 2)
+
+
+class GenerationTests(LoadTestCase):
+    def test_load_bumps_the_generation(self):
+        before = IngestState.objects.get(id=1).generation
+        db_insert.load_filings(self.conn, [(filing_url(7, 0), self.filings[0])], datetime.date(2018, 5, 2))
+        self.assertEqual(IngestState.objects.get(id=1).generation, before + 1)
+
+class NoModel(object):
+    def get(self):
+        raise IOError("no model")
+
+#Loading a filing again updates its row in place, and amendments are
+#linked to the filings they amend in whichever order they load (user-011)
+class UpsertTests(LoadTestCase):
+    def setUp(self):
+        super(UpsertTests, self).setUp()
+        # filings[0] is a D/A amending 0001731234-17-000004
+        self.original = copy.deepcopy(self.filings[1])
+        self.original_url = "https://www.sec.gov/Archives/edgar/data/1731234/0001731234-17-000004.txt"
+        self.amendment_url = filing_url(1731234, 5)
+
+    def load(self, *filings):
+        db_insert.load_filings(self.conn, filings, datetime.date(2018, 5, 2))
+
+    def test_reload_updates_in_place(self):
+        self.load((self.amendment_url, self.filings[0]))
+        first = FormD.objects.get()
+        FormD.objects.update(date_added=datetime.date(2018, 5, 1), predicted_class=1, predicted_prob=0.9)
+
+        changed = copy.deepcopy(self.filings[0])
+        changed["Primary Issuer"]["entity_name"] = "Example Fund II LP"
+        saved = db_insert.registry
+        db_insert.registry = NoModel()
+        try:
+            self.load((self.amendment_url, changed))
+        finally:
+            db_insert.registry = saved
+        filing = FormD.objects.get()
+        self.assertEqual((filing.id, filing.name), (first.id, "Example Fund II LP"))
+        # the first load's date and, with nothing to rescore it, its score stay
+        self.assertEqual(filing.date_added, datetime.date(2018, 5, 1))
+        self.assertEqual((filing.predicted_class, filing.predicted_prob), (1, 0.9))
+
+    def test_amendment_after_original(self):
+        self.load((self.original_url, self.original))
+        self.load((self.amendment_url, self.filings[0]))
+        amendment = FormD.objects.get(accession_number="0001731234-18-000005")
+        self.assertEqual(amendment.amends.accession_number, "0001731234-17-000004")
+
+    def test_amendment_before_original(self):
+        self.load((self.amendment_url, self.filings[0]))
+        self.assertIsNone(FormD.objects.get().amends)
+        self.load((self.original_url, self.original))
+        original = FormD.objects.get(accession_number="0001731234-17-000004")
+        self.assertEqual([form.accession_number for form in original.amendments.all()], ["0001731234-18-000005"])
+
+    def test_amendment_with_original_in_one_batch(self):
+        self.load((self.amendment_url, self.filings[0]), (self.original_url, self.original))
+        amendment = FormD.objects.get(accession_number="0001731234-18-000005")
+        self.assertEqual(amendment.amends.accession_number, "0001731234-17-000004")
+
+def make_filing(i, **fields):
+    values = dict(cik=str(i), name="Fund {0} LP".format(i), year_of_incorp="2015", street1="1 Main St",
+                  street2="", zip_code="06830", city="Greenwich", state="CT", ind_group_type="Pooled Investment Fund",
+                  min_investment_accepted=0, total_amount_sold=0, total_offering_amount=0, total_remaining=0,
+                  has_non_accred=False, num_non_accred=0, tot_number_investors=0)
+    values.update(fields)
+    return FormD(**values)
+
+#Filings for browse and export, with some undated and a spread of states
+#and offering amounts
+@override_settings(ANALYST_PAGE_CACHE=False)
+class FilingListTestCase(TestCase):
+    def setUp(self):
+        start = datetime.date(2018, 1, 1)
+        FormD.objects.bulk_create([make_filing(
+            i, date_added=start + datetime.timedelta(days=i % 9) if i % 10 else None,
+            state="CT" if i % 3 else "NY", total_offering_amount=i * 1000) for i in range(60)])
+
+    def expected(self, keep):
+        forms = [form for form in FormD.objects.all() if keep(form)]
+        dated = sorted([form for form in forms if form.date_added], key=lambda form: (form.date_added, form.id))
+        undated = sorted([form for form in forms if not form.date_added], key=lambda form: form.id)
+        return [form.id for form in dated[::-1] + undated[::-1]]
+
+#Browsing pages through every matching filing once, newest first, whichever
+#index the offering filters are read on (user-023)
+class BrowseTests(FilingListTestCase):
+    def browse(self, **params):
+        params.update(format="json", limit=7)
+        url = reverse("analyst:browse") + "?" + "&".join("{0}={1}".format(*item) for item in sorted(params.items()))
+        ids = []
+        while url:
+            page = json.loads(self.client.get(url).content)
+            ids.extend(row["id"] for row in page["results"])
+            url = page["next"]
+        return ids
+
+    def check_offering_filters(self):
+        self.assertEqual(self.browse(), self.expected(lambda form: True))
+        self.assertEqual(self.browse(min_offering=20000, max_offering=44000),
+                         self.expected(lambda form: 20000 <= form.total_offering_amount <= 44000))
+        self.assertEqual(self.browse(min_offering=30000, state="CT"),
+                         self.expected(lambda form: form.total_offering_amount >= 30000 and form.state == "CT"))
+
+    def test_narrow_offering_range(self):
+        self.check_offering_filters()
+
+    def test_wide_offering_range(self):
+        saved = views.OFFERING_SCAN
+        views.OFFERING_SCAN = 5
+        try:
+            self.check_offering_filters()
+        finally:
+            views.OFFERING_SCAN = saved
+
+    def test_filters(self):
+        self.assertEqual(self.browse(state="NY"), self.expected(lambda form: form.state == "NY"))
+        FormD.objects.filter(id__in=self.browse()[::4]).update(ind_group_type="Hedge Fund")
+        self.assertEqual(self.browse(industry="Hedge Fund"),
+                         self.expected(lambda form: form.ind_group_type == "Hedge Fund"))
+        # a date range leaves out filings with no date_added
+        self.assertEqual(self.browse(date_from="2018-01-03", date_to="2018-01-06"),
+                         self.expected(lambda form: form.date_added and
+                                       datetime.date(2018, 1, 3) <= form.date_added <= datetime.date(2018, 1, 6)))
+
+    def test_cursors(self):
+        url = reverse("analyst:browse") + "?format=json&limit=55"
+        page = json.loads(self.client.get(url).content)
+        self.assertRegexpMatches(page["next"], r"after=none_\d+&")
+        page = json.loads(self.client.get(url.replace("55", "10")).content)
+        self.assertRegexpMatches(page["next"], r"after=2018-01-0\d_\d+&")
+        for after in ("2018-02-30_5", "yesterday_5", "2018-01-01"):
+            self.assertEqual(self.client.get(url + "&after=" + after).status_code, 400)
+
+#Exports stream every matching filing, newest first, a chunk at a time
+#(user-025)
+class ExportTests(FilingListTestCase):
+    def setUp(self):
+        super(ExportTests, self).setUp()
+        self.saved = views.EXPORT_CHUNK
+        views.EXPORT_CHUNK = 7
+
+    def tearDown(self):
+        views.EXPORT_CHUNK = self.saved
+
+    def export(self, **params):
+        response = self.client.get(reverse("analyst:export"), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv(self):
+        response, content = self.export(state="NY")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="formd_export.csv"')
+        frame = pd.read_csv(io.BytesIO(content), dtype={"cik": str})
+        self.assertEqual(list(frame.columns), [field for field, kind in views.EXPORT_FIELDS])
+        self.assertEqual(list(frame["id"]), self.expected(lambda form: form.state == "NY"))
+        self.assertEqual(list(frame["cik"]), [FormD.objects.get(id=form_id).cik for form_id in frame["id"]])
+        self.assertEqual(len(self.export()[1].splitlines()), 61)
+        self.assertEqual(len(self.export(limit=10)[1].splitlines()), 11)
+
+    def test_parquet(self):
+        if views.pa is None:
+            self.skipTest("pyarrow is not installed")
+        response, content = self.export(format="parquet", min_offering=20000, max_offering=44000)
+        table = views.pq.read_table(views.pa.BufferReader(content))
+        self.assertEqual([(field.name, field.type) for field in table.schema],
+                         [(field, getattr(views.pa, kind)()) for field, kind in views.EXPORT_FIELDS])
+        self.assertEqual(table.column("id").to_pylist(),
+                         self.expected(lambda form: 20000 <= form.total_offering_amount <= 44000))
+
+    def test_bad_filters(self):
+        self.assertEqual(self.client.get(reverse("analyst:export"), {"min_offering": "lots"}).status_code, 400)
+
+def write_model(model_dir):
+    """
+    Saves a small tree, fit on random features, and its encoders where
+    the classifier's registry looks for them.
+    """
+    rng = np.random.RandomState(1)
+    x = rng.randint(0, 3, (100, len(classifier.FEATURES)))
+    x[:, 2] = rng.choice([0, 25000000], 100)
+    clf = tree.DecisionTreeClassifier(max_depth=3, random_state=1).fit(x, (x[:, 2] > 0) & (x[:, 0] != 2))
+    joblib.dump(clf, os.path.join(model_dir, classifier.MODEL_FILE))
+    np.save(os.path.join(model_dir, classifier.ENCODER_FILE), np.array(["Other Technology", "Pooled Investment Fund"], dtype=object))
+    np.save(os.path.join(model_dir, classifier.STATE_ENCODER_FILE), np.array(["CA", "CT", "NY"], dtype=object))
+
+#Filings are scored when they are loaded, and rescore.py scores the rest
+#with the current model (user-015)
+class ScoreTests(LoadTestCase):
+    def setUp(self):
+        super(ScoreTests, self).setUp()
+        write_model(self.tmp)
+        # the registry is imported by name, so it is replaced everywhere
+        self.registry = classifier.registry
+        classifier.registry = db_insert.registry = rescore.registry = classifier.ModelRegistry(self.tmp)
+        self.model = classifier.registry.get()
+        db_insert.load_filings(self.conn, [(filing_url(7, i), self.filings[i % 2]) for i in range(10)],
+                               datetime.date(2018, 5, 2))
+
+    def tearDown(self):
+        classifier.registry = db_insert.registry = rescore.registry = self.registry
+        super(ScoreTests, self).tearDown()
+
+    def expected(self):
+        fields = [field for name, field in classifier.FEATURES if field is not None]
+        forms = FormD.objects.order_by("id")
+        firms = pd.DataFrame.from_records(list(forms.values_list(*fields)), columns=fields)
+        classes, probs, version = classifier.score_batch(classifier.stored_features(firms), self.model)
+        return zip(classes.tolist(), probs.tolist(), [version] * len(firms))
+
+    def stored(self):
+        return list(FormD.objects.order_by("id").values_list("predicted_class", "predicted_prob", "model_version"))
+
+    def test_scored_on_load(self):
+        self.assertEqual(self.stored(), self.expected())
+        self.assertEqual(set(score[0] for score in self.stored()), set([0, 1]))
+
+    def test_rescore(self):
+        ids = list(FormD.objects.order_by("id").values_list("id", flat=True))
+        FormD.objects.filter(id__in=ids[:3]).update(predicted_class=None, predicted_prob=None, model_version=None)
+        FormD.objects.filter(id__in=ids[3:5]).update(predicted_class=1, model_version="old")
+        path = os.path.join(self.tmp, "formddb.sqlite3")
+        self.conn.execute("vacuum into ?", (path, ))
+
+        self.assertEqual(rescore.rescore(path, workers=1, chunk_size=4), 5)
+        rows = sqlite3.connect(path).execute("select predicted_class, predicted_prob, model_version"
+                                             " from analyst_formd order by id").fetchall()
+        self.assertEqual(rows, self.expected())
+        self.assertEqual(rescore.rescore(path, workers=1, chunk_size=4), 0)
+        self.assertEqual(rescore.rescore(path, workers=1, rescore_all=True), 10)
+
+    def test_pages_use_stored_scores(self):
+        saved = views.predict_batch
+        views.predict_batch = None
+        try:
+            forms = list(FormD.objects.order_by("id"))
+            self.assertEqual(views.classifications(forms), [classifier.LABELS[c] for c, p, v in self.expected()])
+        finally:
+            views.predict_batch = saved
+
+#Firm search over the full-text indexes, kept in sync with analyst_formd by
+#triggers (user-024)
+@override_settings(ANALYST_PAGE_CACHE=False)
+class SearchTests(TestCase):
+    def setUp(self):
+        self.capital = make_filing(1, name="Greenwich Capital Partners LP", city="Stamford")
+        self.widgets = make_filing(2, name="Acme Widgets Inc", city="Greenwich")
+        self.societe = make_filing(3, name=u"Soci\u00e9t\u00e9 G\u00e9n\u00e9rale Fund", city="Paris")
+        for form in (self.capital, self.widgets, self.societe):
+            form.save()
+
+    def ids(self, q, mode="prefix"):
+        return views.search_ids(q, mode, 10)
+
+    def test_prefix(self):
+        self.assertEqual(self.ids("gree cap"), [self.capital.id])
+        # a name match ranks above a city match
+        self.assertEqual(self.ids("greenwich"), [self.capital.id, self.widgets.id])
+        self.assertEqual(self.ids("societe generale"), [self.societe.id])
+        self.assertEqual(self.ids("!!"), [])
+
+    def test_fuzzy(self):
+        self.assertEqual(self.ids("grenwich captal"), [])
+        self.assertEqual(self.ids("grenwich captal", "fuzzy"), [self.capital.id])
+        self.assertEqual(self.ids("wigdets", "fuzzy"), [self.widgets.id])
+
+    def test_contains(self):
+        self.assertEqual(self.ids("wich cap", "contains"), [self.capital.id])
+        self.assertEqual(self.ids("idgets", "contains"), [self.widgets.id])
+        self.assertEqual(self.ids('"quoted"', "contains"), [])
+
+    def test_follows_edits(self):
+        self.widgets.name = "Acme Gadgets Inc"
+        self.widgets.save()
+        self.assertEqual(self.ids("widgets"), [])
+        self.assertEqual(self.ids("gadgets"), [self.widgets.id])
+        self.capital.delete()
+        self.assertEqual(self.ids("capital"), [])
+        self.assertEqual(self.ids("wich cap", "contains"), [])
+
+    def test_view(self):
+        url = reverse("analyst:search")
+        results = json.loads(self.client.get(url, {"q": "greenwich", "format": "json"}).content)["results"]
+        self.assertEqual([row["name"] for row in results], ["Greenwich Capital Partners LP", "Acme Widgets Inc"])
+        self.assertEqual(self.client.get(url, {"q": "ac", "mode": "contains", "format": "json"}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+#People added, renamed or removed through the ORM (and so the admin) are
+#found by search straight away (user-024)
+class PeopleSearchTests(TestCase):
+    def setUp(self):
+        self.filing = make_filing(1, name="Greenwich Capital Partners LP")
+        self.filing.save()
+
+    def found(self, q):
+        return self.filing.id in views.search_ids(q, "prefix", 10)
+
+    def test_person_added_and_deleted(self):
+        person = RelatedPerson.objects.create(filing=self.filing, first_name="Ada", last_name="Lovelace")
+        RelatedPerson.objects.create(filing=self.filing, first_name="Charles", last_name="Babbage")
+        self.assertTrue(self.found("lovelace"))
+        self.assertTrue(self.found("babbage"))
+        person.delete()
+        self.assertFalse(self.found("lovelace"))
+        self.assertTrue(self.found("babbage"))
+
+    def test_person_renamed(self):
+        person = RelatedPerson.objects.create(filing=self.filing, first_name="Ada", last_name="Byron")
+        person.last_name = "Lovelace"
+        person.save()
+        self.assertTrue(self.found("lovelace"))
+        self.assertFalse(self.found("byron"))
@@ -12,8 +12,12 @@ urlpatterns = [
     url(r'^(?P<form_id>[0-9]+)/classify/$', views.detail_classify, name='detail'),
     # ex: /polls/5/results/
     url(r'^results/$', views.results, name='results'),
+    url(r'^results/status/$', views.results_status, name='results_status'),
     url(r'^recent/$', views.recent, name='results'),
     url(r'^classify/$', views.classify, name='classify'),
+    url(r'^browse/$', views.browse, name='browse'),
+    url(r'^search/$', views.search, name='search'),
+    url(r'^export/$', views.export, name='export'),
     # ex: /polls/5/vote/
 
     # Login 
@@ -1,17 +1,74 @@
 from django.shortcuts import render
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.template import loader
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+from django.db import connection
+from django.db.models import F, Func
+from functools import wraps
+import hashlib
+import difflib
+import csv
+import re
 import sys
 sys.path.insert(0, "/Users/mbyrnes/docs/school/class/ current/cs490/form_d")
-from edgar import single_day
-from classifier import tree_predict
+from classifier import predict_batch, stored_features, FEATURES, LABELS
 import datetime as dt
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .forms import UserForm, AnalystForm
-from .models import FormD, Analyst
+from .forms import UserForm, AnalystForm, BrowseForm, SearchForm, ExportForm
+from django.utils import timezone
+from .models import FormD, Analyst, IngestJob, IngestedIndex, IngestState
 import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# cached pages are only replaced when db_insert bumps the ingest generation
+CACHE_TIMEOUT = 24 * 60 * 60
+
+
+# the (generation, updated_at) of the loaded filings, read once per request
+def ingest_state(request):
+    if not hasattr(request, 'ingest_state'):
+        state = IngestState.objects.filter(id=1).values_list('generation', 'updated_at').first()
+        request.ingest_state = state or (0, None)
+    return request.ingest_state
+
+def generation_etag(request, *args, **kwargs):
+    return 'g{0}'.format(ingest_state(request)[0])
+
+def generation_modified(request, *args, **kwargs):
+    return ingest_state(request)[1]
+
+# Caches a view's page until the next load, and answers If-None-Match and
+# If-Modified-Since with 304 Not Modified. Pages here do not depend on the
+# user, so they are keyed on the generation and the path alone.
+def generation_cached(view):
+    @wraps(view)
+    def cached(request, *args, **kwargs):
+        path = hashlib.md5(request.get_full_path().encode('utf8')).hexdigest()
+        key = 'analyst:{0}:{1}'.format(ingest_state(request)[0], path)
+        page = cache.get(key)
+        if page is not None:
+            return HttpResponse(page[0], content_type=page[1])
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, (response.content, response['Content-Type']), CACHE_TIMEOUT)
+        return response
+
+    conditional = condition(etag_func=generation_etag, last_modified_func=generation_modified)(cached)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not getattr(settings, 'ANALYST_PAGE_CACHE', True):
+            return view(request, *args, **kwargs)
+        return conditional(request, *args, **kwargs)
+    return wrapper
 
 
 # cover page for site
@@ -24,6 +81,7 @@ def about(request):
 def analyze(request):
     return render(request, 'analyst/analyze.html', {})
 
+@generation_cached
 def recent(request):
     form_d_list = FormD.objects.order_by("-date_added")[:20]
     context = {
@@ -31,14 +89,289 @@ def recent(request):
     }
     return render(request, 'analyst/recent.html', context)  
 
+# filings per browse page unless ?limit= is given
+BROWSE_LIMIT = 50
+# an offering amount range holding fewer filings than this is read through
+# formd_offering_date_idx and sorted; a wider one is found walking dates
+OFFERING_SCAN = 5000
+BROWSE_FIELDS = ['id', 'cik', 'name', 'city', 'state', 'ind_group_type', 'min_investment_accepted',
+                 'total_offering_amount', 'total_amount_sold', 'date_added', 'accession_number', 'predicted_class']
+
+# Every filing, newest first, filtered by state, industry group, offering
+# size and date range, as HTML or ?format=json. Pages are found by seeking
+# past the previous page's last (date_added, id) instead of OFFSET, so a
+# deep page costs the same as the first.
+@generation_cached
+def browse(request):
+    form = BrowseForm(request.GET)
+    as_json = request.GET.get('format') == 'json'
+    if not form.is_valid():
+        if as_json:
+            return JsonResponse({'errors': form.errors}, status=400)
+        return render(request, 'analyst/browse.html', {'form': form}, status=400)
+
+    filters = form.cleaned_data
+    rows, cursor = browse_page(filters, filters['limit'] or BROWSE_LIMIT)
+    for row in rows:
+        row['classification'] = LABELS[row['predicted_class']] if row['predicted_class'] is not None else None
+    next_page = None
+    if cursor is not None:
+        params = request.GET.copy()
+        params['after'] = cursor
+        next_page = '{0}?{1}'.format(request.path, params.urlencode())
+
+    if as_json:
+        return JsonResponse({'results': rows, 'next': next_page})
+    context = {
+        'form': form,
+        'form_d_list': rows,
+        'next_page': next_page,
+    }
+    return render(request, 'analyst/browse.html', context)
+
+# the filings matching a BrowseForm's filters, in no particular order
+def browse_filter(filters):
+    forms = FormD.objects.all()
+    if filters.get('state'):
+        forms = forms.filter(state=filters['state'])
+    if filters.get('industry'):
+        forms = forms.filter(ind_group_type=filters['industry'])
+    if filters.get('min_offering') is not None:
+        forms = forms.filter(total_offering_amount__gte=filters['min_offering'])
+    if filters.get('max_offering') is not None:
+        forms = forms.filter(total_offering_amount__lte=filters['max_offering'])
+    if filters.get('date_from'):
+        forms = forms.filter(date_added__gte=filters['date_from'])
+    if filters.get('date_to'):
+        forms = forms.filter(date_added__lte=filters['date_to'])
+    return forms
+
+# One page of filings after the cursor (date_added, id), newest first, and the
+# cursor for the next page (None on the last page). Filings loaded with no
+# date_added come after all dated ones; each part is an index seek on
+# (date_added, id), or (state, date_added, id) and (ind_group_type, date_added, id).
+# SQLite has no statistics on how many filings an offering amount range holds,
+# so it always walks dates, reading most of the table for a narrow range; such
+# a range is read on (total_offering_amount, date_added, id) instead, by
+# ordering on +date_added, which no index can supply.
+# fields must include date_added and id.
+def browse_page(filters, limit, fields=BROWSE_FIELDS):
+    forms = browse_filter(filters)
+    after = filters.get('after')
+    rows = []
+    if after is None or after[0] is not None:
+        dated = forms.filter(date_added__isnull=False)
+        if after is not None:
+            # a row value comparison, which SQLite turns into a single index seek
+            dated = dated.extra(where=['("analyst_formd"."date_added", "analyst_formd"."id") < (%s, %s)'],
+                                params=[after[0].strftime('%Y-%m-%d'), after[1]])
+        newest = F('date_added')
+        if narrow_offering_range(filters):
+            newest = Func(newest, template='+%(expressions)s')
+        rows = list(dated.order_by(newest.desc(), '-id').values(*fields)[:limit + 1])
+    if len(rows) <= limit and not filters.get('date_from') and not filters.get('date_to'):
+        undated = forms.filter(date_added__isnull=True)
+        if after is not None and after[0] is None:
+            undated = undated.filter(id__lt=after[1])
+        rows += list(undated.order_by('-id').values(*fields)[:limit + 1 - len(rows)])
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    date = last['date_added'].strftime('%Y-%m-%d') if last['date_added'] is not None else 'none'
+    return rows, '{0}_{1}'.format(date, last['id'])
+
+# whether the filters' offering amount range holds fewer than OFFERING_SCAN filings
+def narrow_offering_range(filters):
+    if filters.get('min_offering') is None and filters.get('max_offering') is None:
+        return False
+    offering = browse_filter({'min_offering': filters.get('min_offering'),
+                              'max_offering': filters.get('max_offering')})
+    return offering.values('id')[:OFFERING_SCAN].count() < OFFERING_SCAN
+
+# filings read per query while exporting; memory use is bounded by this
+EXPORT_CHUNK = 5000
+# every stored column of a filing, and its type in a Parquet export
+EXPORT_FIELDS = [('id', 'int64'), ('accession_number', 'string'), ('cik', 'string'), ('name', 'string'),
+                 ('year_of_incorp', 'string'), ('street1', 'string'), ('street2', 'string'),
+                 ('city', 'string'), ('state', 'string'), ('zip_code', 'string'),
+                 ('ind_group_type', 'string'), ('min_investment_accepted', 'int64'),
+                 ('total_offering_amount', 'int64'), ('total_amount_sold', 'int64'),
+                 ('total_remaining', 'int64'), ('has_non_accred', 'bool_'), ('num_non_accred', 'int64'),
+                 ('tot_number_investors', 'int64'), ('date_added', 'date32'), ('filing_url', 'string'),
+                 ('previous_accession_number', 'string'), ('predicted_class', 'int64'),
+                 ('predicted_prob', 'float64'), ('model_version', 'string')]
+
+# Every filing matching the browse filters as a CSV (default) or Parquet
+# download. Rows are read a chunk at a time with the same index seeks as
+# browse and streamed out as they are read, so memory stays flat however
+# many filings match and the first bytes go out straight away.
+def export(request):
+    form = ExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    filters = form.cleaned_data
+    if filters['format'] == 'parquet':
+        if pa is None:
+            return JsonResponse({'errors': {'format': ['Parquet export needs pyarrow']}}, status=400)
+        response = StreamingHttpResponse(export_parquet(filters), content_type='application/octet-stream')
+        filename = 'formd_export.parquet'
+    else:
+        response = StreamingHttpResponse(export_csv(filters), content_type='text/csv')
+        filename = 'formd_export.csv'
+    response['Content-Disposition'] = 'attachment; filename="{0}"'.format(filename)
+    return response
+
+# the matching filings in chunks of EXPORT_CHUNK rows, newest first
+def export_chunks(filters):
+    filters = dict(filters)
+    fields = [field for field, kind in EXPORT_FIELDS]
+    limit = filters['limit']
+    while limit is None or limit > 0:
+        size = EXPORT_CHUNK if limit is None else min(EXPORT_CHUNK, limit)
+        rows, cursor = browse_page(filters, size, fields)
+        if rows:
+            yield rows
+        if limit is not None:
+            limit -= len(rows)
+        if cursor is None:
+            return
+        after = cursor.split('_')
+        filters['after'] = (None if after[0] == 'none' else dt.datetime.strptime(after[0], '%Y-%m-%d').date(),
+                            int(after[1]))
+
+# csv.writer writes to this, and the written line is returned straight away
+class Echo(object):
+    def write(self, value):
+        return value
+
+def export_csv(filters):
+    fields = [field for field, kind in EXPORT_FIELDS]
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for rows in export_chunks(filters):
+        yield ''.join(writer.writerow([encode_csv(row[field]) for field in fields]) for row in rows)
+
+def encode_csv(value):
+    if value is None:
+        return ''
+    if isinstance(value, unicode):
+        return value.encode('utf8')
+    return value
+
+# a file for ParquetWriter whose bytes are handed on as soon as they are written
+class ParquetSink(object):
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+# one row group per chunk
+def export_parquet(filters):
+    schema = pa.schema([pa.field(field, getattr(pa, kind)()) for field, kind in EXPORT_FIELDS])
+    sink = ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    yield sink.drain()
+    for rows in export_chunks(filters):
+        columns = [pa.array([row[field] for row in rows], type=getattr(pa, kind)()) for field, kind in EXPORT_FIELDS]
+        writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+# bm25 weights of the name, city, street and people columns of analyst_formd_fts
+SEARCH_WEIGHTS = (10.0, 1.0, 1.0, 2.0)
+# a misspelled word is replaced by up to this many close words in the index
+FUZZY_TERMS = 3
+FUZZY_CUTOFF = 0.75
+
+# Firm search over the full-text indexes of migration 0011, most relevant
+# first (newest first for contains), as HTML or ?format=json
+@generation_cached
+def search(request):
+    form = SearchForm(request.GET)
+    as_json = request.GET.get('format') == 'json'
+    if not request.GET.get('q'):
+        return render(request, 'analyst/search.html', {'form': SearchForm()})
+    if not form.is_valid():
+        if as_json:
+            return JsonResponse({'errors': form.errors}, status=400)
+        return render(request, 'analyst/search.html', {'form': form}, status=400)
+
+    query = form.cleaned_data
+    ids = search_ids(query['q'], query['mode'] or 'prefix', query['limit'] or BROWSE_LIMIT)
+    found = dict((row['id'], row) for row in FormD.objects.filter(id__in=ids).values(*BROWSE_FIELDS))
+    rows = [found[form_id] for form_id in ids if form_id in found]
+    for row in rows:
+        row['classification'] = LABELS[row['predicted_class']] if row['predicted_class'] is not None else None
+
+    if as_json:
+        return JsonResponse({'results': rows})
+    context = {
+        'form': form,
+        'form_d_list': rows,
+    }
+    return render(request, 'analyst/search.html', context)
+
+# ids of the best matching filings for a search
+def search_ids(q, mode, limit):
+    cursor = connection.cursor()
+    if mode == 'contains':
+        # the trigram index finds any substring of three or more characters
+        cursor.execute("select rowid from analyst_formd_trigram where analyst_formd_trigram match %s"
+                       " order by rowid desc limit %s", [u'"{0}"'.format(q.strip().replace(u'"', u'""')), limit])
+        return [row[0] for row in cursor.fetchall()]
+
+    words = re.findall(r'\w+', q.lower(), re.UNICODE)
+    if not words:
+        return []
+    if mode == 'fuzzy':
+        terms = [u'(' + u' OR '.join(u'"{0}"'.format(term) for term in fuzzy_terms(cursor, word)) + ')' for word in words]
+        expression = u' AND '.join(terms)
+    else:
+        expression = u' '.join(u'"{0}"*'.format(word) for word in words)
+    cursor.execute("select rowid from analyst_formd_fts where analyst_formd_fts match %s"
+                   " order by bm25(analyst_formd_fts, {0}) limit %s".format(', '.join(str(w) for w in SEARCH_WEIGHTS)),
+                   [expression, limit])
+    return [row[0] for row in cursor.fetchall()]
+
+# Words in the index close to a possibly misspelled word. Only words sharing
+# its first two letters (or the two swapped) are compared, which keeps the
+# lookup to a small range of the index's vocabulary.
+def fuzzy_terms(cursor, word):
+    if len(word) < 3:
+        return [word]
+    candidates = []
+    for start in set([word[:2], word[1] + word[0]]):
+        cursor.execute("select term from analyst_formd_fts_vocab where term >= %s and term < %s",
+                       [start, start + u'\uffff'])
+        candidates.extend(row[0] for row in cursor.fetchall())
+    return difflib.get_close_matches(word, candidates, FUZZY_TERMS, FUZZY_CUTOFF) or [word]
+
+@generation_cached
 def classify(request):
-    form_d_list = FormD.objects.order_by("-date_added")[:20]
-    predictions = []
-    for form in form_d_list:
-        firm = [[form.state, form.min_investment_accepted, form.total_offering_amount, form.total_amount_sold, form.total_remaining, form.ind_group_type, form.has_non_accred, form.num_non_accred, form.tot_number_investors, True, True]]
-        firm = pd.DataFrame(firm)
-        classification = tree_predict(firm)
-        predictions.append(classification)
+    form_d_list = list(FormD.objects.order_by("-date_added")[:20])
+    predictions = classifications(form_d_list)
 
     form_d_list = zip(form_d_list, predictions)
     context = {
@@ -47,6 +380,7 @@ def classify(request):
     return render(request, 'analyst/classify.html', context)  
 
 
+@generation_cached
 def detail(request, form_id):
     form = FormD.objects.filter(cik=form_id)[0]
     context = {
@@ -56,12 +390,10 @@ def detail(request, form_id):
 
     return render(request, 'analyst/detail.html', context)
 
+@generation_cached
 def detail_classify(request, form_id):
     form = FormD.objects.filter(cik=form_id)[0]
-    # convert back to df format
-    firm = [[form.state, form.min_investment_accepted, form.total_offering_amount, form.total_amount_sold, form.total_remaining, form.ind_group_type, form.has_non_accred, form.num_non_accred, form.tot_number_investors, True, True]]
-    firm = pd.DataFrame(firm)
-    classification = tree_predict(firm)
+    classification = classifications([form])[0]
 
     context = {
         'form_id': form_id,
@@ -71,16 +403,76 @@ def detail_classify(request, form_id):
 
     return render(request, 'analyst/detail.html', context)
 
+# classifications are scored when filings are loaded; only filings that
+# have not been scored yet are run through the model here
+def classifications(forms):
+    unscored = [form for form in forms if form.predicted_class is None]
+    if unscored:
+        for form, pred in zip(unscored, predict_batch(form_features(unscored))):
+            form.predicted_class = pred
+    return [LABELS[form.predicted_class] for form in forms]
+
+# convert filings back to the classifier's data frame format
+def form_features(forms):
+    fields = [field for name, field in FEATURES if field is not None]
+    firms = pd.DataFrame([[getattr(form, field) for field in fields] for form in forms], columns=fields)
+    return stored_features(firms)
+
+# a failed (or partly failed) ingest job is queued again after this long
+JOB_RETRY = dt.timedelta(minutes=10)
+JOB_ATTEMPTS = 5
+
+# filings from yesterday's daily index; the scrape runs in the background
+# (python db_insert.py --worker), so the request only reads the database
 def results(request):
-    # put edgar function here
-    yesterday = dt.datetime.now() - dt.timedelta(days=1)
-    results = single_day(yesterday)
-    results = [val["Primary Issuer"]["entity_name"] for key,val in results.iteritems() if val != {}]
+    yesterday = dt.date.today() - dt.timedelta(days=1)
+    job = ingest_job(yesterday)
+    results = FormD.objects.filter(date_added=yesterday).order_by("id").values_list("name", flat=True)
     context = {
-        "results": results,
+        "results": list(results),
+        "day": yesterday,
+        "job": job,
+        "retry": job is not None and job.attempts < JOB_ATTEMPTS,
     }
     return render(request, "analyst/results.html", context)
 
+# progress of the ingest job for ?date=YYYY-MM-DD (default yesterday)
+def results_status(request):
+    day = dt.date.today() - dt.timedelta(days=1)
+    if request.GET.get("date"):
+        try:
+            day = dt.datetime.strptime(request.GET["date"], "%Y-%m-%d").date()
+        except ValueError:
+            return JsonResponse({"error": "date must be YYYY-MM-DD"}, status=400)
+    job = IngestJob.objects.filter(index_date=day).first()
+    status = {"index_date": day.strftime("%Y-%m-%d"), "ingested": IngestedIndex.objects.filter(index_date=day).exists()}
+    if job is None:
+        status["status"] = "none"
+    else:
+        status.update(id=job.id, status=job.status, fetched=job.fetched, total=job.total,
+                      loaded=job.loaded, failed=job.failed, error=job.error,
+                      attempts=job.attempts, retry=job.attempts < JOB_ATTEMPTS,
+                      created_at=job.created_at, started_at=job.started_at, finished_at=job.finished_at)
+    status["filings"] = FormD.objects.filter(date_added=day).count()
+    return JsonResponse(status)
+
+# the ingest job for a day, queued if the day has not been loaded yet; failed
+# jobs are queued again every JOB_RETRY until they have run JOB_ATTEMPTS times
+def ingest_job(day):
+    # there is no daily index on weekends
+    if day.weekday() >= 5:
+        return None
+    job = IngestJob.objects.filter(index_date=day).first()
+    if job is None:
+        if IngestedIndex.objects.filter(index_date=day).exists():
+            return None
+        job, created = IngestJob.objects.get_or_create(index_date=day, defaults={"created_at": timezone.now()})
+    elif (job.status == "failed" or (job.status == "done" and job.failed)) \
+            and job.attempts < JOB_ATTEMPTS and job.finished_at < timezone.now() - JOB_RETRY:
+        IngestJob.objects.filter(id=job.id, status=job.status).update(status="queued", created_at=timezone.now())
+        job.refresh_from_db()
+    return job
+
 # New User Information page
 def get_new_user_info(request):
   error = 0
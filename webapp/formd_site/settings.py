@@ -83,6 +83,21 @@ DATABASES = {
 }
 
 
+# Cache
+# Pages are cached per process; use FileBasedCache (or memcached) to share
+# them between several server processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'analyst',
+    }
+}
+
+# cache the analyst pages until the next load; see analyst.views.generation_cached
+ANALYST_PAGE_CACHE = True
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
 